@@ -1,12 +1,55 @@
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5 as mt5
+except ImportError: # The terminal package is Windows-only; elsewhere run against the simulated broker
+    import mt5_simulator as mt5
 import pandas as pd
-import pandas_ta as ta # For technical analysis indicators
+try:
+    import pandas_ta as ta # Reference indicator implementations (INDICATOR_BACKEND = "pandas_ta")
+except ImportError: # indicator_kernels covers every indicator the bot computes
+    ta = None
+try:
+    from colorama import Fore, Style # Coloured condition reports on the console
+except ImportError: # Plain text without colorama
+    class _NoColour:
+        def __getattr__(self, name):
+            return ""
+    Fore = Style = _NoColour()
+import indicator_kernels # NumPy indicator kernels (INDICATOR_BACKEND = "numpy")
 import time
 from datetime import datetime
 import pytz # For timezone handling
 import telebot # For Telegram alerts (install: pip install pyTelegramBotAPI)
 import numpy as np # For numerical operations
 import math # For math.floor
+from collections import deque, OrderedDict # Bounded buffers for streaming state, LRU memo
+import os # For os.cpu_count
+import calendar # For server-time epoch conversion
+import threading # Background Telegram dispatch
+import json # Bar store metadata
+import zlib # Bar store checksums
+try:
+    import fcntl # Bar store writer lock (POSIX)
+except ImportError: # Windows locks the file with msvcrt instead
+    fcntl = None
+    import msvcrt
+import pickle # Warm-start checkpoints
+import functools # Stage-timing decorator
+import contextlib # Stage-timing context manager
+import logging # Rotating metrics log
+import logging.handlers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Local metrics endpoint
+import sys # Benchmark exit status
+import io # Silencing console output inside benchmarks
+import platform # Benchmark environment metadata
+import tracemalloc # Benchmark peak memory
+import itertools # Parameter grids
+import random # Random parameter samples
+import multiprocessing # Shard worker processes
+from multiprocessing import shared_memory # History shared with optimizer workers
+import hashlib # Consistent-hash ring points
+import bisect # Consistent-hash ring lookups
+import ast # Strategy rule expressions
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor # Watchlist scanning pools
 
 # --- Configuration ---
 # Replace with your MT5 account details
@@ -18,11 +61,29 @@ MT5_PATH = # Path to your MT5 terminal (FIXED SYNTAX)
 # Telegram Bot Configuration (Get these from BotFather on Telegram)
 TELEGRAM_BOT_TOKEN = # Your Telegram bot token
 TELEGRAM_CHAT_ID = # Your chat ID (can be a user ID or group ID)
+TELEGRAM_ASYNC = True # Queue messages for a background sender instead of sending inline
+TELEGRAM_QUEUE_SIZE = 200 # Max queued messages before the overflow policy kicks in
+TELEGRAM_OVERFLOW_POLICY = "drop_oldest" # "drop_oldest" or "drop_newest" when the queue is full
+TELEGRAM_COALESCE_SECONDS = 1.0 # Messages queued within this window go out as one message
+TELEGRAM_MIN_INTERVAL_SECONDS = 1.0 # Per-chat spacing between sends (Telegram allows ~1 msg/s per chat)
+TELEGRAM_MAX_RETRIES = 3 # Retries per message after the first failed attempt
+TELEGRAM_RETRY_BACKOFF_SECONDS = 1.0 # First retry delay, doubled on each further attempt
+TELEGRAM_API_URL = None # e.g. "http://127.0.0.1:8081/bot{0}/{1}" to point the bot at a local fake endpoint
 
 # Trading Parameters
 SYMBOL = "EURUSD" # Trading symbol
 LOT_SIZE = 0.01 # Trading volume (in lots)
 DEVIATION = 20 # Max price deviation in points for order execution
+SNAPSHOT_MAX_AGE_SECONDS = 2.0 # Order code re-fetches the tick if the cycle snapshot is older than this
+SL_ATR_MULTIPLIER = 1.5 # Stop loss distance in ATRs
+TP_ATR_MULTIPLIER = 3.0 # Take profit distance in ATRs
+ORDER_DEADLINE_SECONDS = 2.0 # Requoted orders are re-priced and re-sent until filled or this much time has passed
+ORDER_MAX_ATTEMPTS = 5 # Upper bound on sends per order within the deadline
+USE_ORDER_CHECK = False # Pre-flight each order with mt5.order_check (costs one extra round trip)
+ORDER_LOG_SIZE = 1000 # Executions kept for latency/slippage statistics
+EXIT_MAX_PARALLEL = 8 # Close orders in flight at once when exiting a batch of positions (1 = sequential)
+EXIT_MAX_RETRIES = 2 # Extra attempts per close after a transient failure (timeout, connection); execute_order handles requotes
+EXIT_MAX_PARTIAL_FILLS = 10 # Re-sends of a partially filled close before the rest is left open and reported
 
 # Indicator Periods
 EMA_SHORT_PERIOD = 20
@@ -38,6 +99,151 @@ STOCH_RSI_SMOOTH_D = 3
 SAR_ACCELERATION = 0.02
 SAR_MAX_ACCELERATION = 0.2
 ATR_PERIOD = 14 # For dynamic SL/TP
+PVO_FAST_PERIOD = 12 # pandas_ta pvo() default fast length
+PVO_SLOW_PERIOD = 26 # pandas_ta pvo() default slow length
+INDICATOR_BACKEND = "numpy" # "numpy" (indicator_kernels.py) or "pandas_ta"
+
+# Metrics
+METRICS_ENABLED = True # Per-stage timings, counters and gauges for the scan loop
+METRICS_WINDOW = 2048 # Recent samples kept per histogram for p50/p95/p99
+METRICS_HTTP_PORT = 9108 # Serves /metrics (text) and /metrics.json on 127.0.0.1; None disables
+METRICS_LOG_PATH = "bot_metrics.log" # One JSON snapshot per scan cycle; None disables
+METRICS_LOG_MAX_BYTES = 5 * 1024 * 1024 # Rotate the metrics log at this size
+METRICS_LOG_BACKUPS = 3 # Rotated metrics logs kept
+
+# Simulated broker (mt5_simulator.py, for load tests and machines without a terminal)
+USE_SIMULATED_BROKER = False # Use the simulator even where the MetaTrader5 package is installed
+SIM_SPEED = 1.0 # Simulated seconds per wall-clock second (0 = frozen clock)
+SIM_LATENCY_MS = 5.0 # Injected latency of each data call
+SIM_ORDER_LATENCY_MS = 50.0 # Injected latency of order_send
+SIM_LATENCY_JITTER_MS = 2.0 # Standard deviation of the injected latency
+SIM_REQUOTE_RATE = 0.0 # Probability an order is requoted
+SIM_PARTIAL_FILL_RATE = 0.0 # Probability only part of an order's volume is available
+SIM_ERROR_RATES = {} # e.g. {10031: 0.01} to fail 1% of orders with TRADE_RETCODE_CONNECTION
+
+# Incremental indicator engine
+USE_INCREMENTAL_INDICATORS = True # Update indicators bar by bar instead of recomputing the whole frame
+INDICATOR_HISTORY_BARS = 200 # Rows kept per (symbol, timeframe) by the incremental engine
+
+# Lazy indicator graph
+USE_INDICATOR_GRAPH = True # Compute only the indicator columns a consumer reads (full recomputes and watchlist scans)
+
+# Strategy rules
+# Conditions are expressions over indicator columns and RULE_THRESHOLDS names, combined with
+# and/or/not, comparisons (chains like 20 < RSI < 80 work) and + - * /. Bit i of a mask is rule i.
+ALIGNMENT_RULES = [ # (name, bullish condition, bearish condition); all must hold to signal
+    ("EMA", "EMA_Short > EMA_Long", "EMA_Short < EMA_Long"),
+    ("MACD", "MACD_Line > MACD_Signal_Line and MACD_Line > 0", "MACD_Line < MACD_Signal_Line and MACD_Line < 0"),
+    ("Volume Oscillator", "Volume_Oscillator > 0", "Volume_Oscillator < 0"),
+    ("SAR", "SAR < close", "SAR > close"),
+    ("RSI", "RSI > rsi_midline", "RSI < rsi_midline"),
+    ("StochRSI", "StochRSI_K > StochRSI_D and StochRSI_K < stoch_overbought and StochRSI_D < stoch_overbought",
+                 "StochRSI_K < StochRSI_D and StochRSI_K > stoch_oversold and StochRSI_D > stoch_oversold"),
+]
+REVERSAL_RULES = [ # (name, bullish reversal (closes shorts), bearish reversal (closes longs)); any one is enough
+    ("MACD", "MACD_Line > MACD_Signal_Line and MACD_Line > 0", "MACD_Line < MACD_Signal_Line and MACD_Line < 0"),
+    ("RSI", "RSI > rsi_overbought", "RSI < rsi_oversold"),
+    ("StochRSI", "StochRSI_K > stoch_overbought and StochRSI_D > stoch_overbought",
+                 "StochRSI_K < stoch_oversold and StochRSI_D < stoch_oversold"),
+]
+RULE_THRESHOLDS = {"rsi_midline": 50, "rsi_overbought": 70, "rsi_oversold": 30, "stoch_overbought": 80, "stoch_oversold": 20}
+TIMEFRAME_RULE_OVERRIDES = {} # e.g. {"1W": {"thresholds": {"rsi_midline": 55}, "alignment": {"StochRSI": ("True", "True")}}}
+
+# Signal state machine
+SIGNAL_ARM_CONDITIONS = 5 # Alignment conditions (of 6) that arm a timeframe before it fires
+SIGNAL_COOLDOWN_SECONDS = 4 * 3600 # After a fired signal breaks, re-alignment within this window does not alert again
+SIGNAL_JOURNAL_SIZE = 500 # Signal state transitions kept in memory for inspection
+
+# Indicator memoization
+USE_INDICATOR_MEMO = True # Reuse indicator frames while a timeframe's bars and the indicator settings are unchanged
+INDICATOR_MEMO_MAX_ENTRIES = 256 # Least recently used frames beyond this are evicted
+INDICATOR_MEMO_MAX_BYTES = 64 * 1024 * 1024 # Memory budget for memoized frames
+
+# Bar cache
+USE_BAR_CACHE = True # Fetch only new bars from the terminal and serve the rest from memory
+BAR_CACHE_CAPACITY = 500 # Bars kept per (symbol, timeframe) ring buffer
+
+# Local resampling of higher timeframes
+USE_LOCAL_RESAMPLING = False # Build higher timeframes from one base series instead of fetching each
+RESAMPLE_BASE_TIMEFRAME = mt5.TIMEFRAME_H1 # H1 can derive 4H/6H/12H/1D/1W, H4 only 12H/1D/1W
+RESAMPLE_BASE_BARS = 500 # Base bars kept; must span at least one full week of the base timeframe
+RESAMPLE_VALIDATE = False # Diff locally built bars against terminal-fetched ones every scan
+
+# On-disk bar archive
+USE_BAR_STORE = False # Append every closed bar get_ohlc_data sees to the local bar store
+BAR_STORE_DIR = "bar_store" # One directory of column files per (symbol, timeframe)
+BAR_STORE_SYNC_SECONDS = 60 # Appends are fsynced and committed at most this often (and on close); 0 = every append
+
+# Watchlist scanning
+WATCHLIST_MODE = False # Scan WATCHLIST for signals instead of trading SYMBOL
+WATCHLIST = [
+    "EURUSD", "GBPUSD", "USDJPY", "USDCHF", "AUDUSD", "NZDUSD", "USDCAD",
+    "EURGBP", "EURJPY", "GBPJPY", "XAUUSD", "XAGUSD", "US30", "NAS100", "GER40"
+]
+SCAN_FETCH_THREADS = 8 # Threads issuing terminal requests
+SCAN_WORKER_PROCESSES = os.cpu_count() or 1 # Processes running indicator math (1 = in-process)
+SCAN_INTERVAL_SECONDS = 300 # Pause between watchlist scans
+SCAN_BATCHED_INDICATORS = True # Compute each timeframe for all symbols of a shard in one (symbols x bars) pass (numpy backend)
+
+# Multi-terminal sharding
+SHARDED_MODE = False # Scan WATCHLIST across SHARD_TERMINALS, one worker process and terminal session each
+SHARD_TERMINALS = [ # One entry per worker; keys left out fall back to MT5_PATH/MT5_LOGIN/MT5_PASSWORD/MT5_SERVER
+    # {"path": r"C:\MT5-1\terminal64.exe", "login": 12345, "password": "...", "server": "MetaQuotes-Demo"},
+    # With the simulated broker the entries are SimulatedBroker overrides instead, e.g. {"latency_ms": 50},
+    # plus an optional "orders" list of requests sent once connected (to give the terminal open positions)
+]
+SHARD_VIRTUAL_NODES = 100 # Points per worker on the hash ring (more = more even spread of symbols)
+SHARD_RESPONSE_TIMEOUT_SECONDS = 120 # A worker that does not answer within this is treated as dead
+SHARD_RESTART_WORKERS = True # Respawn dead workers at the next scan; their symbols move back once they are up
+SHARD_FAILOVER_CHECK = False # With SHARDED_MODE, run check_shard_failover() against mt5_simulator instead of scanning
+
+# Bar-close scheduling
+USE_BAR_CLOSE_SCHEDULER = True # Wake at bar closes instead of polling every 5 minutes; signals use closed bars only and exits are checked hourly (at H1 closes) instead of every 5 minutes
+BROKER_TIMEZONE = "EET" # pytz zone of the broker's server clock (the zone MT5 bar times are in)
+BAR_CLOSE_SETTLE_SECONDS = 5 # Delay after a close so the terminal has the new bar
+
+# Tick streaming
+TICK_STREAM_MODE = False # Evaluate SYMBOL intrabar from live ticks instead of running run_bot
+TICK_BUFFER_MAX_BYTES = 16 * 1024 * 1024 # Memory cap for the in-process tick buffer
+TICK_POLL_SECONDS = 0.25 # How often new ticks are pulled from the terminal
+TICK_EVALUATION_INTERVAL_SECONDS = 1.0 # Throttle for indicator/alignment evaluation (0 = every tick batch)
+
+# Warm start
+WARM_START = True # Checkpoint bar caches, indicator state and last signals, and resume from them on boot
+CHECKPOINT_PATH = "bot_checkpoint.pkl" # Local, trusted file (it is unpickled on boot)
+CHECKPOINT_INTERVAL_SECONDS = 300 # Minimum spacing between periodic checkpoints
+CHECKPOINT_MAX_AGE_SECONDS = 7 * 24 * 3600 # Older checkpoints are ignored and the bot starts cold
+
+# Benchmarks (offline, against mt5_simulator)
+BENCHMARK_MODE = False # Run the benchmark suite instead of the bot
+BENCHMARK_SIZES = (200, 10_000, 1_000_000) # Bars per synthetic series
+BENCHMARK_SYMBOL_COUNTS = (1, 5, 15) # Symbols per benchmarked scan cycle
+BENCHMARK_RESULTS_PATH = "benchmark_results.json" # Written after every run
+BENCHMARK_BASELINE_PATH = "benchmark_baseline.json" # Compared against when it exists (copy a results file here)
+BENCHMARK_REGRESSION_THRESHOLD = 0.25 # Fail when a benchmark is this much slower than the baseline
+BENCHMARK_MIN_SECONDS = 0.5 # Keep repeating a benchmark until this much time has been spent
+BENCHMARK_PANDAS_TA_MAX_BARS = 100_000 # pandas_ta references are skipped above this size (its PSAR loops per bar)
+BENCHMARK_BATCH_SYMBOL_COUNTS = (15, 200, 1000) # Symbols per batched vs per-symbol indicator benchmark
+BENCHMARK_TICKS = 200_000 # Synthetic ticks per TickBarBuilder benchmark run
+
+# Parameter sweep (offline, over run_backtest)
+OPTIMIZER_MODE = False # Sweep OPTIMIZER_SPACE over SYMBOL's H1 history instead of running the bot
+OPTIMIZER_BARS = 20000 # H1 bars swept (from the bar store when USE_BAR_STORE, otherwise the terminal)
+OPTIMIZER_SPACE = { # Candidate values per parameter; parameters not listed keep their configured value
+    'EMA_SHORT_PERIOD': [10, 20, 30],
+    'EMA_LONG_PERIOD': [50, 100, 200],
+    'MACD_FAST_PERIOD': [8, 12],
+    'MACD_SLOW_PERIOD': [21, 26],
+    'RSI_PERIOD': [10, 14, 21],
+    'ATR_PERIOD': [14, 21],
+    'SL_ATR_MULTIPLIER': [1.0, 1.5, 2.0],
+    'TP_ATR_MULTIPLIER': [2.0, 3.0, 4.0],
+}
+OPTIMIZER_SAMPLES = None # Random combinations drawn from OPTIMIZER_SPACE (None = the full grid)
+OPTIMIZER_OBJECTIVE = "net_profit" # summarize_backtest key the results are ranked by
+OPTIMIZER_MIN_TRADES = 10 # Runs with fewer trades rank below every run that has enough
+OPTIMIZER_WORKERS = os.cpu_count() or 1 # Backtest processes (1 = in-process)
+OPTIMIZER_RESULTS_PATH = "optimizer_results.csv" # Ranked table written after every sweep
 
 # Multi-timeframe settings
 TIMEFRAMES = {
@@ -48,20 +254,408 @@ TIMEFRAMES = {
     "1W": mt5.TIMEFRAME_W1
 }
 
+# Nominal bar length in seconds per MT5 timeframe (MN1 approximated as 30 days)
+TIMEFRAME_SECONDS = {
+    mt5.TIMEFRAME_M1: 60,
+    mt5.TIMEFRAME_M5: 300,
+    mt5.TIMEFRAME_M15: 900,
+    mt5.TIMEFRAME_M30: 1800,
+    mt5.TIMEFRAME_H1: 3600,
+    mt5.TIMEFRAME_H4: 4 * 3600,
+    mt5.TIMEFRAME_H6: 6 * 3600,
+    mt5.TIMEFRAME_H12: 12 * 3600,
+    mt5.TIMEFRAME_D1: 86400,
+    mt5.TIMEFRAME_W1: 7 * 86400,
+    mt5.TIMEFRAME_MN1: 30 * 86400
+}
+
+if USE_SIMULATED_BROKER:
+    import mt5_simulator as mt5 # Same constant values as MetaTrader5, so the settings above stay valid
+
 # --- Telegram Bot Initialization ---
 bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN) # Use the constant here
+if TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = TELEGRAM_API_URL
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
 
 def send_telegram_message(message):
     """Sends a message to the configured Telegram chat."""
+    if TELEGRAM_ASYNC:
+        get_telegram_dispatcher().submit(message)
+        return
     try:
+        started = time.perf_counter()
         bot.send_message(TELEGRAM_CHAT_ID, message) # Use the constant here
+        if METRICS_ENABLED:
+            METRICS.observe("bot_stage_seconds", time.perf_counter() - started, stage="telegram_send")
+            METRICS.inc("bot_telegram_messages_total", status="sent")
         print(f"Telegram message sent: {message}")
     except Exception as e:
+        if METRICS_ENABLED:
+            METRICS.inc("bot_telegram_messages_total", status="failed")
         print(f"Error sending Telegram message: {e}")
 
+def _split_message(texts, limit=TELEGRAM_MAX_MESSAGE_LENGTH):
+    """Joins texts into as few messages under Telegram's length limit as possible."""
+    chunks, current = [], ""
+    for text in texts:
+        while len(text) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(text[:limit])
+            text = text[limit:]
+        candidate = f"{current}\n\n{text}" if current else text
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = text
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+class TelegramDispatcher:
+    """
+    Background sender for Telegram alerts. submit() never blocks the caller: messages
+    go into a bounded queue, and a daemon thread coalesces everything queued within
+    TELEGRAM_COALESCE_SECONDS per chat into one message, spaces sends per chat and
+    retries failures with exponential backoff (honouring Telegram's retry_after).
+    """
+
+    def __init__(self, bot, chat_id, max_queue=TELEGRAM_QUEUE_SIZE, overflow_policy=TELEGRAM_OVERFLOW_POLICY,
+                 coalesce_seconds=TELEGRAM_COALESCE_SECONDS, min_interval=TELEGRAM_MIN_INTERVAL_SECONDS,
+                 max_retries=TELEGRAM_MAX_RETRIES, backoff_seconds=TELEGRAM_RETRY_BACKOFF_SECONDS):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.pending = deque() # (chat_id, text, queued_at)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.last_sent = {} # chat_id -> monotonic time of the last send
+        self.counters = {'queued': 0, 'sent': 0, 'batches': 0, 'dropped': 0, 'failed': 0, 'retries': 0, 'max_depth': 0}
+        self.send_latency = deque(maxlen=1000) # Seconds per successful API call
+        self.delivery_latency = deque(maxlen=1000) # Seconds from submit() to delivery
+        self.thread = threading.Thread(target=self._run, name="telegram-dispatch", daemon=True)
+        self.thread.start()
+
+    def submit(self, message, chat_id=None):
+        """Queues a message; returns False if it was dropped by the overflow policy."""
+        with self.cond:
+            if len(self.pending) >= self.max_queue:
+                self.counters['dropped'] += 1
+                if self.overflow_policy == "drop_newest":
+                    return False
+                self.pending.popleft()
+            self.pending.append((chat_id if chat_id is not None else self.chat_id, message, time.monotonic()))
+            self.counters['queued'] += 1
+            self.counters['max_depth'] = max(self.counters['max_depth'], len(self.pending))
+            self.cond.notify_all()
+        return True
+
+    def flush(self, timeout=30.0):
+        """Waits until everything queued so far has been sent or given up on."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.pending or self.in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=30.0):
+        self.flush(timeout)
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                if self.stopping and not self.pending:
+                    return
+            time.sleep(self.coalesce_seconds) # Let the rest of this scan's messages arrive
+            with self.cond:
+                items = list(self.pending)
+                self.pending.clear()
+                self.in_flight = len(items)
+
+            by_chat = {}
+            for chat_id, text, queued_at in items:
+                by_chat.setdefault(chat_id, []).append((text, queued_at))
+            for chat_id, entries in by_chat.items():
+                oldest = entries[0][1]
+                delivered = all([self._send(chat_id, chunk) for chunk in _split_message([text for text, _ in entries])])
+                if delivered:
+                    self.delivery_latency.append(time.monotonic() - oldest)
+                    self.counters['sent'] += len(entries)
+
+            with self.cond:
+                self.in_flight = 0
+                self.cond.notify_all()
+
+    def _send(self, chat_id, text):
+        wait = self.last_sent.get(chat_id, -math.inf) + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                self.bot.send_message(chat_id, text)
+                self.last_sent[chat_id] = time.monotonic()
+                self.send_latency.append(self.last_sent[chat_id] - started)
+                if METRICS_ENABLED:
+                    METRICS.observe("bot_stage_seconds", self.send_latency[-1], stage="telegram_send")
+                    METRICS.inc("bot_telegram_messages_total", status="sent")
+                self.counters['batches'] += 1
+                print(f"Telegram message sent: {text}")
+                return True
+            except Exception as e:
+                self.last_sent[chat_id] = time.monotonic()
+                if attempt == self.max_retries:
+                    self.counters['failed'] += 1
+                    if METRICS_ENABLED:
+                        METRICS.inc("bot_telegram_messages_total", status="failed")
+                    print(f"Error sending Telegram message after {attempt + 1} attempts: {e}")
+                    return False
+                self.counters['retries'] += 1
+                # Telegram's 429 responses say how long to back off
+                retry_after = (getattr(e, 'result_json', None) or {}).get('parameters', {}).get('retry_after')
+                time.sleep(retry_after or self.backoff_seconds * 2 ** attempt)
+
+    def stats(self):
+        """Queue depth, counters and latency percentiles (ms)."""
+        with self.cond:
+            stats = dict(self.counters, depth=len(self.pending))
+        for name, values in (('send', self.send_latency), ('delivery', self.delivery_latency)):
+            values = np.array(values) * 1000 if values else np.zeros(1)
+            stats[f'{name}_p50_ms'] = float(np.percentile(values, 50))
+            stats[f'{name}_p95_ms'] = float(np.percentile(values, 95))
+        return stats
+
+_telegram_dispatcher = None
+_telegram_dispatcher_lock = threading.Lock()
+
+def get_telegram_dispatcher():
+    """Starts the background dispatcher on first use."""
+    global _telegram_dispatcher
+    with _telegram_dispatcher_lock:
+        if _telegram_dispatcher is None:
+            _telegram_dispatcher = TelegramDispatcher(bot, TELEGRAM_CHAT_ID)
+        return _telegram_dispatcher
+
+def stop_telegram_dispatcher(timeout=30.0):
+    """Delivers what is still queued and stops the background sender."""
+    if _telegram_dispatcher is not None:
+        _telegram_dispatcher.stop(timeout)
+
+# --- Metrics ---
+class Histogram:
+    """Count and sum of all observations plus a window of recent ones for percentiles."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        if not self.samples:
+            return {q: 0.0 for q in quantiles}
+        values = np.fromiter(self.samples, dtype=float, count=len(self.samples))
+        return dict(zip(quantiles, (float(v) for v in np.percentile(values, quantiles))))
+
+def _metric_name(name, labels):
+    """Prometheus-style series name, e.g. bot_stage_seconds{stage="fetch",timeframe="H4"}."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class MetricsRegistry:
+    """Thread-safe histograms (seconds), counters and gauges keyed by name and labels."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        """Plain-dict view: histogram percentiles in ms, counters and gauges."""
+        with self.lock:
+            histograms = {_metric_name(name, labels): (h.count, h.total, h.percentiles())
+                          for (name, labels), h in self.histograms.items()}
+            counters = {_metric_name(name, labels): value for (name, labels), value in self.counters.items()}
+            gauges = {_metric_name(name, labels): value for (name, labels), value in self.gauges.items()}
+        return {
+            'histograms': {key: {'count': count, 'sum_ms': total * 1000,
+                                 **{f'p{q}_ms': value * 1000 for q, value in percentiles.items()}}
+                           for key, (count, total, percentiles) in histograms.items()},
+            'counters': counters,
+            'gauges': gauges
+        }
+
+    def render(self):
+        """Prometheus text exposition format (histograms exported as summaries)."""
+        lines = []
+        with self.lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                for q, value in h.percentiles().items():
+                    lines.append(f"{_metric_name(name, labels + (('quantile', q / 100),))} {value:.6f}")
+                lines.append(f"{_metric_name(name + '_count', labels)} {h.count}")
+                lines.append(f"{_metric_name(name + '_sum', labels)} {h.total:.6f}")
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{_metric_name(name, labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"{_metric_name(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def stage_summary(self, top=6):
+        """Compact 'stage p95' listing of the slowest stages, for the per-cycle console line."""
+        with self.lock:
+            rows = [(h.percentiles((95,))[95], dict(labels)) for (name, labels), h in self.histograms.items()
+                    if name == "bot_stage_seconds"]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return ", ".join(f"{labels.get('stage')}{'/' + labels['timeframe'] if 'timeframe' in labels else ''} "
+                         f"{p95 * 1000:.0f} ms" for p95, labels in rows[:top])
+
+METRICS = MetricsRegistry()
+
+def timed(stage):
+    """Decorator recording each call's duration under bot_stage_seconds{stage=...}."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe("bot_stage_seconds", time.perf_counter() - started, stage=stage)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == "/metrics":
+            body, content_type = METRICS.render().encode(), "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(METRICS.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes would otherwise flood the bot's console
+
+_metrics_server = None
+_metrics_logger = None
+
+def start_metrics_server(port=METRICS_HTTP_PORT):
+    """Serves METRICS on 127.0.0.1:port from a daemon thread (once per process)."""
+    global _metrics_server
+    if port is None or _metrics_server is not None:
+        return _metrics_server
+    try:
+        _metrics_server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        print(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics at http://127.0.0.1:{port}/metrics")
+    return _metrics_server
+
+def log_metrics(path=METRICS_LOG_PATH):
+    """Appends the current snapshot as one JSON line to the rotating metrics log."""
+    global _metrics_logger
+    if path is None:
+        return
+    if _metrics_logger is None:
+        _metrics_logger = logging.getLogger("f0rtun3.metrics")
+        _metrics_logger.setLevel(logging.INFO)
+        _metrics_logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=METRICS_LOG_MAX_BYTES, backupCount=METRICS_LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _metrics_logger.addHandler(handler)
+    _metrics_logger.info(json.dumps({'time': datetime.now().isoformat(timespec='seconds'), **METRICS.snapshot()}))
+
+def update_gauges(open_positions=None):
+    """Cache sizes, queue depths and open positions as gauges."""
+    METRICS.set("bot_bar_caches", len(BAR_CACHES))
+    METRICS.set("bot_bar_cache_bars", sum(cache.count for cache in BAR_CACHES.values()))
+    METRICS.set("bot_indicator_engines", len(INDICATOR_ENGINES))
+    METRICS.set("bot_indicator_rows", sum(len(engine.rows) for engine in INDICATOR_ENGINES.values()))
+    METRICS.set("bot_symbol_info_cache", len(SYMBOL_INFO_CACHE))
+    memo = INDICATOR_MEMO.stats()
+    METRICS.set("bot_indicator_memo_entries", memo['entries'])
+    METRICS.set("bot_indicator_memo_bytes", memo['bytes'])
+    METRICS.set("bot_indicator_memo_hit_rate", memo['hit_rate'])
+    if _telegram_dispatcher is not None:
+        METRICS.set("bot_telegram_queue_depth", len(_telegram_dispatcher.pending))
+    if open_positions is not None:
+        METRICS.set("bot_open_positions", len(open_positions))
+
 # --- MT5 Connection and Data Retrieval ---
+def configure_simulated_broker(**overrides):
+    """Sets up mt5_simulator from the SIM_* settings, with its clock on broker server time."""
+    settings = dict(start=int(server_time_now(pytz.timezone(BROKER_TIMEZONE))), speed=SIM_SPEED,
+                    latency_ms=SIM_LATENCY_MS, order_latency_ms=SIM_ORDER_LATENCY_MS,
+                    latency_jitter_ms=SIM_LATENCY_JITTER_MS, requote_rate=SIM_REQUOTE_RATE,
+                    partial_fill_rate=SIM_PARTIAL_FILL_RATE, error_rates=SIM_ERROR_RATES)
+    settings.update(overrides)
+    return mt5.configure(**settings)
+
 def initialize_mt5():
     """Initializes connection to MetaTrader 5 terminal."""
+    if getattr(mt5, "SIMULATED", False) and not mt5.configured():
+        configure_simulated_broker()
+        print("Using the simulated MT5 broker (mt5_simulator).")
     print(f"Attempting to initialize MT5 from path: {MT5_PATH}") # Added print for debugging
     if not mt5.initialize(path=MT5_PATH, login=MT5_LOGIN, password=MT5_PASSWORD, server=MT5_SERVER, timeout=120000): # Increased timeout to 120 seconds (120000 ms)
         print(f"Failed to initialize MT5: {mt5.last_error()}")
@@ -77,63 +671,1373 @@ def shutdown_mt5():
 
 def get_ohlc_data(symbol, timeframe, bars=500):
     """Retrieves OHLC data for a given symbol and timeframe."""
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
+    started = time.perf_counter()
+    resampler = RESAMPLERS.get(symbol) if USE_LOCAL_RESAMPLING else None
+    if resampler is not None and resampler.serves(timeframe):
+        rates = resampler.fetch(timeframe, bars)
+    elif USE_LOCAL_RESAMPLING and can_resample(timeframe):
+        rates = get_resampler(symbol).fetch(timeframe, bars)
+    elif USE_BAR_CACHE:
+        rates = get_bar_cache(symbol, timeframe, bars).fetch(bars)
+    else:
+        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, bars)
+    if METRICS_ENABLED:
+        METRICS.observe("bot_stage_seconds", time.perf_counter() - started, stage="fetch",
+                        timeframe=TIMEFRAME_NAMES.get(timeframe, timeframe))
     if rates is None:
+        if METRICS_ENABLED:
+            METRICS.inc("bot_failures_total", stage="fetch")
         print(f"No rates data for {symbol} on {timeframe} - {mt5.last_error()}")
         return pd.DataFrame()
+    if USE_BAR_STORE:
+        archive_closed_bars(symbol, timeframe, rates)
     
+    return rates_to_frame(rates)
+
+def rates_to_frame(rates):
+    """Converts an MT5 rates array into a time-indexed DataFrame."""
     df = pd.DataFrame(rates)
     df['time'] = pd.to_datetime(df['time'], unit='s')
     df.set_index('time', inplace=True)
     return df
 
+# --- Bar Cache ---
+class BarCache:
+    """
+    Bounded ring buffer of MT5 rates for one (symbol, timeframe).
+    After the first full load, each refresh only asks the terminal for the bars
+    since the last cached one: the still-forming bar, anything that closed since,
+    and one already-closed bar of overlap used to detect history rewrites.
+    """
+
+    def __init__(self, symbol, timeframe, capacity=BAR_CACHE_CAPACITY):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.buffer = None # Structured array in the terminal's rates dtype
+        self.start = 0
+        self.count = 0
+        self.last_refresh = None
+        self.hits = 0 # Refreshes served by a delta fetch
+        self.misses = 0 # Full loads (cold start, stale cache, gap or rewrite)
+        self.gaps = 0
+        self.rewrites = 0
+        self.bars_fetched = 0
+
+    def _positions(self, n):
+        """Buffer positions of the last n cached bars, oldest first."""
+        return (self.start + self.count - n + np.arange(n)) % self.capacity
+
+    def rates(self, bars=None):
+        """Copy of the last `bars` cached bars in time order."""
+        n = self.count if bars is None else min(bars, self.count)
+        return self.buffer[self._positions(n)]
+
+    def last_time(self):
+        return int(self.buffer['time'][(self.start + self.count - 1) % self.capacity])
+
+    def _append(self, rates):
+        if len(rates) >= self.capacity:
+            self.buffer[:] = rates[-self.capacity:]
+            self.start, self.count = 0, self.capacity
+            return
+        self.buffer[(self.start + self.count + np.arange(len(rates))) % self.capacity] = rates
+        self.count += len(rates)
+        if self.count > self.capacity:
+            self.start = (self.start + self.count - self.capacity) % self.capacity
+            self.count = self.capacity
+
+    def _load(self, reason):
+        """Full reload of `capacity` bars from the terminal."""
+        rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, self.capacity)
+        if rates is None:
+            return False
+        if reason != "cold start":
+            print(f"Bar cache {self.symbol}/{self.timeframe}: full reload ({reason}).")
+        self.misses += 1
+        self.bars_fetched += len(rates)
+        self.buffer = np.empty(self.capacity, dtype=rates.dtype)
+        self.start = self.count = 0
+        self._append(rates)
+        self.last_refresh = time.time()
+        return True
+
+    def refresh(self):
+        """Brings the cache up to date with as few bars from the terminal as possible."""
+        if self.count == 0:
+            return self._load("cold start")
+
+        last_time = self.last_time()
+        bar_seconds = TIMEFRAME_SECONDS.get(self.timeframe, 60)
+        # Bars that can have opened since the last refresh, plus the forming bar and one bar of overlap
+        fetch_count = int((time.time() - self.last_refresh) // bar_seconds) + 3
+        while True:
+            if fetch_count >= min(self.capacity, self.count):
+                return self._load("cache too stale for a delta fetch")
+            rates = mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, fetch_count)
+            if rates is None:
+                return False
+            self.bars_fetched += len(rates)
+            if len(rates) and rates['time'][0] < last_time:
+                break
+            fetch_count *= 2 # Window does not reach back into the cache yet, widen it
+
+        # Closed bars we already hold must come back unchanged, otherwise the terminal rewrote history
+        overlap = rates[rates['time'] < last_time]
+        cached = self.rates(len(overlap) + 1)[:-1]
+        if len(cached) != len(overlap) or not np.array_equal(cached, overlap):
+            self.rewrites += 1
+            return self._load("history rewrite")
+
+        new_bars = rates[rates['time'] >= last_time]
+        if len(new_bars) == 0 or new_bars['time'][0] != last_time:
+            self.gaps += 1
+            return self._load("forming bar missing from terminal history")
+        if len(new_bars) > 1 and np.any(np.diff(new_bars['time']) <= 0):
+            self.gaps += 1
+            return self._load("out-of-order bars")
+
+        self.buffer[(self.start + self.count - 1) % self.capacity] = new_bars[0] # Forming bar update
+        self._append(new_bars[1:])
+        self.hits += 1
+        self.last_refresh = time.time()
+        return True
+
+    def fetch(self, bars):
+        """Refreshes and returns the last `bars` bars, or None if the terminal returned nothing."""
+        if not self.refresh():
+            return None
+        return self.rates(bars)
+
+    def merge(self, rates):
+        """Replaces the cached bars from rates[0]['time'] onwards with locally built `rates`."""
+        if len(rates) == 0:
+            return
+        if self.buffer is None:
+            self.buffer = np.empty(self.capacity, dtype=rates.dtype)
+        replaced = int(np.count_nonzero(self.rates()['time'] >= rates['time'][0]))
+        self.count -= replaced
+        self._append(rates)
+
+BAR_CACHES = {} # (symbol, timeframe) -> BarCache
+
+def get_bar_cache(symbol, timeframe, bars=BAR_CACHE_CAPACITY):
+    """Returns the cache for (symbol, timeframe), growing it if more bars are requested than it holds."""
+    cache = BAR_CACHES.get((symbol, timeframe))
+    if cache is None or cache.capacity < bars:
+        cache = BAR_CACHES[(symbol, timeframe)] = BarCache(symbol, timeframe, max(bars, BAR_CACHE_CAPACITY))
+    return cache
+
+def bar_cache_stats():
+    """Aggregated hit/miss counters over all bar caches."""
+    stats = {'caches': len(BAR_CACHES), 'hits': 0, 'misses': 0, 'gaps': 0, 'rewrites': 0, 'bars_fetched': 0}
+    for cache in BAR_CACHES.values():
+        stats['hits'] += cache.hits
+        stats['misses'] += cache.misses
+        stats['gaps'] += cache.gaps
+        stats['rewrites'] += cache.rewrites
+        stats['bars_fetched'] += cache.bars_fetched
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+# --- On-Disk Bar Store ---
+# Layout per (symbol, timeframe): one raw little-endian file per column plus meta.json,
+# which holds the committed row count, the file generation and per-column CRC32s.
+# The single writer appends column data first and then atomically replaces meta.json,
+# so readers mapping `count` rows never see a torn append. Appends are committed in
+# batches (BAR_STORE_SYNC_SECONDS); a crash loses at most the uncommitted tail.
+STORE_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                        ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+TIMEFRAME_NAMES = {
+    mt5.TIMEFRAME_M1: "M1", mt5.TIMEFRAME_M5: "M5", mt5.TIMEFRAME_M15: "M15", mt5.TIMEFRAME_M30: "M30",
+    mt5.TIMEFRAME_H1: "H1", mt5.TIMEFRAME_H4: "H4", mt5.TIMEFRAME_H6: "H6", mt5.TIMEFRAME_H12: "H12",
+    mt5.TIMEFRAME_D1: "D1", mt5.TIMEFRAME_W1: "W1", mt5.TIMEFRAME_MN1: "MN1"
+}
+
+def bar_store_path(symbol, timeframe, root=BAR_STORE_DIR):
+    return os.path.join(root, symbol, TIMEFRAME_NAMES.get(timeframe, str(timeframe)))
+
+def _column_file(path, name, generation):
+    return os.path.join(path, f"{name}.{generation}.bin")
+
+def _read_store_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'count': 0, 'generation': 0, 'crc': {name: 0 for name in STORE_DTYPE.names}}
+
+def _write_store_meta(path, meta):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+def _lock_file(fd):
+    """Non-blocking exclusive lock on an open file; the OS releases it if the process dies."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+def _unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+def _epoch_seconds(value):
+    """Bar-time bound as MT5 epoch seconds (ints pass through, datetimes/Timestamps are converted)."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(pd.Timestamp(value).timestamp())
+
+class BarStoreWriter:
+    """
+    Append-only writer for one (symbol, timeframe) store. Only one may exist per store: it holds
+    an OS lock on writer.lock, which a crashed writer releases, so a leftover file is never stale.
+    """
+
+    def __init__(self, symbol, timeframe, root=BAR_STORE_DIR, sync_seconds=BAR_STORE_SYNC_SECONDS):
+        self.path = bar_store_path(symbol, timeframe, root)
+        os.makedirs(self.path, exist_ok=True)
+        self.lock_path = os.path.join(self.path, "writer.lock")
+        self.lock_fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+        try:
+            _lock_file(self.lock_fd)
+        except OSError:
+            os.close(self.lock_fd)
+            self.lock_fd = None
+            raise RuntimeError(f"Bar store {self.path} already has a writer.")
+        os.ftruncate(self.lock_fd, 0)
+        os.write(self.lock_fd, str(os.getpid()).encode()) # For humans; the lock itself is what counts
+        self.sync_seconds = sync_seconds
+        self.pending = 0 # Rows written to the column files but not yet committed to meta.json
+        self.last_sync = time.monotonic()
+        self.meta = _read_store_meta(self.path)
+        self._truncate_torn_tail()
+        self.last_time = None
+        if self.meta['count']:
+            times = np.memmap(self._file('time'), dtype='<i8', mode='r', shape=(self.meta['count'],))
+            self.last_time = int(times[-1])
+            del times
+
+    def _file(self, name, generation=None):
+        return _column_file(self.path, name, self.meta['generation'] if generation is None else generation)
+
+    def _truncate_torn_tail(self):
+        """Drops bytes past the committed count left behind by an interrupted append."""
+        for name in STORE_DTYPE.names:
+            committed = self.meta['count'] * STORE_DTYPE[name].itemsize
+            file_name = self._file(name)
+            if not os.path.exists(file_name):
+                open(file_name, "wb").close()
+            elif os.path.getsize(file_name) > committed:
+                with open(file_name, "r+b") as f:
+                    f.truncate(committed)
+
+    def append(self, rates):
+        """Appends the bars newer than the last stored one; returns how many were written."""
+        if len(rates) == 0:
+            return 0
+        new = rates if self.last_time is None else rates[rates['time'] > self.last_time]
+        if len(new) == 0:
+            return 0
+        if len(new) > 1 and np.any(np.diff(new['time'].astype(np.int64)) <= 0):
+            raise ValueError("Bar store appends must be in strictly increasing time order.")
+        for name in STORE_DTYPE.names:
+            data = np.ascontiguousarray(new[name], dtype=STORE_DTYPE[name]).tobytes()
+            with open(self._file(name), "ab") as f:
+                f.write(data)
+            self.meta['crc'][name] = zlib.crc32(data, self.meta['crc'][name])
+        self.pending += len(new)
+        self.last_time = int(new['time'][-1])
+        if time.monotonic() - self.last_sync >= self.sync_seconds:
+            self.sync()
+        return len(new)
+
+    def sync(self):
+        """Flushes the appended column data to disk and commits it to readers (one fsync per file per batch)."""
+        if self.pending:
+            for name in STORE_DTYPE.names:
+                with open(self._file(name), "ab") as f:
+                    os.fsync(f.fileno())
+            self.meta['count'] += self.pending
+            _write_store_meta(self.path, self.meta) # Commit point for readers
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def compact(self, keep_from=None):
+        """
+        Rewrites the store into a new file generation, keeping only bars at or after
+        `keep_from` (all of them if None), then switches readers over via meta.json.
+        Readers keep working on the old generation until they refresh().
+        """
+        self.sync()
+        reader = BarStoreReader.from_path(self.path)
+        rates = reader.rates(start=keep_from)
+        del reader
+        old_generation = self.meta['generation']
+        meta = {'count': len(rates), 'generation': old_generation + 1, 'crc': {}}
+        for name in STORE_DTYPE.names:
+            data = np.ascontiguousarray(rates[name]).tobytes()
+            with open(self._file(name, meta['generation']), "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            meta['crc'][name] = zlib.crc32(data)
+        _write_store_meta(self.path, meta)
+        self.meta = meta
+        for name in STORE_DTYPE.names:
+            try:
+                os.remove(self._file(name, old_generation))
+            except OSError:
+                pass # Still mapped by a reader on Windows; the next compaction retries
+        return len(rates)
+
+    def close(self):
+        """Commits pending appends and releases the writer lock."""
+        if self.lock_fd is None:
+            return
+        self.sync()
+        _unlock_file(self.lock_fd)
+        os.close(self.lock_fd)
+        self.lock_fd = None
+
+class BarStoreReader:
+    """
+    Memory-mapped, read-only view of one store. slice() returns zero-copy column
+    views for a time range; refresh() picks up rows committed since the last call.
+    """
+
+    def __init__(self, symbol, timeframe, root=BAR_STORE_DIR):
+        self.path = bar_store_path(symbol, timeframe, root)
+        self.count = -1
+        self.generation = None
+        self.columns = {}
+        self.refresh()
+
+    @classmethod
+    def from_path(cls, path):
+        reader = cls.__new__(cls)
+        reader.path, reader.count, reader.generation, reader.columns = path, -1, None, {}
+        reader.refresh()
+        return reader
+
+    def refresh(self):
+        meta = _read_store_meta(self.path)
+        if meta['count'] == self.count and meta['generation'] == self.generation:
+            return
+        self.count, self.generation = meta['count'], meta['generation']
+        self.columns = {}
+        for name in STORE_DTYPE.names:
+            dtype = STORE_DTYPE[name]
+            if self.count:
+                self.columns[name] = np.memmap(_column_file(self.path, name, self.generation), dtype=dtype, mode='r', shape=(self.count,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    def _bounds(self, start, end):
+        times = self.columns['time']
+        start, end = _epoch_seconds(start), _epoch_seconds(end)
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+        return lo, hi
+
+    def slice(self, start=None, end=None):
+        """Column views (no copy) for bars with start <= time <= end."""
+        lo, hi = self._bounds(start, end)
+        return {name: column[lo:hi] for name, column in self.columns.items()}
+
+    def rates(self, start=None, end=None):
+        """Bars in the range as an MT5-style rates array (copied), e.g. for rates_to_frame."""
+        lo, hi = self._bounds(start, end)
+        out = np.empty(hi - lo, dtype=STORE_DTYPE)
+        for name, column in self.columns.items():
+            out[name] = column[lo:hi]
+        return out
+
+def verify_bar_store(symbol, timeframe, root=BAR_STORE_DIR):
+    """Integrity check of one store; returns a list of problems (empty when healthy)."""
+    path = bar_store_path(symbol, timeframe, root)
+    meta = _read_store_meta(path)
+    problems = []
+    for name in STORE_DTYPE.names:
+        file_name = _column_file(path, name, meta['generation'])
+        needed = meta['count'] * STORE_DTYPE[name].itemsize
+        size = os.path.getsize(file_name) if os.path.exists(file_name) else 0
+        if size < needed:
+            problems.append(f"{name}: {size} bytes on disk, {needed} committed")
+    if problems:
+        return problems
+    reader = BarStoreReader(symbol, timeframe, root)
+    for name, column in reader.columns.items():
+        if zlib.crc32(np.ascontiguousarray(column).tobytes()) != meta['crc'][name]:
+            problems.append(f"{name}: checksum mismatch")
+    times, highs, lows = reader.columns['time'], reader.columns['high'], reader.columns['low']
+    if len(times) > 1 and np.any(np.diff(times) <= 0):
+        problems.append("time: not strictly increasing")
+    bad = np.count_nonzero((highs < lows) | (reader.columns['open'] > highs) | (reader.columns['open'] < lows) |
+                           (reader.columns['close'] > highs) | (reader.columns['close'] < lows))
+    if bad:
+        problems.append(f"{bad} bars with open/close outside [low, high]")
+    return problems
+
+BAR_STORE_WRITERS = {} # (symbol, timeframe) -> BarStoreWriter
+
+def archive_closed_bars(symbol, timeframe, rates):
+    """Appends the closed bars of a fetch (all but the forming one) to the bar store."""
+    writer = BAR_STORE_WRITERS.get((symbol, timeframe))
+    if writer is None:
+        try:
+            writer = BAR_STORE_WRITERS[(symbol, timeframe)] = BarStoreWriter(symbol, timeframe)
+        except RuntimeError as e:
+            print(f"Bar store disabled for {symbol}/{timeframe}: {e}")
+            BAR_STORE_WRITERS[(symbol, timeframe)] = writer = False
+    if writer:
+        writer.append(rates[:-1])
+
+def close_bar_stores():
+    """Commits pending appends and releases every writer lock held by this process."""
+    for writer in BAR_STORE_WRITERS.values():
+        if writer:
+            writer.close()
+    BAR_STORE_WRITERS.clear()
+
+# --- Local Timeframe Resampling ---
+WEEK_ANCHOR = 3 * 86400 # 1970-01-04, the first Sunday: MT5 weekly bars open on Sunday server time
+
+def bucket_start(times, timeframe):
+    """Opening time (server epoch seconds) of the `timeframe` bar that each base bar time falls in."""
+    times = np.asarray(times, dtype=np.int64)
+    if timeframe == mt5.TIMEFRAME_W1:
+        return times - (times - WEEK_ANCHOR) % TIMEFRAME_SECONDS[timeframe]
+    return times - times % TIMEFRAME_SECONDS[timeframe]
+
+def can_resample(timeframe, base_timeframe=RESAMPLE_BASE_TIMEFRAME):
+    """True if `timeframe` bars are whole multiples of the base bars (monthly bars never are)."""
+    if timeframe == mt5.TIMEFRAME_MN1 or timeframe not in TIMEFRAME_SECONDS:
+        return False
+    seconds, base_seconds = TIMEFRAME_SECONDS[timeframe], TIMEFRAME_SECONDS[base_timeframe]
+    return seconds > base_seconds and seconds % base_seconds == 0
+
+def resample_rates(rates, timeframe):
+    """
+    Aggregates base rates into `timeframe` bars on server-time boundaries.
+    Buckets only exist where base bars exist, so session gaps and partial
+    Sunday sessions come out the same way the terminal builds them.
+    """
+    if len(rates) == 0:
+        return rates[:0]
+    keys = bucket_start(rates['time'], timeframe)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(rates)] - 1
+    bars = np.empty(len(starts), dtype=rates.dtype)
+    bars['time'] = keys[starts]
+    bars['open'] = rates['open'][starts]
+    bars['high'] = np.maximum.reduceat(rates['high'], starts)
+    bars['low'] = np.minimum.reduceat(rates['low'], starts)
+    bars['close'] = rates['close'][ends]
+    bars['tick_volume'] = np.add.reduceat(rates['tick_volume'], starts)
+    bars['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    bars['real_volume'] = np.add.reduceat(rates['real_volume'], starts)
+    return bars
+
+class TimeframeResampler:
+    """
+    Serves one symbol's base timeframe and every higher timeframe derivable from
+    it out of a single base BarCache. Each derived timeframe is seeded once from
+    the terminal; after that only the buckets touched by new base bars are rebuilt.
+    """
+
+    def __init__(self, symbol, base_timeframe=RESAMPLE_BASE_TIMEFRAME):
+        self.symbol = symbol
+        self.base_timeframe = base_timeframe
+        self.base = BarCache(symbol, base_timeframe, RESAMPLE_BASE_BARS)
+        self.targets = {} # timeframe -> BarCache filled locally after the seed
+        self.refreshed = False
+
+    def serves(self, timeframe):
+        return timeframe == self.base_timeframe or timeframe in self.targets
+
+    def add_timeframe(self, timeframe, bars=BAR_CACHE_CAPACITY):
+        if timeframe not in self.targets:
+            self.targets[timeframe] = BarCache(self.symbol, timeframe, max(bars, BAR_CACHE_CAPACITY))
+            self.refreshed = False
+
+    def refresh(self):
+        """One terminal call for the base series, then local rebuild of the derived timeframes."""
+        misses = self.base.misses
+        if not self.base.refresh():
+            return False
+        base_rates = self.base.rates()
+        base_reloaded = self.base.misses != misses
+
+        for timeframe, cache in self.targets.items():
+            if cache.count == 0 and not cache.refresh(): # One-off seed of the history from the terminal
+                continue
+            keys = bucket_start(base_rates['time'], timeframe)
+            since = cache.last_time() # The derived forming bar
+            if base_reloaded:
+                # Everything the base covers may have changed; skip its first, possibly partial, bucket
+                later = keys[keys != keys[0]]
+                if len(later):
+                    since = min(since, int(later[0]))
+            if base_rates['time'][0] >= since:
+                print(f"Resampler {self.symbol}: base history too short for {timeframe}, refetching it.")
+                cache.refresh()
+                continue
+            cache.merge(resample_rates(base_rates[keys >= since], timeframe))
+        self.refreshed = True
+        return True
+
+    def fetch(self, timeframe, bars):
+        """Bars from the current snapshot; refreshes only if nothing has been built yet."""
+        if timeframe != self.base_timeframe:
+            self.add_timeframe(timeframe, bars)
+        if not self.refreshed and not self.refresh():
+            return None
+        cache = self.base if timeframe == self.base_timeframe else self.targets[timeframe]
+        return cache.rates(bars) if cache.count else None
+
+    def validate(self, bars=50):
+        """
+        Diffs the last `bars` locally built bars of each derived timeframe against
+        the terminal's own. Returns {timeframe: [mismatch descriptions]}.
+        """
+        report = {}
+        for timeframe, cache in self.targets.items():
+            terminal = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, bars)
+            if terminal is None or cache.count == 0:
+                report[timeframe] = [f"no data ({mt5.last_error()})"]
+                continue
+            local = cache.rates(bars)
+            mismatches = []
+            local_by_time = {int(bar['time']): bar for bar in local}
+            for bar in terminal:
+                mine = local_by_time.get(int(bar['time']))
+                if mine is None:
+                    mismatches.append(f"{bar['time']}: missing locally")
+                    continue
+                for field in ('open', 'high', 'low', 'close', 'tick_volume'):
+                    if not np.isclose(mine[field], bar[field]):
+                        mismatches.append(f"{bar['time']}: {field} local={mine[field]} terminal={bar[field]}")
+            extra = set(local_by_time) - set(int(t) for t in terminal['time'])
+            extra = [t for t in extra if t >= int(terminal['time'][0])]
+            mismatches.extend(f"{t}: not in terminal history" for t in sorted(extra))
+            report[timeframe] = mismatches
+        return report
+
+RESAMPLERS = {} # symbol -> TimeframeResampler
+
+def get_resampler(symbol):
+    resampler = RESAMPLERS.get(symbol)
+    if resampler is None:
+        resampler = RESAMPLERS[symbol] = TimeframeResampler(symbol)
+    return resampler
+
+def refresh_resampler(symbol):
+    """Takes this scan's market snapshot for `symbol`; call once per cycle before get_ohlc_data."""
+    resampler = get_resampler(symbol)
+    for timeframe in TIMEFRAMES.values():
+        if can_resample(timeframe, resampler.base_timeframe):
+            resampler.add_timeframe(timeframe)
+    if not resampler.refresh():
+        print(f"Failed to refresh base bars for {symbol} - {mt5.last_error()}")
+        return
+    if RESAMPLE_VALIDATE:
+        for timeframe, mismatches in resampler.validate().items():
+            if mismatches:
+                print(f"Resample validation {symbol}/{timeframe}: {len(mismatches)} mismatches, first: {mismatches[0]}")
+            else:
+                print(f"Resample validation {symbol}/{timeframe}: OK")
+
 # --- Technical Indicator Calculations ---
+# One function per indicator over Series, dispatched on INDICATOR_BACKEND. Multi-column
+# indicators return their columns as a tuple, so nothing depends on pandas_ta's column names.
+def _kernel_input(series):
+    return indicator_kernels.as_array(series.to_numpy(dtype=np.float64))
+
+def ema_series(close, length):
+    if INDICATOR_BACKEND == "numpy":
+        return pd.Series(indicator_kernels.ema(_kernel_input(close), length), index=close.index)
+    return ta.ema(close, length=length)
+
+def macd_series(close, fast, slow, signal):
+    """(MACD line, histogram, signal line)."""
+    if INDICATOR_BACKEND == "numpy":
+        columns = indicator_kernels.macd(_kernel_input(close), fast, slow, signal)
+        return tuple(pd.Series(values, index=close.index) for values in columns)
+    macd = ta.macd(close, fast=fast, slow=slow, signal=signal)
+    return macd[macd.columns[0]], macd[macd.columns[1]], macd[macd.columns[2]]
+
+def pvo_series(volume, fast=PVO_FAST_PERIOD, slow=PVO_SLOW_PERIOD):
+    if INDICATOR_BACKEND == "numpy":
+        return pd.Series(indicator_kernels.pvo(_kernel_input(volume), fast, slow), index=volume.index)
+    pvo = ta.pvo(volume, fast=fast, slow=slow)
+    return pvo[pvo.columns[0]]
+
+def psar_series(high, low, close, af0, max_af):
+    """
+    Parabolic SAR on either side of price: pandas_ta's long SAR while rising and short SAR
+    while falling, so only the first bar is NaN. af0 is pandas_ta's step, the start af stays 0.02.
+    """
+    if INDICATOR_BACKEND == "numpy":
+        long_sar, short_sar = indicator_kernels.psar(_kernel_input(high), _kernel_input(low), _kernel_input(close),
+                                                     af0=af0, max_af=max_af)
+        return pd.Series(np.where(np.isnan(long_sar), short_sar, long_sar), index=high.index)
+    sar = ta.psar(high, low, close, af0=af0, max_af=max_af)
+    return sar[sar.columns[0]].fillna(sar[sar.columns[1]])
+
+def rsi_series(close, length):
+    if INDICATOR_BACKEND == "numpy":
+        return pd.Series(indicator_kernels.rsi(_kernel_input(close), length), index=close.index)
+    return ta.rsi(close, length=length)
+
+def stochrsi_series(rsi, length, k, d):
+    """(%K, %D) of ta.stochrsi, computed from an existing RSI series instead of a second RSI pass."""
+    if INDICATOR_BACKEND == "numpy":
+        stoch_k, stoch_d = indicator_kernels.stochrsi_from_rsi(_kernel_input(rsi), length, k, d)
+        return pd.Series(stoch_k, index=rsi.index), pd.Series(stoch_d, index=rsi.index)
+    lowest = rsi.rolling(length).min()
+    highest = rsi.rolling(length).max()
+    spread = highest - lowest
+    if spread.eq(0).any(): # pandas_ta's non_zero_range
+        spread = spread + sys.float_info.epsilon
+    stoch = 100 * (rsi - lowest) / spread
+    stoch_k = ta.sma(stoch, length=k)
+    return stoch_k, ta.sma(stoch_k, length=d)
+
+def atr_series(high, low, close, length):
+    if INDICATOR_BACKEND == "numpy":
+        return pd.Series(indicator_kernels.atr(_kernel_input(high), _kernel_input(low), _kernel_input(close), length),
+                         index=high.index)
+    return ta.atr(high, low, close, length=length)
+
+@timed("indicators")
 def calculate_indicators(df):
     """Calculates all specified technical indicators for a given DataFrame."""
     if df.empty:
         return pd.DataFrame() # Return empty if input is empty
 
     # EMA
-    df['EMA_Short'] = ta.ema(df['close'], length=EMA_SHORT_PERIOD)
-    df['EMA_Long'] = ta.ema(df['close'], length=EMA_LONG_PERIOD)
+    df['EMA_Short'] = ema_series(df['close'], EMA_SHORT_PERIOD)
+    df['EMA_Long'] = ema_series(df['close'], EMA_LONG_PERIOD)
 
     # MACD
-    macd = df.ta.macd(fast=MACD_FAST_PERIOD, slow=MACD_SLOW_PERIOD, signal=MACD_SIGNAL_PERIOD)
-    # print("MACD columns:", macd.columns)  # <--- debug line
-    df['MACD_Line'] = macd[macd.columns[0]]
-    df['MACD_Histogram'] = macd[macd.columns[1]]
-    df['MACD_Signal_Line'] = macd[macd.columns[2]]
+    macd_line, macd_histogram, macd_signal = macd_series(df['close'], MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD)
+    df['MACD_Line'] = macd_line
+    df['MACD_Histogram'] = macd_histogram
+    df['MACD_Signal_Line'] = macd_signal
 
 
     if 'volume' not in df.columns and 'tick_volume' in df.columns:
         df.rename(columns={'tick_volume': 'volume'}, inplace=True)
 
-    # Volume Oscillator (using PVO from pandas_ta as a proxy for Volume Oscillator)
-    pvo = ta.pvo(df['volume'])
-    # print("PVO columns:", pvo.columns)
-    df['Volume_Oscillator'] = pvo[pvo.columns[0]] # PVO is Percentage Volume Oscillator, a good proxy
+    # Volume Oscillator (PVO, Percentage Volume Oscillator, as a proxy)
+    df['Volume_Oscillator'] = pvo_series(df['volume'])
 
     # SAR (Parabolic SAR)
-    sar = ta.psar(df['high'], df['low'], df['close'], af0=SAR_ACCELERATION, afmax=SAR_MAX_ACCELERATION)
-    # print("SAR columns:", sar.columns)
-    # df['SAR'] = sar[f'PSAR_{SAR_ACCELERATION}_{SAR_MAX_ACCELERATION}']
-    df['SAR'] = sar[sar.columns[0]]
+    df['SAR'] = psar_series(df['high'], df['low'], df['close'], SAR_ACCELERATION, SAR_MAX_ACCELERATION)
 
     # RSI
-    df['RSI'] = ta.rsi(df['close'], length=RSI_PERIOD)
+    df['RSI'] = rsi_series(df['close'], RSI_PERIOD)
 
     # Stochastic RSI
-    stoch_rsi = ta.stochrsi(df['close'], length=STOCH_RSI_K_PERIOD, rsi_length=RSI_PERIOD, k=STOCH_RSI_SMOOTH_K, d=STOCH_RSI_SMOOTH_D)
-    df['StochRSI_K'] = stoch_rsi[f'STOCHRSIk_{RSI_PERIOD}_{STOCH_RSI_K_PERIOD}_{STOCH_RSI_SMOOTH_K}_{STOCH_RSI_SMOOTH_D}']
-    df['StochRSI_D'] = stoch_rsi[f'STOCHRSId_{RSI_PERIOD}_{STOCH_RSI_K_PERIOD}_{STOCH_RSI_SMOOTH_K}_{STOCH_RSI_SMOOTH_D}']
+    df['StochRSI_K'], df['StochRSI_D'] = stochrsi_series(df['RSI'], STOCH_RSI_K_PERIOD, STOCH_RSI_SMOOTH_K, STOCH_RSI_SMOOTH_D)
 
     # ATR for dynamic SL/TP
-    df['ATR'] = ta.atr(df['high'], df['low'], df['close'], length=ATR_PERIOD)
+    df['ATR'] = atr_series(df['high'], df['low'], df['close'], ATR_PERIOD)
 
     # Drop any NaN values that result from indicator calculations
     df.dropna(inplace=True)
     return df
 
+# --- Strategy Rules ---
+# ALIGNMENT_RULES and REVERSAL_RULES are compiled once into one NumPy function per
+# rule list (and per timeframe with overrides). The same function evaluates a single
+# bar, a whole history, or the latest bars of every symbol and timeframe stacked together.
+_RULE_OPERATORS = {ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=', ast.Eq: '==', ast.NotEq: '!=',
+                   ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+RULE_BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume') # Bar columns a condition may read besides indicator columns
+
+def _vector_expression(node, thresholds, columns):
+    """NumPy source for one parsed rule expression, as (source, is_condition). Collects column names."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_vector_expression(value, thresholds, columns) for value in node.values]
+        if not all(is_condition for _, is_condition in parts):
+            raise ValueError("'and'/'or' combine conditions, not values")
+        joiner = " & " if isinstance(node.op, ast.And) else " | "
+        return "(" + joiner.join(source for source, _ in parts) + ")", True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        source, is_condition = _vector_expression(node.operand, thresholds, columns)
+        if isinstance(node.op, ast.USub):
+            return f"(-{source})", False
+        if not is_condition:
+            raise ValueError("'not' applies to a condition, not a value")
+        return f"(~{source})", True
+    if isinstance(node, ast.Compare):
+        if not all(type(op) in _RULE_OPERATORS for op in node.ops):
+            raise ValueError("only < <= > >= == != comparisons are supported")
+        sources = [_vector_expression(operand, thresholds, columns)[0] for operand in [node.left] + node.comparators]
+        pairs = [f"({left} {_RULE_OPERATORS[type(op)]} {right})" for left, op, right in zip(sources, node.ops, sources[1:])]
+        return "(" + " & ".join(pairs) + ")", True
+    if isinstance(node, ast.BinOp) and type(node.op) in _RULE_OPERATORS:
+        left, _ = _vector_expression(node.left, thresholds, columns)
+        right, _ = _vector_expression(node.right, thresholds, columns)
+        return f"({left} {_RULE_OPERATORS[type(node.op)]} {right})", False
+    if isinstance(node, ast.Name):
+        if node.id in thresholds:
+            return repr(thresholds[node.id]), False
+        columns.add(node.id)
+        return f"columns[{node.id!r}]", False
+    if isinstance(node, ast.Constant) and isinstance(node.value, bool):
+        return f"np.{node.value}_", True # NumPy booleans, so 'not True' negates instead of giving -2
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return repr(node.value), False
+    raise ValueError(f"unsupported expression {ast.unparse(node)!r}")
+
+class CompiledRules:
+    """
+    A rule list of (name, first condition, second condition) compiled into one function
+    returning both bit masks, e.g. (bullish, bearish) for ALIGNMENT_RULES.
+    """
+
+    def __init__(self, rules, thresholds, label="rules"):
+        self.names = [name for name, *_ in rules]
+        self.all_mask = (1 << len(rules)) - 1
+        dtype = np.min_scalar_type(self.all_mask).name
+        columns = set()
+        lines = ["def evaluate(columns, shape):",
+                 f"    first = np.zeros(shape, dtype=np.{dtype})",
+                 f"    second = np.zeros(shape, dtype=np.{dtype})",
+                 "    with np.errstate(divide='ignore', invalid='ignore'):"]
+        for bit, (name, *conditions) in enumerate(rules):
+            if len(conditions) != 2:
+                raise ValueError(f"{label} {name!r}: expected two conditions, got {len(conditions)}")
+            for target, condition in zip(("first", "second"), conditions):
+                try:
+                    source, is_condition = _vector_expression(ast.parse(condition, mode="eval").body, thresholds, columns)
+                    if not is_condition:
+                        raise ValueError("expression is a value, not a condition")
+                except (SyntaxError, ValueError) as e:
+                    raise ValueError(f"{label} {name!r}: {condition!r}: {e}") from None
+                lines.append(f"        {target} |= np.asarray({source}, dtype=np.{dtype}) << {bit}")
+        lines.append("    return first, second")
+        unknown = columns - set(COLUMN_NODES) - set(RULE_BAR_COLUMNS)
+        if unknown:
+            raise ValueError(f"{label}s read unknown names (not a column or RULE_THRESHOLDS entry): {', '.join(sorted(unknown))}")
+        self.columns = tuple(sorted(columns))
+        self.source = "\n".join(lines)
+        namespace = {'np': np}
+        exec(compile(self.source, f"<{label}>", "exec"), namespace)
+        self._evaluate = namespace['evaluate']
+
+    def evaluate(self, columns, shape):
+        """Masks for {column: array} inputs that broadcast to `shape`."""
+        return self._evaluate(columns, shape)
+
+    def masks(self, df):
+        """Masks for every row of an indicator frame."""
+        return self._evaluate({column: df[column].to_numpy(dtype=float) for column in self.columns}, len(df))
+
+_COMPILED_RULES = {}
+
+def compiled_rules(kind, timeframe=None):
+    """CompiledRules for "alignment" or "reversal" on `timeframe`, compiled on first use."""
+    override = TIMEFRAME_RULE_OVERRIDES.get(timeframe)
+    if not override:
+        timeframe = None # Timeframes without overrides share the default rules
+    key = (kind, timeframe)
+    if key not in _COMPILED_RULES:
+        rules = ALIGNMENT_RULES if kind == "alignment" else REVERSAL_RULES
+        thresholds = dict(RULE_THRESHOLDS)
+        if override:
+            thresholds.update(override.get('thresholds', {}))
+            replaced = override.get(kind, {})
+            unknown = set(replaced) - {name for name, *_ in rules}
+            if unknown:
+                raise ValueError(f"{timeframe} {kind} override names unknown rules: {', '.join(sorted(unknown))}")
+            rules = [(name, *replaced.get(name, conditions)) for name, *conditions in rules]
+        label = f"{kind} rule" if timeframe is None else f"{timeframe} {kind} rule"
+        _COMPILED_RULES[key] = CompiledRules(rules, thresholds, label)
+    return _COMPILED_RULES[key]
+
+def rule_columns(kind):
+    """Every column the `kind` rules read, across the default rules and all timeframe overrides."""
+    columns = set(compiled_rules(kind).columns)
+    for timeframe in TIMEFRAME_RULE_OVERRIDES:
+        columns.update(compiled_rules(kind, timeframe).columns)
+    return tuple(sorted(columns))
+
+def batch_rule_masks(kind, rows, timeframes):
+    """
+    Evaluates the `kind` rules over stacked indicator rows, e.g. the latest bar of every
+    symbol and timeframe, with each row's timeframe given in `timeframes`. Rows that share
+    compiled rules are evaluated in one call. Returns (first, second) masks in row order.
+    """
+    timeframes = np.asarray(timeframes, dtype=object)
+    groups = {}
+    for timeframe in dict.fromkeys(timeframes):
+        rules = compiled_rules(kind, timeframe)
+        groups.setdefault(id(rules), (rules, []))[1].append(timeframe)
+    first = second = None
+    for rules, group_timeframes in groups.values():
+        selected = np.flatnonzero(np.isin(timeframes, group_timeframes))
+        columns = {column: rows[column].to_numpy(dtype=float)[selected] for column in rules.columns}
+        group_first, group_second = rules.evaluate(columns, len(selected))
+        if first is None:
+            first = np.zeros(len(timeframes), dtype=group_first.dtype)
+            second = np.zeros(len(timeframes), dtype=group_second.dtype)
+        first[selected], second[selected] = group_first, group_second
+    if first is None:
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8)
+    return first, second
+
+# --- Indicator Graph ---
+# Each node maps its input columns (bar columns or other nodes' outputs) to one or more
+# indicator columns. Settings are read when a node runs, so changed periods take effect.
+def _ema_short_node(close):
+    return {'EMA_Short': ema_series(close, EMA_SHORT_PERIOD)}
+
+def _ema_long_node(close):
+    return {'EMA_Long': ema_series(close, EMA_LONG_PERIOD)}
+
+def _macd_node(close):
+    line, histogram, signal = macd_series(close, MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD)
+    return {'MACD_Line': line, 'MACD_Histogram': histogram, 'MACD_Signal_Line': signal}
+
+def _volume_oscillator_node(volume):
+    return {'Volume_Oscillator': pvo_series(volume)}
+
+def _sar_node(high, low, close):
+    return {'SAR': psar_series(high, low, close, SAR_ACCELERATION, SAR_MAX_ACCELERATION)}
+
+def _rsi_node(close):
+    return {'RSI': rsi_series(close, RSI_PERIOD)}
+
+def _stochrsi_node(rsi):
+    stoch_k, stoch_d = stochrsi_series(rsi, STOCH_RSI_K_PERIOD, STOCH_RSI_SMOOTH_K, STOCH_RSI_SMOOTH_D)
+    return {'StochRSI_K': stoch_k, 'StochRSI_D': stoch_d}
+
+def _atr_node(high, low, close):
+    return {'ATR': atr_series(high, low, close, ATR_PERIOD)}
+
+INDICATOR_GRAPH = { # node -> (input columns, output columns, function)
+    'EMA_Short': (('close',), ('EMA_Short',), _ema_short_node),
+    'EMA_Long': (('close',), ('EMA_Long',), _ema_long_node),
+    'MACD': (('close',), ('MACD_Line', 'MACD_Histogram', 'MACD_Signal_Line'), _macd_node),
+    'Volume_Oscillator': (('volume',), ('Volume_Oscillator',), _volume_oscillator_node),
+    'SAR': (('high', 'low', 'close'), ('SAR',), _sar_node),
+    'RSI': (('close',), ('RSI',), _rsi_node),
+    'StochRSI': (('RSI',), ('StochRSI_K', 'StochRSI_D'), _stochrsi_node),
+    'ATR': (('high', 'low', 'close'), ('ATR',), _atr_node),
+}
+COLUMN_NODES = {column: node for node, (_, outputs, _) in INDICATOR_GRAPH.items() for column in outputs}
+
+def compile_all_rules():
+    """Compiles the default rules and every TIMEFRAME_RULE_OVERRIDES entry, so a bad rule fails at import, not mid-scan."""
+    for kind in ("alignment", "reversal"):
+        for timeframe in (None, *TIMEFRAME_RULE_OVERRIDES):
+            compiled_rules(kind, timeframe)
+
+compile_all_rules()
+
+# Columns each consumer reads, taken from the rules so a new condition gets its indicators computed
+ALIGNMENT_COLUMNS = tuple(column for column in rule_columns("alignment") if column in COLUMN_NODES)
+SCAN_COLUMNS = tuple(dict.fromkeys(ALIGNMENT_COLUMNS + ('ATR',))) # Alignment plus ATR for SL/TP sizing
+EXIT_COLUMNS = tuple(column for column in rule_columns("reversal") if column in COLUMN_NODES) # monitor_and_exit_trades
+
+def indicator_plan(columns):
+    """Graph nodes needed for `columns`, each once and after the nodes it reads from."""
+    plan = []
+    def visit(node):
+        if node in plan:
+            return
+        for source in INDICATOR_GRAPH[node][0]:
+            if source in COLUMN_NODES:
+                visit(COLUMN_NODES[source])
+        plan.append(node)
+    for column in columns:
+        visit(COLUMN_NODES[column])
+    return plan
+
+@timed("indicators")
+def compute_indicators(df, columns=None):
+    """
+    Lazy calculate_indicators: runs only the graph nodes `columns` depend on (None = all)
+    and leaves the input frame untouched. Rows are dropped only where a requested column
+    is still NaN, so a consumer with short lookbacks keeps more of the fetched history;
+    frame.attrs['warmup'] holds the leading NaN rows of each computed column.
+    """
+    if df.empty:
+        return pd.DataFrame()
+    columns = tuple(COLUMN_NODES) if columns is None else tuple(columns)
+    out = df.rename(columns={'tick_volume': 'volume'}) if 'volume' not in df.columns else df.copy()
+    warmup = {}
+    for node in indicator_plan(columns):
+        inputs, _, function = INDICATOR_GRAPH[node]
+        for column, series in function(*(out[source] for source in inputs)).items():
+            out[column] = series
+            first_valid = series.first_valid_index()
+            warmup[column] = len(series) if first_valid is None else series.index.get_loc(first_valid)
+    out = out.dropna(subset=list(columns))
+    out.attrs['warmup'] = warmup
+    return out
+
+# --- Batched Indicators ---
+# INDICATOR_GRAPH nodes over (symbols x bars) matrices: one NumPy pass per indicator
+# computes it for every symbol, instead of one pandas round trip per symbol.
+def _combined_sar_rows(long_sar, short_sar):
+    """psar_series' combined SAR from psar_rows' long and short matrices."""
+    return (np.where(np.isnan(long_sar), short_sar, long_sar),)
+
+BATCH_GRAPH = { # node -> function of the node's input matrices returning its output matrices in order
+    'EMA_Short': lambda close: (indicator_kernels.ema_rows(close, EMA_SHORT_PERIOD),),
+    'EMA_Long': lambda close: (indicator_kernels.ema_rows(close, EMA_LONG_PERIOD),),
+    'MACD': lambda close: indicator_kernels.macd_rows(close, MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD),
+    'Volume_Oscillator': lambda volume: (indicator_kernels.pvo_rows(volume, PVO_FAST_PERIOD, PVO_SLOW_PERIOD),),
+    'SAR': lambda high, low, close: _combined_sar_rows(*indicator_kernels.psar_rows(
+        high, low, close, af0=SAR_ACCELERATION, max_af=SAR_MAX_ACCELERATION)),
+    'RSI': lambda close: (indicator_kernels.rsi_rows(close, RSI_PERIOD),),
+    'StochRSI': lambda rsi: indicator_kernels.stochrsi_from_rsi_rows(rsi, STOCH_RSI_K_PERIOD, STOCH_RSI_SMOOTH_K,
+                                                                     STOCH_RSI_SMOOTH_D),
+    'ATR': lambda high, low, close: (indicator_kernels.atr_rows(high, low, close, ATR_PERIOD),),
+}
+
+class IndicatorBatch:
+    """
+    Indicators for many symbols on one timeframe. The raw frames are stacked into
+    (symbols x bars) matrices, right-aligned on each symbol's latest bar with shorter
+    histories NaN-padded at the front, and the graph nodes for `columns` (None = all)
+    run once over all rows. Every row equals the single-symbol kernels' result.
+    """
+
+    def __init__(self, frames, columns=None):
+        self.frames = dict(frames) # symbol -> raw get_ohlc_data frame
+        self.rows = {symbol: i for i, symbol in enumerate(self.frames)}
+        self.columns = tuple(COLUMN_NODES) if columns is None else tuple(columns)
+        self.width = max((len(df) for df in self.frames.values()), default=0)
+        self.pads = {symbol: self.width - len(df) for symbol, df in self.frames.items()}
+        self.matrices = {}
+        for column in ('open', 'high', 'low', 'close', 'volume'):
+            matrix = np.full((len(self.frames), self.width), np.nan)
+            for symbol, df in self.frames.items():
+                if len(df):
+                    source = 'tick_volume' if column == 'volume' and 'volume' not in df.columns else column
+                    matrix[self.rows[symbol], self.pads[symbol]:] = df[source].to_numpy(dtype=np.float64)
+            self.matrices[column] = matrix
+        self.plan = indicator_plan(self.columns)
+        for node in self.plan:
+            inputs, outputs, _ = INDICATOR_GRAPH[node]
+            self.matrices.update(zip(outputs, BATCH_GRAPH[node](*(self.matrices[source] for source in inputs))))
+
+    def values(self, symbol, column):
+        """One symbol's `column` as a view into the batch matrix (no copy)."""
+        return self.matrices[column][self.rows[symbol], self.pads[symbol]:]
+
+    def latest_positions(self):
+        """
+        Per symbol, the matrix column of the last bar where every requested column is valid
+        (-1 = none): the last row compute_indicators would keep after its dropna.
+        """
+        if self.width == 0:
+            return np.full(len(self.rows), -1)
+        valid = np.ones((len(self.rows), self.width), dtype=bool)
+        for column in self.columns:
+            valid &= ~np.isnan(self.matrices[column])
+        positions = self.width - 1 - valid[:, ::-1].argmax(axis=1)
+        positions[~valid.any(axis=1)] = -1
+        return positions
+
+    def frame(self, symbol):
+        """compute_indicators(frames[symbol], columns), built from the batch (this copies)."""
+        df = self.frames[symbol]
+        if df.empty:
+            return pd.DataFrame()
+        out = df.rename(columns={'tick_volume': 'volume'}) if 'volume' not in df.columns else df.copy()
+        warmup = {}
+        for node in self.plan:
+            for column in INDICATOR_GRAPH[node][1]:
+                values = self.values(symbol, column)
+                out[column] = values
+                valid = np.flatnonzero(~np.isnan(values))
+                warmup[column] = int(valid[0]) if len(valid) else len(values)
+        out = out.dropna(subset=list(self.columns))
+        out.attrs['warmup'] = warmup
+        return out
+
+# --- Incremental Indicator Engine ---
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'spread', 'real_volume']
+INDICATOR_COLUMNS = [
+    'EMA_Short', 'EMA_Long', 'MACD_Line', 'MACD_Histogram', 'MACD_Signal_Line',
+    'Volume_Oscillator', 'SAR', 'RSI', 'StochRSI_K', 'StochRSI_D', 'ATR'
+]
+
+def _clone_slots(obj):
+    """Shallow copy of a __slots__ object (all slot values are floats/ints/bools)."""
+    other = object.__new__(type(obj))
+    for name in type(obj).__slots__:
+        setattr(other, name, getattr(obj, name))
+    return other
+
+def _window_mean(window):
+    """Mean of a full rolling window, NaN while it is filling or holds a NaN (pandas rolling semantics)."""
+    if len(window) < window.maxlen or any(v != v for v in window):
+        return np.nan
+    return sum(window) / window.maxlen
+
+class _SeededEma:
+    """pandas_ta EMA: SMA of the first `length` values, then the usual 2/(n+1) recursion."""
+    __slots__ = ('length', 'alpha', 'count', 'total', 'value')
+
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = np.nan
+
+    def push(self, x):
+        self.count += 1
+        if self.count < self.length:
+            self.total += x
+        elif self.count == self.length:
+            self.value = (self.total + x) / self.length
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+class _WilderAverage:
+    """pandas_ta rma: adjusted EWM with alpha = 1/length, NaN until `length` observations."""
+    __slots__ = ('length', 'decay', 'count', 'num', 'den')
+
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.count = 0
+        self.num = 0.0
+        self.den = 0.0
+
+    def push(self, x):
+        self.num = x + self.decay * self.num
+        self.den = 1.0 + self.decay * self.den
+        self.count += 1
+        return self.num / self.den if self.count >= self.length else np.nan
+
+class _ParabolicSar:
+    """
+    pandas_ta psar recursion. Returns the SAR on whichever side of price it is
+    (long while rising, short while falling), like psar_series' 'SAR' column.
+    """
+    __slots__ = ('af0', 'max_af', 'af', 'falling', 'sar', 'ep', 'bars',
+                 'high1', 'high2', 'low1', 'low2', 'first_close')
+
+    def __init__(self, af0, max_af, af=0.02):
+        self.af0 = af0
+        self.max_af = max_af
+        self.af = af # Like pandas_ta: start at af, step by af0, restart at af0 after a reversal
+        self.falling = False
+        self.sar = self.ep = self.first_close = np.nan
+        self.high1 = self.high2 = self.low1 = self.low2 = np.nan
+        self.bars = 0
+
+    def push(self, high, low, close):
+        self.bars += 1
+        if self.bars == 1:
+            self.high1 = self.high2 = high
+            self.low1 = self.low2 = low
+            self.first_close = close
+            return np.nan
+        if self.bars == 2:
+            # Initial trend from the first -DM, seeded at the first close like pandas_ta.
+            # pandas_ta reads high[-1]/low[-1] (the window's last bar) as the bar two back
+            # here; the first bar is used instead so the state does not depend on the future.
+            up = high - self.high1
+            down = self.low1 - low
+            self.falling = down > up and down > 0
+            self.ep = self.low1 if self.falling else self.high1
+            self.sar = self.first_close
+
+        sar = self.sar + self.af * (self.ep - self.sar)
+        if self.falling:
+            reverse = high > sar
+            if low < self.ep:
+                self.ep = low
+                self.af = min(self.af + self.af0, self.max_af)
+            sar = max(self.high1, self.high2, sar)
+        else:
+            reverse = low < sar
+            if high > self.ep:
+                self.ep = high
+                self.af = min(self.af + self.af0, self.max_af)
+            sar = min(self.low1, self.low2, sar)
+
+        if reverse:
+            sar = self.ep
+            self.af = self.af0
+            self.falling = not self.falling
+            self.ep = low if self.falling else high
+
+        self.sar = sar
+        self.high2, self.low2 = self.high1, self.low1
+        self.high1, self.low1 = high, low
+        return sar
+
+class _IndicatorState:
+    """Running state behind every column calculate_indicators produces."""
+
+    def __init__(self):
+        self.ema_short = _SeededEma(EMA_SHORT_PERIOD)
+        self.ema_long = _SeededEma(EMA_LONG_PERIOD)
+        self.macd_fast = _SeededEma(MACD_FAST_PERIOD)
+        self.macd_slow = _SeededEma(MACD_SLOW_PERIOD)
+        self.macd_signal = _SeededEma(MACD_SIGNAL_PERIOD)
+        self.pvo_fast = _SeededEma(PVO_FAST_PERIOD)
+        self.pvo_slow = _SeededEma(PVO_SLOW_PERIOD)
+        self.rsi_gain = _WilderAverage(RSI_PERIOD)
+        self.rsi_loss = _WilderAverage(RSI_PERIOD)
+        self.atr = _WilderAverage(ATR_PERIOD)
+        self.psar = _ParabolicSar(SAR_ACCELERATION, SAR_MAX_ACCELERATION)
+        self.rsi_window = deque(maxlen=STOCH_RSI_K_PERIOD)
+        self.stoch_window = deque(maxlen=STOCH_RSI_SMOOTH_K)
+        self.k_window = deque(maxlen=STOCH_RSI_SMOOTH_D)
+        self.prev_close = None
+
+    def clone(self):
+        other = object.__new__(_IndicatorState)
+        for name, value in self.__dict__.items():
+            if isinstance(value, deque):
+                value = deque(value, maxlen=value.maxlen)
+            elif hasattr(value, '__slots__'):
+                value = _clone_slots(value)
+            other.__dict__[name] = value
+        return other
+
+    def push(self, high, low, close, volume):
+        """Advances every indicator by one bar and returns the values in INDICATOR_COLUMNS order."""
+        ema_short = self.ema_short.push(close)
+        ema_long = self.ema_long.push(close)
+
+        macd_line = self.macd_fast.push(close) - self.macd_slow.push(close)
+        macd_signal = macd_hist = np.nan
+        if macd_line == macd_line: # Signal EMA starts at the first valid MACD value
+            macd_signal = self.macd_signal.push(macd_line)
+            macd_hist = macd_line - macd_signal
+
+        pvo_fast = self.pvo_fast.push(volume)
+        pvo_slow = self.pvo_slow.push(volume)
+        volume_osc = 100.0 * (pvo_fast - pvo_slow) / pvo_slow if pvo_slow else np.nan
+
+        sar = self.psar.push(high, low, close)
+
+        rsi = atr = np.nan
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            gain = self.rsi_gain.push(change if change > 0 else 0.0)
+            loss = self.rsi_loss.push(change if change < 0 else 0.0)
+            total = gain + abs(loss)
+            rsi = 100.0 * gain / total if total else np.nan
+            true_range = max(high - low, abs(high - self.prev_close), abs(self.prev_close - low))
+            atr = self.atr.push(true_range)
+        self.prev_close = close
+
+        stoch = np.nan
+        self.rsi_window.append(rsi)
+        if len(self.rsi_window) == self.rsi_window.maxlen and not any(v != v for v in self.rsi_window):
+            lowest = min(self.rsi_window)
+            span = max(self.rsi_window) - lowest
+            stoch = 100.0 * (rsi - lowest) / span if span else 0.0
+        self.stoch_window.append(stoch)
+        stoch_k = _window_mean(self.stoch_window)
+        self.k_window.append(stoch_k)
+        stoch_d = _window_mean(self.k_window)
+
+        return (ema_short, ema_long, macd_line, macd_hist, macd_signal,
+                volume_osc, sar, rsi, stoch_k, stoch_d, atr)
+
+class IncrementalIndicators:
+    """
+    Streaming counterpart of calculate_indicators for one (symbol, timeframe).
+    A newly closed bar or an update of the forming bar costs O(1): the state
+    after the last closed bar is kept aside and the forming bar is re-applied
+    on a copy of it. Fed the same bars from the same start, frame() matches
+    calculate_indicators column for column.
+    """
+
+    def __init__(self, max_bars=INDICATOR_HISTORY_BARS):
+        self.rows = deque(maxlen=max_bars)
+        self.last_time = None
+        self._closed = _IndicatorState() # State after the last closed bar
+        self._forming = None # State including the forming bar
+
+    def reset(self):
+        """Drops all state, e.g. after a gap the fetched window does not cover."""
+        self.rows.clear()
+        self.last_time = None
+        self._closed = _IndicatorState()
+        self._forming = None
+
+    def update(self, bar_time, open_, high, low, close, volume, spread=0, real_volume=0):
+        """Folds one bar in. The same time replaces the forming bar, a newer time closes it."""
+        if self.last_time is not None and bar_time < self.last_time:
+            print(f"Ignoring out-of-order bar {bar_time} (last bar {self.last_time}).")
+            return False
+        if bar_time == self.last_time:
+            self.rows.pop()
+        elif self._forming is not None:
+            self._closed = self._forming
+        state = self._closed.clone()
+        values = state.push(high, low, close, volume)
+        self._forming = state
+        self.rows.append((bar_time, open_, high, low, close, volume, spread, real_volume) + values)
+        self.last_time = bar_time
+        return True
+
+    def update_frame(self, df):
+        """Folds in the bars of a get_ohlc_data frame from the last seen bar onwards."""
+        if df.empty:
+            return self.frame()
+        if self.last_time is not None and df.index[0] > self.last_time:
+            self.reset() # Fetched window starts after our last bar: bars were missed
+        new_bars = df if self.last_time is None else df[df.index >= self.last_time]
+        volume_col = 'volume' if 'volume' in new_bars.columns else 'tick_volume'
+        columns = [new_bars[col].tolist() for col in ('open', 'high', 'low', 'close', volume_col, 'spread', 'real_volume')]
+        for bar in zip(new_bars.index, *columns):
+            self.update(*bar)
+        return self.frame()
+
+    def latest(self):
+        """Latest fully warmed-up row as a Series, i.e. calculate_indicators(df).iloc[-1]."""
+        for row in reversed(self.rows):
+            if not any(v != v for v in row[1:]):
+                return pd.Series(row[1:], index=BAR_COLUMNS + INDICATOR_COLUMNS, name=row[0])
+        return None
+
+    def frame(self):
+        """Retained rows shaped like calculate_indicators output (warm-up rows dropped)."""
+        if not self.rows:
+            return pd.DataFrame()
+        df = pd.DataFrame.from_records(list(self.rows), columns=['time'] + BAR_COLUMNS + INDICATOR_COLUMNS)
+        df.set_index('time', inplace=True)
+        df.dropna(inplace=True)
+        return df
+
+INDICATOR_ENGINES = {} # (symbol, timeframe) -> IncrementalIndicators
+
+@timed("indicators")
+def update_indicators(symbol, timeframe, df):
+    """Incremental drop-in for calculate_indicators(df), keyed by (symbol, timeframe)."""
+    if df.empty:
+        return pd.DataFrame()
+    engine = INDICATOR_ENGINES.get((symbol, timeframe))
+    if engine is None:
+        engine = INDICATOR_ENGINES[(symbol, timeframe)] = IncrementalIndicators()
+    return engine.update_frame(df)
+
+# --- Indicator Memoization ---
+class IndicatorMemo:
+    """
+    LRU cache of indicator frames with an entry cap and a memory budget. Frames are
+    shared with callers, which treat them as read-only like every other indicator frame.
+    """
+
+    def __init__(self, max_entries=INDICATOR_MEMO_MAX_ENTRIES, max_bytes=INDICATOR_MEMO_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (frame, bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, frame):
+        size = int(frame.memory_usage(index=True).sum())
+        if size > self.max_bytes:
+            return # Larger than the whole budget: not worth evicting everything for
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (frame, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+INDICATOR_MEMO = IndicatorMemo()
+
+def indicator_params():
+    """Current indicator settings, read at call time so changed settings never hit stale frames."""
+    return (EMA_SHORT_PERIOD, EMA_LONG_PERIOD, MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD,
+            RSI_PERIOD, STOCH_RSI_K_PERIOD, STOCH_RSI_SMOOTH_K, STOCH_RSI_SMOOTH_D,
+            SAR_ACCELERATION, SAR_MAX_ACCELERATION, ATR_PERIOD, PVO_FAST_PERIOD, PVO_SLOW_PERIOD)
+
+def indicator_memo_key(symbol, timeframe, df, incremental, columns=None):
+    """
+    (symbol, timeframe, last bar time, last bar OHLCV hash, window, columns, params). The
+    last bar's values catch a still-forming bar that moved; the window's length and first
+    bar time tell a short exit-check fetch apart from the full scan of the same timeframe.
+    """
+    volume_col = 'volume' if 'volume' in df.columns else 'tick_volume'
+    last_bar = df[['open', 'high', 'low', 'close', volume_col]].to_numpy(dtype=float)[-1]
+    return (symbol, timeframe, df.index[-1], zlib.crc32(last_bar.tobytes()),
+            len(df), df.index[0], incremental, columns, indicator_params())
+
+def _indicator_frame(symbol, timeframe, df, incremental, columns):
+    if incremental:
+        return update_indicators(symbol, timeframe, df)
+    if USE_INDICATOR_GRAPH:
+        return compute_indicators(df, columns)
+    return calculate_indicators(df.copy())
+
+def memoized_indicators(symbol, timeframe, df, incremental=USE_INCREMENTAL_INDICATORS, columns=None):
+    """
+    update_indicators (incremental), compute_indicators for `columns` or calculate_indicators
+    for a get_ohlc_data frame, served from INDICATOR_MEMO while the bars are unchanged since
+    the last call. The incremental engine always maintains every column.
+    """
+    if df.empty:
+        return pd.DataFrame()
+    if not USE_INDICATOR_MEMO:
+        return _indicator_frame(symbol, timeframe, df, incremental, columns)
+    key = indicator_memo_key(symbol, timeframe, df, incremental, columns)
+    frame = INDICATOR_MEMO.get(key)
+    if frame is None:
+        frame = _indicator_frame(symbol, timeframe, df, incremental, columns)
+        INDICATOR_MEMO.put(key, frame)
+    return frame
+
 # --- Indicator Alignment Logic --- (Moved to global scope)
 # def check_bullish_alignment(df_4h, df_6h, df_12h, df_1d, df_1w):
     # """Checks for bullish alignment across indicators on multiple timeframes."""
@@ -247,57 +2151,103 @@ def calculate_indicators(df):
 
     # return full_bullish_alignment, reason
 
-def check_bullish_alignment(df_dict):
+# Alignment conditions in the order the reason strings list them; bit i of a mask is condition i
+ALIGNMENT_CONDITIONS = [name for name, *_ in ALIGNMENT_RULES]
+ALL_CONDITIONS_MASK = (1 << len(ALIGNMENT_CONDITIONS)) - 1
+
+def alignment_masks(df, timeframe=None):
     """
-    df_dict is a dictionary with keys as timeframes ('4h', '6h', etc.)
-    and values as the corresponding DataFrames.
-    Checks bullish signals for each timeframe independently and gives reasons.
+    Evaluates the compiled ALIGNMENT_RULES for both directions over every row of an
+    indicator frame in one vectorized pass. Returns (bullish, bearish) arrays
+    with bit i set when ALIGNMENT_CONDITIONS[i] holds on that bar.
     """
-    bullish_results = {}
-    bullish_reasons = {}
+    return compiled_rules("alignment", timeframe).masks(df)
 
-    for tf, df in df_dict.items():
-        if df.empty:
-            bullish_results[tf] = False
-            bullish_reasons[tf] = f"{Fore.YELLOW}⚠ [{tf}] No data available.{Style.RESET_ALL}"
-            continue
+@timed("alignment")
+def latest_alignment(frames):
+    """
+    (bullish, bearish) masks of the latest bar of each (timeframe, indicator frame) pair,
+    or None for an empty frame. All latest bars are stacked and evaluated in one batch.
+    """
+    frames = list(frames)
+    present = [(tf, df) for tf, df in frames if not df.empty]
+    if not present:
+        return [None] * len(frames)
+    columns = rule_columns("alignment")
+    latest_rows = []
+    for _, df in present:
+        # Only the last row is converted, then indexed as a plain array: per-column pandas
+        # lookups would cost more than the rules themselves
+        layout = {column: i for i, column in enumerate(df.columns)}
+        latest_rows.append(df.iloc[-1:].to_numpy(dtype=float)[0, [layout[column] for column in columns]])
+    rows = pd.DataFrame(np.vstack(latest_rows), columns=columns)
+    bullish, bearish = batch_rule_masks("alignment", rows, [tf for tf, _ in present])
+    latest = iter(zip(bullish.tolist(), bearish.tolist()))
+    return [None if df.empty else next(latest) for _, df in frames]
 
-        latest = df.iloc[-1]
+def conditions_met(df, timeframe=None):
+    """How many alignment conditions hold on the latest row of an indicator frame, as (bullish, bearish)."""
+    if df.empty:
+        return 0, 0
+    bullish, bearish = alignment_masks(df.iloc[-1:], timeframe)
+    return bin(int(bullish[-1])).count("1"), bin(int(bearish[-1])).count("1")
 
-        ema_bullish = latest['EMA_Short'] > latest['EMA_Long']
-        macd_bullish = latest['MACD_Line'] > latest['MACD_Signal_Line'] and latest['MACD_Line'] > 0
-        vol_osc_bullish = latest['Volume_Oscillator'] > 0
-        sar_bullish = latest['SAR'] < latest['close']
-        rsi_bullish = latest['RSI'] > 50
-        stoch_rsi_bullish = (
-            latest['StochRSI_K'] > latest['StochRSI_D'] and
-            latest['StochRSI_K'] < 80 and latest['StochRSI_D'] < 80
-        )
+def failed_conditions(mask):
+    """Names of the conditions whose bit is not set in `mask`, in reason-string order."""
+    return [name for bit, name in enumerate(ALIGNMENT_CONDITIONS) if not (int(mask) >> bit) & 1]
 
-        all_bullish = all([
-            ema_bullish, macd_bullish, vol_osc_bullish,
-            sar_bullish, rsi_bullish, stoch_rsi_bullish
-        ])
+def bullish_reason(tf, mask):
+    """check_bullish_alignment's reason text for one timeframe (mask None = no data)."""
+    if mask is None:
+        return f"{Fore.YELLOW}⚠ [{tf}] No data available.{Style.RESET_ALL}"
+    failed = failed_conditions(mask)
+    if not failed:
+        return f"{Fore.GREEN}🟢⬆️🔺 [{tf}] All bullish conditions met!{Style.RESET_ALL}"
+    failed_list = f"{Fore.RED}{', '.join(failed)}{Style.RESET_ALL}"
+    return (
+        f"{Fore.YELLOW}⚠ [{tf}] Bullish conditions NOT met.{Style.RESET_ALL}\n"
+        f"{Fore.RED}Missing: {failed_list}{Style.RESET_ALL}"
+    )
 
-        bullish_results[tf] = all_bullish
+def bearish_reason(tf, mask):
+    """check_bearish_alignment's reason text for one timeframe (mask None = no data)."""
+    if mask is None:
+        return "No data"
+    failed = failed_conditions(mask)
+    if not failed:
+        return f"{Fore.RED}🔴⬇️🔻 [{tf}] All bearish conditions met!{Style.RESET_ALL}"
+    failed_list = f"{Fore.GREEN}" + ", ".join(failed) + f"{Style.RESET_ALL}"
+    return (
+        f"{Fore.YELLOW}⚠ [{tf}] Bearish conditions NOT met.\n"
+        f"{Fore.GREEN}Missing: {failed_list}{Style.RESET_ALL}"
+    )
 
-        if all_bullish:
-            bullish_reasons[tf] = f"{Fore.GREEN}🟢⬆️🔺 [{tf}] All bullish conditions met!{Style.RESET_ALL}"
-        else:
-            failed_conditions = []
-            if not ema_bullish: failed_conditions.append("EMA")
-            if not macd_bullish: failed_conditions.append("MACD")
-            if not vol_osc_bullish: failed_conditions.append("Volume Oscillator")
-            if not sar_bullish: failed_conditions.append("SAR")
-            if not rsi_bullish: failed_conditions.append("RSI")
-            if not stoch_rsi_bullish: failed_conditions.append("StochRSI")
+def evaluate_alignment(df, timeframe=None):
+    """Whole-history alignment table for one indicator frame (masks plus all-met flags per bar)."""
+    bullish, bearish = alignment_masks(df, timeframe)
+    return pd.DataFrame({
+        'bullish_mask': bullish,
+        'bearish_mask': bearish,
+        'bullish': bullish == ALL_CONDITIONS_MASK,
+        'bearish': bearish == ALL_CONDITIONS_MASK,
+    }, index=df.index)
 
-            failed_list = f"{Fore.RED}{', '.join(failed_conditions)}{Style.RESET_ALL}"
+def check_bullish_alignment(df_dict, latest=None):
+    """
+    df_dict is a dictionary with keys as timeframes ('4H', '6H', etc.)
+    and values as the corresponding DataFrames.
+    Checks bullish signals for each timeframe independently and gives reasons.
+    `latest` takes latest_alignment(df_dict.items()) when the caller already has it.
+    """
+    bullish_results = {}
+    bullish_reasons = {}
 
-            bullish_reasons[tf] = (
-                f"{Fore.YELLOW}⚠ [{tf}] Bullish conditions NOT met.{Style.RESET_ALL}\n"
-                f"{Fore.RED}Missing: {failed_list}{Style.RESET_ALL}"
-            )
+    if latest is None:
+        latest = latest_alignment(df_dict.items())
+    for tf, masks in zip(df_dict, latest):
+        bullish_mask = None if masks is None else masks[0]
+        bullish_results[tf] = bullish_mask == ALL_CONDITIONS_MASK
+        bullish_reasons[tf] = bullish_reason(tf, bullish_mask)
 
     return bullish_results, bullish_reasons
 
@@ -413,63 +2363,29 @@ def check_bullish_alignment(df_dict):
 
 #     return full_bearish_alignment, reason
 
-def check_bearish_alignment(df_dict):
+def check_bearish_alignment(df_dict, latest=None):
     """
-    df_dict is a dictionary with keys as timeframes ('4h', '6h', etc.)
+    df_dict is a dictionary with keys as timeframes ('4H', '6H', etc.)
     and values as the corresponding DataFrames.
     Checks bearish signals for each timeframe independently and gives reasons.
+    `latest` takes latest_alignment(df_dict.items()) when the caller already has it.
     """
     bearish_results = {}
     bearish_reasons = {}
 
-    for tf, df in df_dict.items():
-        if df.empty:
-            bearish_results[tf] = False
-            bearish_reasons[tf] = "No data"
-            continue
-
-        latest = df.iloc[-1]
-
-        ema_bearish = latest['EMA_Short'] < latest['EMA_Long']
-        macd_bearish = latest['MACD_Line'] < latest['MACD_Signal_Line'] and latest['MACD_Line'] < 0
-        vol_osc_bearish = latest['Volume_Oscillator'] < 0
-        sar_bearish = latest['SAR'] > latest['close']
-        rsi_bearish = latest['RSI'] < 50
-        stoch_rsi_bearish = (
-            latest['StochRSI_K'] < latest['StochRSI_D'] and
-            latest['StochRSI_K'] > 20 and latest['StochRSI_D'] > 20
-        )
-
-        all_bearish = all([
-            ema_bearish, macd_bearish, vol_osc_bearish,
-            sar_bearish, rsi_bearish, stoch_rsi_bearish
-        ])
-
-        bearish_results[tf] = all_bearish
-
-        if all_bearish:
-            bearish_reasons[tf] = f"{Fore.RED}🔴⬇️🔻 [{tf}] All bearish conditions met!{Style.RESET_ALL}"
-        else:
-            failed_conditions = []
-            if not ema_bearish: failed_conditions.append("EMA")
-            if not macd_bearish: failed_conditions.append("MACD")
-            if not vol_osc_bearish: failed_conditions.append("Volume Oscillator")
-            if not sar_bearish: failed_conditions.append("SAR")
-            if not rsi_bearish: failed_conditions.append("RSI")
-            if not stoch_rsi_bearish: failed_conditions.append("StochRSI")
-
-            failed_list = f"{Fore.GREEN}" + ", ".join(failed_conditions) + f"{Style.RESET_ALL}"
-
-            bearish_reasons[tf] = (
-                f"{Fore.YELLOW}⚠ [{tf}] Bearish conditions NOT met.\n"
-                f"{Fore.GREEN}Missing: {failed_list}{Style.RESET_ALL}"
-            )
+    if latest is None:
+        latest = latest_alignment(df_dict.items())
+    for tf, masks in zip(df_dict, latest):
+        bearish_mask = None if masks is None else masks[1]
+        bearish_results[tf] = bearish_mask == ALL_CONDITIONS_MASK
+        bearish_reasons[tf] = bearish_reason(tf, bearish_mask)
 
     return bearish_results, bearish_reasons
 
 
 
 # --- Chart Pattern Monitoring (Simplified Example) ---
+@timed("patterns")
 def detect_chart_patterns(df):
     """
     Simplified chart pattern detection.
@@ -487,14 +2403,260 @@ def detect_chart_patterns(df):
         return "Bearish Trend Continuation"
     return None
 
+# --- Signal State Machine ---
+SIGNAL_OFF, SIGNAL_ARMED, SIGNAL_FIRED, SIGNAL_COOLDOWN = "off", "armed", "fired", "cooldown"
+
+class SignalStateMachine:
+    """
+    Edge-triggered state per (symbol, timeframe, direction), so a timeframe that stays
+    aligned alerts once instead of on every scan:
+      off      -> armed    when at least `arm_conditions` alignment conditions hold
+      off/armed -> fired   when all of them hold (the only transition that alerts)
+      fired    -> cooldown when the alignment breaks
+      cooldown -> off/armed/fired once `cooldown_seconds` have passed; re-alignment
+                  before then does not fire again
+    The last `journal_size` transitions are kept in `journal`.
+    """
+
+    def __init__(self, arm_conditions=SIGNAL_ARM_CONDITIONS, cooldown_seconds=SIGNAL_COOLDOWN_SECONDS,
+                 journal_size=SIGNAL_JOURNAL_SIZE):
+        self.arm_conditions = arm_conditions
+        self.cooldown_seconds = cooldown_seconds
+        self.states = {} # (symbol, timeframe, direction) -> (state, entered at)
+        self.journal = deque(maxlen=journal_size) # (time, symbol, timeframe, direction, from, to, conditions met, bar time)
+
+    def state(self, symbol, timeframe, direction):
+        return self.states.get((symbol, timeframe, direction), (SIGNAL_OFF, None))[0]
+
+    def update(self, symbol, timeframe, direction, met, bar_time=None, now=None):
+        """
+        Feeds one evaluation with `met` alignment conditions holding. Returns the new
+        state if it changed, else None.
+        """
+        now = time.time() if now is None else now
+        key = (symbol, timeframe, direction)
+        state, entered = self.states.get(key, (SIGNAL_OFF, now))
+        aligned = met >= len(ALIGNMENT_CONDITIONS)
+        if state == SIGNAL_FIRED:
+            new_state = SIGNAL_FIRED if aligned else SIGNAL_COOLDOWN
+        elif state == SIGNAL_COOLDOWN and now - entered < self.cooldown_seconds:
+            new_state = SIGNAL_COOLDOWN
+        else:
+            new_state = SIGNAL_FIRED if aligned else SIGNAL_ARMED if met >= self.arm_conditions else SIGNAL_OFF
+        if new_state == state:
+            return None
+        self.states[key] = (new_state, now)
+        self.journal.append((now, symbol, timeframe, direction, state, new_state, int(met), bar_time))
+        if METRICS_ENABLED:
+            METRICS.inc("bot_signal_transitions_total", state=new_state)
+        return new_state
+
+    def journal_frame(self):
+        """The transition journal as a DataFrame, oldest first."""
+        frame = pd.DataFrame(list(self.journal), columns=['time', 'symbol', 'timeframe', 'direction', 'from_state',
+                                                          'to_state', 'conditions_met', 'bar_time'])
+        frame['time'] = pd.to_datetime(frame['time'], unit='s')
+        return frame
+
+SIGNALS = SignalStateMachine()
+
+def describe_transition(symbol, timeframe, direction, new_state, met):
+    return (f"[{symbol} {timeframe}] {'Bullish' if direction == 'BUY' else 'Bearish'} signal {new_state} "
+            f"({met}/{len(ALIGNMENT_CONDITIONS)} conditions)")
+
+# --- Market Snapshot ---
+SYMBOL_INFO_CACHE = {} # symbol -> mt5.symbol_info, static for the session
+
+def get_symbol_info(symbol):
+    """Session-cached mt5.symbol_info (point, digits, volume step, filling modes, ...)."""
+    info = SYMBOL_INFO_CACHE.get(symbol)
+    if info is None:
+        info = mt5.symbol_info(symbol)
+        if info is not None:
+            SYMBOL_INFO_CACHE[symbol] = info
+    return info
+
+class MarketSnapshot:
+    """
+    One tick per symbol and one positions list, taken together at the start of a
+    cycle and shared by the signal, sizing and order code. Ticks fetched or quoted
+    longer ago than the staleness threshold are re-fetched before the order path uses them.
+    """
+
+    def __init__(self, symbols):
+        self.taken_at = time.monotonic()
+        self.ticks = {}
+        self.tick_times = {}
+        for symbol in symbols:
+            self._fetch_tick(symbol)
+        self.positions = list(mt5.positions_get() or []) # One call covers every symbol
+
+    def _fetch_tick(self, symbol):
+        self.ticks[symbol] = mt5.symbol_info_tick(symbol)
+        self.tick_times[symbol] = time.monotonic()
+        return self.ticks[symbol]
+
+    def age(self, symbol=None):
+        """Seconds since the snapshot (or the symbol's tick) was taken."""
+        return time.monotonic() - (self.tick_times.get(symbol, self.taken_at) if symbol else self.taken_at)
+
+    def quote_age(self, symbol):
+        """Seconds since the broker stamped the symbol's tick (its time_msc against the server clock)."""
+        tick = self.ticks.get(symbol)
+        if tick is None:
+            return float('inf')
+        return server_time_now(pytz.timezone(BROKER_TIMEZONE)) - tick.time_msc / 1000
+
+    def tick(self, symbol, max_age=SNAPSHOT_MAX_AGE_SECONDS):
+        """The symbol's tick, refreshed first if it was fetched or quoted more than max_age seconds ago."""
+        if self.ticks.get(symbol) is None or self.age(symbol) > max_age or self.quote_age(symbol) > max_age:
+            return self._fetch_tick(symbol)
+        return self.ticks[symbol]
+
+    def symbol_positions(self, symbol):
+        return [pos for pos in self.positions if pos.symbol == symbol]
+
+    def position(self, ticket):
+        for pos in self.positions:
+            if pos.ticket == ticket:
+                return pos
+        return None
+
+_market_snapshot = None
+
+def take_market_snapshot(symbols):
+    """Takes this cycle's snapshot; the order path reads from it until the next one."""
+    global _market_snapshot
+    _market_snapshot = MarketSnapshot(symbols)
+    return _market_snapshot
+
+def market_tick(symbol, max_age=SNAPSHOT_MAX_AGE_SECONDS):
+    """Tick for the order path: the cycle snapshot's unless it is older than max_age."""
+    if _market_snapshot is None:
+        return mt5.symbol_info_tick(symbol)
+    return _market_snapshot.tick(symbol, max_age)
+
+def market_position(ticket):
+    """Open position by ticket, from the cycle snapshot when it has it."""
+    if _market_snapshot is not None:
+        position = _market_snapshot.position(ticket)
+        if position is not None:
+            return position
+    position = mt5.positions_get(ticket=ticket)
+    return position[0] if position else None
+
 # --- Trade Management ---
+# --- Order Execution ---
+REPRICE_RETCODES = (mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED, mt5.TRADE_RETCODE_PRICE_OFF)
+FILLED_RETCODES = (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL)
+EXECUTION_LOG = deque(maxlen=ORDER_LOG_SIZE) # One record per execute_order call
+
+def filling_modes(symbol_info):
+    """Filling modes the symbol accepts, preferred first (FOK, IOC, then RETURN)."""
+    flags = symbol_info.filling_mode if symbol_info is not None else 0
+    modes = []
+    if flags & mt5.SYMBOL_FILLING_FOK:
+        modes.append(mt5.ORDER_FILLING_FOK)
+    if flags & mt5.SYMBOL_FILLING_IOC:
+        modes.append(mt5.ORDER_FILLING_IOC)
+    modes.append(mt5.ORDER_FILLING_RETURN)
+    return modes
+
+def execute_order(request, deadline=ORDER_DEADLINE_SECONDS):
+    """
+    Sends a market (TRADE_ACTION_DEAL) request with a filling mode the symbol supports.
+    Requotes and price changes are re-priced from the returned (or a fresh) quote and
+    re-sent at once until filled, ORDER_MAX_ATTEMPTS or `deadline` seconds; an
+    INVALID_FILL falls through to the next allowed filling mode. Returns (result, execution):
+    the last order_send result (None if the terminal call itself failed) and this order's
+    send-to-ack latency and slippage record, which is also appended to EXECUTION_LOG
+    (execution is None, with the order_check result, when the pre-flight check rejects it).
+    """
+    symbol = request['symbol']
+    info = get_symbol_info(symbol)
+    modes = filling_modes(info)
+    request = dict(request, type_filling=modes[0])
+    buy = request['type'] == mt5.ORDER_TYPE_BUY
+    quoted = request['price']
+    started = time.perf_counter()
+
+    if USE_ORDER_CHECK:
+        check = mt5.order_check(request)
+        while check is not None and check.retcode == mt5.TRADE_RETCODE_INVALID_FILL and request['type_filling'] != modes[-1]:
+            request['type_filling'] = modes[modes.index(request['type_filling']) + 1]
+            check = mt5.order_check(request)
+        if check is None or check.retcode not in (0, mt5.TRADE_RETCODE_DONE): # order_check reports success as 0
+            print(f"Order check failed for {symbol}: {check.retcode if check else mt5.last_error()} {check.comment if check else ''}")
+            return check, None
+
+    attempts, ack_ms, result = 0, None, None
+    while True:
+        attempts += 1
+        sent = time.perf_counter()
+        result = mt5.order_send(request)
+        ack_ms = (time.perf_counter() - sent) * 1000
+        if METRICS_ENABLED:
+            METRICS.observe("bot_stage_seconds", ack_ms / 1000, stage="order_send")
+            METRICS.inc("bot_order_retcodes_total", retcode=result.retcode if result is not None else "none")
+        if result is None or result.retcode in FILLED_RETCODES:
+            break
+        if attempts >= ORDER_MAX_ATTEMPTS or time.perf_counter() - started >= deadline:
+            break
+        if result.retcode == mt5.TRADE_RETCODE_INVALID_FILL and request['type_filling'] != modes[-1]:
+            request['type_filling'] = modes[modes.index(request['type_filling']) + 1]
+            continue
+        if result.retcode not in REPRICE_RETCODES:
+            break
+        bid, ask = result.bid, result.ask
+        if not bid or not ask:
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is None:
+                break
+            bid, ask = tick.bid, tick.ask
+        request['price'] = ask if buy else bid
+
+    filled = result is not None and result.retcode in FILLED_RETCODES
+    if not filled and METRICS_ENABLED:
+        METRICS.inc("bot_failures_total", stage="order")
+    fill_price = (result.price or request['price']) if filled else None
+    slippage = None
+    if filled and info is not None:
+        slippage = round(((fill_price - quoted) if buy else (quoted - fill_price)) / info.point, 1) # Positive = worse
+    execution = {
+        'time': time.time(), 'symbol': symbol, 'side': "BUY" if buy else "SELL", 'position': request.get('position'),
+        'volume': request['volume'], 'filled_volume': result.volume if filled else 0.0,
+        'retcode': result.retcode if result is not None else None, 'attempts': attempts,
+        'filling': request['type_filling'], 'quoted_price': quoted, 'fill_price': fill_price,
+        'slippage_points': slippage, 'ack_ms': ack_ms, 'total_ms': (time.perf_counter() - started) * 1000
+    }
+    EXECUTION_LOG.append(execution)
+    return result, execution
+
+def execution_stats():
+    """Fill rate, retries, send-to-ack latency and slippage over the orders in EXECUTION_LOG."""
+    records = list(EXECUTION_LOG)
+    if not records:
+        return {'orders': 0}
+    ack = np.array([r['ack_ms'] for r in records])
+    total = np.array([r['total_ms'] for r in records])
+    slippage = np.array([r['slippage_points'] for r in records if r['slippage_points'] is not None])
+    return {
+        'orders': len(records),
+        'filled': sum(r['fill_price'] is not None for r in records),
+        'retries': sum(r['attempts'] - 1 for r in records),
+        'ack_ms_p50': float(np.percentile(ack, 50)), 'ack_ms_p95': float(np.percentile(ack, 95)),
+        'total_ms_p95': float(np.percentile(total, 95)),
+        'slippage_points_mean': float(slippage.mean()) if len(slippage) else 0.0,
+        'slippage_points_max': float(slippage.max()) if len(slippage) else 0.0
+    }
+
 def calculate_sl_tp(current_price, atr_value, trade_type):
     """Calculates dynamic Stop Loss and Take Profit based on ATR."""
     # Multiples can be adjusted based on strategy and risk tolerance
-    SL_MULTIPLIER = 1.5
-    TP_MULTIPLIER = 3.0
+    SL_MULTIPLIER = SL_ATR_MULTIPLIER
+    TP_MULTIPLIER = TP_ATR_MULTIPLIER
 
-    point = mt5.symbol_info(SYMBOL).point # Get symbol's point value
+    point = get_symbol_info(SYMBOL).point # Get symbol's point value
 
     if trade_type == "BUY":
         sl = current_price - (atr_value * SL_MULTIPLIER)
@@ -515,12 +2677,16 @@ def calculate_sl_tp(current_price, atr_value, trade_type):
 
 def open_trade(symbol, trade_type, lot, sl, tp):
     """Opens a buy or sell trade."""
+    tick = market_tick(symbol)
+    if tick is None:
+        print(f"No tick for {symbol} - {mt5.last_error()}")
+        return None
     if trade_type == "BUY":
         order_type = mt5.ORDER_TYPE_BUY
-        price = mt5.symbol_info_tick(symbol).ask
+        price = tick.ask
     elif trade_type == "SELL":
         order_type = mt5.ORDER_TYPE_SELL
-        price = mt5.symbol_info_tick(symbol).bid
+        price = tick.bid
     else:
         print("Invalid trade type.")
         return None
@@ -535,7 +2701,7 @@ def open_trade(symbol, trade_type, lot, sl, tp):
         "magic": 20230805, # Unique ID for your bot's trades
         "comment": "Python Bot Trade",
         "type_time": mt5.ORDER_TIME_GTC, # Good Till Cancel
-        "type_filling": mt5.ORDER_FILLING_FOK, # Fill Or Kill
+        # type_filling is chosen by execute_order from the symbol's supported modes
     }
 
     if sl is not None:
@@ -543,52 +2709,42 @@ def open_trade(symbol, trade_type, lot, sl, tp):
     if tp is not None:
         request["tp"] = tp
 
-    result = mt5.order_send(request)
+    result, execution = execute_order(request) # This order's record; EXECUTION_LOG[-1] may be a concurrent exit's
 
-    if result.retcode != mt5.TRADE_RETCODE_DONE:
-        print(f"Order failed: {result.retcode} - {mt5.last_error()}")
-        send_telegram_message(f"Bot Alert: Order failed for {symbol} ({trade_type}): {result.retcode} - {mt5.last_error()}")
+    if result is None or result.retcode not in FILLED_RETCODES:
+        retcode = result.retcode if result is not None else None
+        print(f"Order failed: {retcode} - {mt5.last_error()}")
+        send_telegram_message(f"Bot Alert: Order failed for {symbol} ({trade_type}): {retcode} - {mt5.last_error()}")
         return None
     else:
-        print(f"Order placed successfully: {trade_type} {lot} lots of {symbol} at {price}")
+        print(f"Order placed successfully: {trade_type} {execution['filled_volume']} of {lot} lots of {symbol} at "
+              f"{execution['fill_price']} (quoted {price}, slippage {execution['slippage_points']} points, "
+              f"ack {execution['ack_ms']:.0f} ms, {execution['attempts']} attempt(s))")
         send_telegram_message(f"Bot Alert: Opened {trade_type} trade for {lot} lots of {symbol}. Ticket: {result.order}")
         return result.order # Return the order ticket
 
-def close_trade(position_ticket):
-    """Closes an open position."""
-    position = mt5.positions_get(ticket=position_ticket)
-    if not position:
-        print(f"Position {position_ticket} not found.")
-        return False
-
-    position_type = position[0].type
-    symbol = position[0].symbol
-    volume = position[0].volume
-
-    request = {
+def close_request(position, tick, volume=None):
+    """Market order closing `volume` lots (all by default) of an open position at the tick's price (not None)."""
+    return {
         "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": symbol,
-        "volume": volume,
-        "type": mt5.ORDER_TYPE_SELL if position_type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
-        "position": position_ticket,
-        "price": mt5.symbol_info_tick(symbol).bid if position_type == mt5.ORDER_TYPE_BUY else mt5.symbol_info_tick(symbol).ask,
+        "symbol": position.symbol,
+        "volume": position.volume if volume is None else volume,
+        "type": mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
+        "position": position.ticket,
+        "price": tick.bid if position.type == mt5.ORDER_TYPE_BUY else tick.ask,
         "deviation": DEVIATION,
         "magic": 20230805,
         "comment": "Python Bot Close",
         "type_time": mt5.ORDER_TIME_GTC,
-        "type_filling": mt5.ORDER_FILLING_FOK,
     }
 
-    result = mt5.order_send(request)
-
-    if result.retcode != mt5.TRADE_RETCODE_DONE:
-        print(f"Close order failed: {result.retcode} - {mt5.last_error()}")
-        send_telegram_message(f"Bot Alert: Close order failed for {symbol} (Ticket: {position_ticket}): {result.retcode} - {mt5.last_error()}")
+def close_trade(position_ticket):
+    """Closes an open position (a batch of one through close_positions, with its retries and partial-fill handling)."""
+    position = market_position(position_ticket)
+    if position is None:
+        print(f"Position {position_ticket} not found.")
         return False
-    else:
-        print(f"Position {position_ticket} closed successfully.")
-        send_telegram_message(f"Bot Alert: Closed trade for {symbol}. Ticket: {position_ticket}")
-        return True
+    return close_positions([position])[0]['closed']
 
 def monitor_and_exit_trades(open_positions, df_1h_indicators, df_4h_indicators): # Renamed arguments
     """
@@ -602,9 +2758,12 @@ def monitor_and_exit_trades(open_positions, df_1h_indicators, df_4h_indicators):
         print("Insufficient data for exit monitoring.")
         return
 
-    latest_1h = df_1h_indicators.iloc[-1]
-    latest_4h = df_4h_indicators.iloc[-1]
+    # REVERSAL_RULES on the latest bars: (bullish reversal, bearish reversal) per timeframe
+    reversal_1h = [bool(mask[-1]) for mask in compiled_rules("reversal", "1H").masks(df_1h_indicators.iloc[-1:])]
+    reversal_4h = [bool(mask[-1]) for mask in compiled_rules("reversal", "4H").masks(df_4h_indicators.iloc[-1:])]
 
+    flagged = [] # Positions to close, sent together by close_positions
+    reasons = {}
     for pos in open_positions:
         position_ticket = pos.ticket
         position_type = pos.type
@@ -616,35 +2775,1547 @@ def monitor_and_exit_trades(open_positions, df_1h_indicators, df_4h_indicators):
 
         if position_type == mt5.ORDER_TYPE_BUY: # Currently long, look for bearish reversal
             # 1H Bearish reversal signs
-            if (latest_1h['MACD_Line'] < latest_1h['MACD_Signal_Line'] and latest_1h['MACD_Line'] < 0) or \
-               (latest_1h['RSI'] < 30) or \
-               (latest_1h['StochRSI_K'] < 20 and latest_1h['StochRSI_D'] < 20):
+            if reversal_1h[1]:
                 reversal_detected = True
                 reversal_reason = "1H bearish reversal detected."
             # 4H Bearish reversal signs (stronger confirmation)
-            if (latest_4h['MACD_Line'] < latest_4h['MACD_Signal_Line'] and latest_4h['MACD_Line'] < 0) or \
-               (latest_4h['RSI'] < 30) or \
-               (latest_4h['StochRSI_K'] < 20 and latest_4h['StochRSI_D'] < 20):
+            if reversal_4h[1]:
                 reversal_detected = True
                 reversal_reason = "4H bearish reversal detected."
 
         elif position_type == mt5.ORDER_TYPE_SELL: # Currently short, look for bullish reversal
             # 1H Bullish reversal signs
-            if (latest_1h['MACD_Line'] > latest_1h['MACD_Signal_Line'] and latest_1h['MACD_Line'] > 0) or \
-               (latest_1h['RSI'] > 70) or \
-               (latest_1h['StochRSI_K'] > 80 and latest_1h['StochRSI_D'] > 80):
+            if reversal_1h[0]:
                 reversal_detected = True
                 reversal_reason = "1H bullish reversal detected."
             # 4H Bullish reversal signs (stronger confirmation)
-            if (latest_4h['MACD_Line'] > latest_4h['MACD_Signal_Line'] and latest_4h['MACD_Line'] > 0) or \
-               (latest_4h['RSI'] > 70) or \
-               (latest_4h['StochRSI_K'] > 80 and latest_4h['StochRSI_D'] > 80):
+            if reversal_4h[0]:
                 reversal_detected = True
                 reversal_reason = "4H bullish reversal detected."
 
         if reversal_detected:
             print(f"Reversal detected for position {position_ticket}: {reversal_reason}. Attempting to close.")
-            close_trade(position_ticket)
+            flagged.append(pos)
+            reasons[position_ticket] = reversal_reason
+
+    if flagged:
+        close_positions(flagged, reasons)
+
+# --- Batch Exits ---
+EXIT_RETRY_RETCODES = (mt5.TRADE_RETCODE_TIMEOUT, mt5.TRADE_RETCODE_CONNECTION) # Requotes are re-priced inside execute_order
+_exit_pool = None
+_exit_pool_lock = threading.Lock()
+
+def get_exit_pool():
+    """Long-lived worker threads for close orders, so a batch does not pay for thread start-up."""
+    global _exit_pool
+    with _exit_pool_lock:
+        if _exit_pool is None:
+            _exit_pool = ThreadPoolExecutor(max_workers=max(1, EXIT_MAX_PARALLEL), thread_name_prefix="exit")
+        return _exit_pool
+
+def _close_position(position, tick, retries, max_partials=EXIT_MAX_PARTIAL_FILLS):
+    """
+    Closes one position, re-quoting after transient failures and re-sending the rest of a
+    partial fill (at most max_partials times, and only while fills make progress).
+    """
+    started = time.perf_counter()
+    remaining = position.volume
+    result, attempts, failures, partials = None, 0, 0, 0
+    while remaining > 0 and failures <= retries:
+        attempts += 1
+        if tick is None:
+            tick = mt5.symbol_info_tick(position.symbol)
+            if tick is None:
+                failures += 1
+                continue
+        result, _ = execute_order(close_request(position, tick, remaining))
+        tick = None # Re-quote before the next attempt
+        if result is None:
+            break
+        if result.retcode == mt5.TRADE_RETCODE_DONE:
+            remaining = 0.0
+        elif result.retcode == mt5.TRADE_RETCODE_DONE_PARTIAL:
+            partials += 1
+            remaining = round(remaining - result.volume, 8)
+            if result.volume <= 0 or partials >= max_partials:
+                break
+        elif result.retcode in EXIT_RETRY_RETCODES:
+            failures += 1
+        else:
+            break
+    return {
+        'ticket': position.ticket, 'symbol': position.symbol, 'closed': remaining <= 0,
+        'remaining_volume': remaining, 'retcode': result.retcode if result is not None else None,
+        'attempts': attempts, 'latency_ms': (time.perf_counter() - started) * 1000
+    }
+
+def close_positions(positions, reasons=None, retries=EXIT_MAX_RETRIES):
+    """
+    Closes a batch of positions from one snapshot: one tick per symbol and the given
+    position objects (no per-ticket positions_get), with the close orders sent
+    concurrently on up to EXIT_MAX_PARALLEL threads. Prints per-order and total exit
+    latency and sends one Telegram summary. Returns the per-order outcomes.
+    """
+    started = time.perf_counter()
+    ticks = {symbol: market_tick(symbol) for symbol in {pos.symbol for pos in positions}}
+    if EXIT_MAX_PARALLEL > 1 and len(positions) > 1:
+        futures = [get_exit_pool().submit(_close_position, pos, ticks[pos.symbol], retries) for pos in positions]
+        outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [_close_position(pos, ticks[pos.symbol], retries) for pos in positions]
+    total_ms = (time.perf_counter() - started) * 1000
+
+    reasons = reasons or {}
+    for outcome in outcomes:
+        status = "closed" if outcome['closed'] else f"FAILED ({outcome['retcode']}, {outcome['remaining_volume']} lots left)"
+        print(f"Position {outcome['ticket']} {status} in {outcome['latency_ms']:.0f} ms, {outcome['attempts']} attempt(s).")
+    closed = [o for o in outcomes if o['closed']]
+    failed = [o for o in outcomes if not o['closed']]
+    slowest = max(o['latency_ms'] for o in outcomes) if outcomes else 0.0
+    print(f"Exit batch: {len(closed)}/{len(outcomes)} closed in {total_ms:.0f} ms (slowest order {slowest:.0f} ms).")
+    lines = [f"{o['symbol']} #{o['ticket']}: {'closed' if o['closed'] else 'FAILED ' + str(o['retcode'])}"
+             f"{' - ' + reasons[o['ticket']] if o['ticket'] in reasons else ''}" for o in outcomes]
+    send_telegram_message(f"Bot Alert: Exit batch {len(closed)}/{len(outcomes)} closed in {total_ms:.0f} ms\n" + "\n".join(lines))
+    if failed:
+        print(f"{len(failed)} position(s) still open after the exit batch: {[o['ticket'] for o in failed]}")
+    return outcomes
+
+# --- Watchlist Scanner ---
+SCAN_TABLE_COLUMNS = ['symbol', 'timeframe', 'bar_time', 'close', 'ATR', 'bullish', 'bearish', 'bullish_met',
+                      'bearish_met', 'bullish_reason', 'bearish_reason']
+
+def fetch_symbol_frames(symbol, bars=200):
+    """Fetches raw bars for every configured timeframe of one symbol (runs on a fetch thread)."""
+    if USE_LOCAL_RESAMPLING:
+        refresh_resampler(symbol)
+    return symbol, {tf_name: get_ohlc_data(symbol, tf_value, bars=bars) for tf_name, tf_value in TIMEFRAMES.items()}
+
+def _scan_row(symbol, tf, bar_time, close, atr, latest):
+    bullish_mask, bearish_mask = (None, None) if latest is None else latest
+    return {
+        'symbol': symbol,
+        'timeframe': tf,
+        'bar_time': bar_time,
+        'close': close,
+        'ATR': atr,
+        'bullish': bullish_mask == ALL_CONDITIONS_MASK,
+        'bearish': bearish_mask == ALL_CONDITIONS_MASK,
+        'bullish_met': bin(bullish_mask or 0).count("1"),
+        'bearish_met': bin(bearish_mask or 0).count("1"),
+        'bullish_reason': bullish_reason(tf, bullish_mask),
+        'bearish_reason': bearish_reason(tf, bearish_mask),
+    }
+
+def evaluate_symbol_shard(shard):
+    """
+    Indicator math and alignment checks for a shard of (symbol, raw frames) pairs.
+    Top-level so it can run in a worker process; returns one row per symbol and timeframe.
+    """
+    if SCAN_BATCHED_INDICATORS and INDICATOR_BACKEND == "numpy":
+        return evaluate_symbol_shard_batched(shard)
+    symbols, frames = [], []
+    for symbol, raw_frames in shard:
+        for tf, df in raw_frames.items():
+            symbols.append(symbol)
+            frames.append((tf, memoized_indicators(symbol, TIMEFRAMES[tf], df, incremental=False, columns=SCAN_COLUMNS)))
+    # The latest bar of every symbol and timeframe in the shard goes through the rules in one batch
+    rows = []
+    for symbol, (tf, df), latest in zip(symbols, frames, latest_alignment(frames)):
+        if df.empty:
+            rows.append(_scan_row(symbol, tf, pd.NaT, np.nan, np.nan, latest))
+        else:
+            rows.append(_scan_row(symbol, tf, df.index[-1], df['close'].iloc[-1], df['ATR'].iloc[-1], latest))
+    return rows
+
+def evaluate_symbol_shard_batched(shard):
+    """
+    evaluate_symbol_shard with each timeframe's indicators computed for every symbol of the
+    shard in one IndicatorBatch. The latest bars are read straight from the batch matrices, so
+    no per-symbol frames are built; the per-symbol indicator memo is bypassed, since hashing
+    every frame would cost more than recomputing the whole batch.
+    """
+    columns = SCAN_COLUMNS if USE_INDICATOR_GRAPH else None
+    rule_inputs = rule_columns("alignment")
+    results = {}
+    for tf in TIMEFRAMES:
+        batch = IndicatorBatch({symbol: frames[tf] for symbol, frames in shard}, columns)
+        positions = batch.latest_positions()
+        present = np.flatnonzero(positions >= 0)
+        latest_rows = pd.DataFrame({column: batch.matrices[column][present, positions[present]] for column in rule_inputs})
+        bullish, bearish = batch_rule_masks("alignment", latest_rows, [tf] * len(present))
+        latest = dict(zip(present.tolist(), zip(bullish.tolist(), bearish.tolist())))
+        for symbol, row in batch.rows.items():
+            position = positions[row]
+            if position < 0:
+                results[symbol, tf] = _scan_row(symbol, tf, pd.NaT, np.nan, np.nan, None)
+                continue
+            bar_time = batch.frames[symbol].index[position - batch.pads[symbol]]
+            results[symbol, tf] = _scan_row(symbol, tf, bar_time, batch.matrices['close'][row, position],
+                                            batch.matrices['ATR'][row, position], latest[row])
+    return [results[symbol, tf] for symbol, frames in shard for tf in frames]
+
+class WatchlistScanner:
+    """
+    Scans many symbols per cycle. Terminal fetches run on a thread pool and each
+    batch of fetched symbols is handed to a process pool as soon as it is ready,
+    so I/O and indicator math overlap. The pools persist across cycles.
+    """
+
+    def __init__(self, symbols=None, fetch_threads=SCAN_FETCH_THREADS, workers=SCAN_WORKER_PROCESSES):
+        self.symbols = list(symbols or WATCHLIST)
+        self.fetch_threads = fetch_threads
+        self.workers = max(1, workers)
+        self.io_pool = ThreadPoolExecutor(max_workers=fetch_threads)
+        self.cpu_pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.last_timings = {}
+
+    def close(self):
+        self.io_pool.shutdown(wait=True)
+        if self.cpu_pool is not None:
+            self.cpu_pool.shutdown(wait=True)
+
+    def scan(self, bars=200):
+        """Runs one scan cycle and returns the merged per-symbol, per-timeframe result table."""
+        started = time.perf_counter()
+        # Several shards per worker keeps every core busy while the slowest fetches finish
+        shard_size = max(1, math.ceil(len(self.symbols) / (self.workers * 4)))
+        pending, shard, rows = [], [], []
+        fetch_futures = [self.io_pool.submit(fetch_symbol_frames, symbol, bars) for symbol in self.symbols]
+        for future in fetch_futures:
+            shard.append(future.result())
+            if len(shard) == shard_size:
+                self._dispatch(shard, pending, rows)
+                shard = []
+        if shard:
+            self._dispatch(shard, pending, rows)
+        fetched = time.perf_counter()
+        for future in pending:
+            rows.extend(future.result())
+        finished = time.perf_counter()
+
+        self.last_timings = {
+            'symbols': len(self.symbols),
+            'fetch_seconds': fetched - started,
+            'compute_wait_seconds': finished - fetched,
+            'wall_seconds': finished - started,
+        }
+        print(f"Scanned {len(self.symbols)} symbols x {len(TIMEFRAMES)} timeframes in {finished - started:.2f}s "
+              f"(fetch {fetched - started:.2f}s, {self.workers} worker(s), {self.fetch_threads} fetch thread(s))")
+
+        table = pd.DataFrame(rows, columns=SCAN_TABLE_COLUMNS)
+        return table.set_index(['symbol', 'timeframe'])
+
+    def _dispatch(self, shard, pending, rows):
+        if self.cpu_pool is None:
+            rows.extend(evaluate_symbol_shard(shard))
+        else:
+            pending.append(self.cpu_pool.submit(evaluate_symbol_shard, shard))
+
+def run_watchlist_scanner():
+    """Scans WATCHLIST every SCAN_INTERVAL_SECONDS and alerts on aligned timeframes."""
+    if not initialize_mt5():
+        return
+
+    symbols = []
+    for symbol in WATCHLIST:
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            print(f"{symbol} not found, dropping it from the watchlist.")
+            continue
+        if not info.visible and not mt5.symbol_select(symbol, True):
+            print(f"symbol_select({symbol}) failed, dropping it from the watchlist.")
+            continue
+        symbols.append(symbol)
+    send_telegram_message(f"Watchlist scanner started for {len(symbols)} symbols.")
+
+    scanner = WatchlistScanner(symbols)
+    if METRICS_ENABLED:
+        start_metrics_server()
+    try:
+        while True:
+            print(f"\n--- Watchlist scan at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
+            table = scanner.scan()
+            if METRICS_ENABLED:
+                # Indicator math may run in worker processes, so it shows up as the compute wait here
+                timings = scanner.last_timings
+                METRICS.observe("bot_stage_seconds", timings['fetch_seconds'], stage="scan_fetch")
+                METRICS.observe("bot_stage_seconds", timings['compute_wait_seconds'], stage="scan_compute_wait")
+                METRICS.observe("bot_cycle_seconds", timings['wall_seconds'])
+                METRICS.set("bot_watchlist_symbols", len(symbols))
+                update_gauges()
+                log_metrics()
+            alert_signal_transitions(table)
+            time.sleep(SCAN_INTERVAL_SECONDS)
+    finally:
+        scanner.close()
+
+def alert_signal_transitions(table):
+    """
+    Feeds a scan table through SIGNALS. Only state changes are reported;
+    a timeframe that stays aligned alerts once.
+    """
+    for (symbol, tf), row in table.iterrows():
+        for direction, met in (("BUY", row['bullish_met']), ("SELL", row['bearish_met'])):
+            new_state = SIGNALS.update(symbol, tf, direction, met, row['bar_time'])
+            if new_state is None:
+                continue
+            print(describe_transition(symbol, tf, direction, new_state, met))
+            if new_state == SIGNAL_FIRED:
+                label = "📈 Bullish" if direction == "BUY" else "📉 Bearish"
+                print(f"{label} alignment on {symbol} {tf} (close {row['close']})")
+                send_telegram_message(f"{label} signal detected for {symbol} on {tf} timeframe!")
+
+# --- Multi-Terminal Sharding ---
+# The MT5 API holds one terminal session per process, so a slow terminal stalls
+# every symbol behind it. Each shard worker is a process with its own session;
+# symbols are spread over the workers with a consistent-hash ring, so a worker
+# dying or coming back only moves that worker's symbols.
+
+class HashRing:
+    """Consistent-hash ring mapping keys (symbols) to nodes (worker names)."""
+
+    def __init__(self, nodes=(), virtual_nodes=SHARD_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.points = [] # Sorted (hash, node)
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.virtual_nodes):
+            bisect.insort(self.points, (self._hash(f"{node}#{i}"), node))
+
+    def remove(self, node):
+        self.nodes.discard(node)
+        self.points = [point for point in self.points if point[1] != node]
+
+    def owner(self, key):
+        """The first node clockwise from the key's hash, or None on an empty ring."""
+        if not self.points:
+            return None
+        i = bisect.bisect(self.points, (self._hash(key),))
+        return self.points[i % len(self.points)][1]
+
+    def assign(self, keys):
+        """Groups keys by owner: {node: [keys]}."""
+        assignment = {}
+        for key in keys:
+            assignment.setdefault(self.owner(key), []).append(key)
+        return assignment
+
+def _connect_shard_terminal(terminal):
+    """Opens this process's terminal session for one SHARD_TERMINALS entry."""
+    if getattr(mt5, "SIMULATED", False):
+        terminal = dict(terminal)
+        orders = terminal.pop('orders', ())
+        configure_simulated_broker(**terminal)
+        connected = mt5.initialize()
+        for request in orders:
+            mt5.order_send(dict({"action": mt5.TRADE_ACTION_DEAL, "type_filling": mt5.ORDER_FILLING_IOC}, **request))
+        return connected
+    return mt5.initialize(path=terminal.get('path', MT5_PATH), login=terminal.get('login', MT5_LOGIN),
+                          password=terminal.get('password', MT5_PASSWORD), server=terminal.get('server', MT5_SERVER),
+                          timeout=120000)
+
+def shard_worker(name, terminal, conn):
+    """
+    Shard worker process: owns one terminal session and answers the supervisor's
+    ("scan", symbols, bars) requests with ("ok", rows, positions, missing) until ("stop",).
+    Bar caches and indicator state live here, so they persist while the worker owns a symbol.
+    """
+    try:
+        connected = _connect_shard_terminal(terminal)
+        conn.send(("ready", connected, None if connected else str(mt5.last_error())))
+        if not connected:
+            return
+        selected = set()
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            _, symbols, bars = message
+            try:
+                missing = []
+                for symbol in symbols:
+                    if symbol in selected:
+                        continue
+                    info = mt5.symbol_info(symbol)
+                    if info is None or (not info.visible and not mt5.symbol_select(symbol, True)):
+                        missing.append(symbol)
+                    else:
+                        selected.add(symbol)
+                shard = [fetch_symbol_frames(symbol, bars) for symbol in symbols if symbol in selected]
+                rows = evaluate_symbol_shard(shard)
+                # Positions belong to the terminal's account, not to the symbols it scans
+                positions = [position._asdict() for position in (mt5.positions_get() or ())]
+                conn.send(("ok", rows, positions, missing))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        mt5.shutdown()
+
+class ShardSupervisor:
+    """
+    Runs one shard_worker per terminal and scans the watchlist across them.
+    A worker that dies, errors or times out is dropped from the ring and its symbols
+    are re-sent to the survivors in the same scan; with restart it is respawned at
+    the next scan and takes its symbols back. Results come back as one table, plus
+    the open positions of every terminal in `positions`.
+    """
+
+    def __init__(self, terminals=None, symbols=None, virtual_nodes=SHARD_VIRTUAL_NODES,
+                 timeout=SHARD_RESPONSE_TIMEOUT_SECONDS, restart=SHARD_RESTART_WORKERS):
+        terminals = SHARD_TERMINALS if terminals is None else terminals
+        self.terminals = {f"terminal-{i}": dict(terminal) for i, terminal in enumerate(terminals)}
+        self.symbols = list(symbols or WATCHLIST)
+        self.ring = HashRing(virtual_nodes=virtual_nodes)
+        self.timeout = timeout
+        self.restart = restart
+        self.workers = {} # name -> (process, connection)
+        self.positions = pd.DataFrame()
+        self.missing = set()
+        self.last_assignment = {}
+        self.last_timings = {}
+
+    def start(self):
+        for name in self.terminals:
+            self._spawn(name)
+        if not self.workers:
+            raise RuntimeError("No shard worker could connect to its terminal.")
+
+    def close(self):
+        for name in list(self.workers):
+            process, conn = self.workers.pop(name)
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.ring = HashRing(virtual_nodes=self.ring.virtual_nodes)
+
+    def _spawn(self, name):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=shard_worker, args=(name, self.terminals[name], child),
+                                          name=f"shard-{name}", daemon=True)
+        process.start()
+        child.close()
+        reply = parent.recv() if parent.poll(self.timeout) else ("ready", False, "no answer")
+        if not reply[1]:
+            print(f"Shard worker {name} failed to connect to its terminal: {reply[2]}")
+            process.terminate()
+            parent.close()
+            return False
+        self.workers[name] = (process, parent)
+        self.ring.add(name)
+        print(f"Shard worker {name} connected (pid {process.pid}).")
+        return True
+
+    def _retire(self, name, reason):
+        process, conn = self.workers.pop(name)
+        self.ring.remove(name)
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5)
+        conn.close()
+        if METRICS_ENABLED:
+            METRICS.inc("bot_shard_worker_failures_total", worker=name)
+        print(f"Shard worker {name} dropped ({reason}); rebalancing over {len(self.workers)} worker(s).")
+
+    def scan(self, bars=200):
+        """Runs one scan cycle across the workers and returns the merged result table."""
+        started = time.perf_counter()
+        if self.restart:
+            for name in self.terminals:
+                if name not in self.workers:
+                    self._spawn(name)
+        rows, positions, self.missing = [], {}, set() # positions: worker -> its terminal's positions
+        owners = {}
+        pending = self.ring.assign(self.symbols)
+        while pending:
+            if None in pending:
+                print(f"No shard workers left; {len(pending[None])} symbol(s) were not scanned.")
+                break
+            for name, symbols in list(pending.items()):
+                try:
+                    self.workers[name][1].send(("scan", symbols, bars))
+                except (BrokenPipeError, OSError) as e:
+                    self._retire(name, f"send failed: {e}")
+            failed = []
+            for name, symbols in pending.items():
+                if name not in self.workers:
+                    failed.extend(symbols)
+                    continue
+                conn = self.workers[name][1]
+                try:
+                    reply = conn.recv() if conn.poll(self.timeout) else ("error", f"no answer in {self.timeout}s")
+                except (EOFError, OSError):
+                    reply = ("error", "connection lost")
+                if reply[0] != "ok":
+                    self._retire(name, reply[1])
+                    failed.extend(symbols)
+                    continue
+                _, worker_rows, worker_positions, missing = reply
+                rows.extend(worker_rows)
+                # A survivor answers again for reassigned symbols; its account is still counted once
+                positions[name] = [dict(position, terminal=name) for position in worker_positions]
+                self.missing.update(missing)
+                owners.update((symbol, name) for symbol in symbols if symbol not in missing)
+            pending = self.ring.assign(failed) if failed else {}
+        finished = time.perf_counter()
+
+        self.last_assignment = owners
+        self.positions = pd.DataFrame([position for name in positions for position in positions[name]])
+        self.last_timings = {'symbols': len(owners), 'workers': len(self.workers), 'wall_seconds': finished - started}
+        print(f"Scanned {len(owners)} symbols x {len(TIMEFRAMES)} timeframes on {len(self.workers)} terminal(s) "
+              f"in {finished - started:.2f}s")
+        table = pd.DataFrame(rows, columns=SCAN_TABLE_COLUMNS)
+        table['terminal'] = table['symbol'].map(owners)
+        return table.set_index(['symbol', 'timeframe'])
+
+def check_shard_failover(symbols=None, n_workers=3):
+    """
+    Scripted failover check against mt5_simulator: scans with n_workers frozen-clock terminals
+    (one open position each), kills one worker, scans again without restarts, then with them.
+    Checks that the dead worker's symbols are rescanned by the survivors with unchanged results,
+    that each live terminal's positions are counted exactly once, and that the restarted worker
+    takes its symbols back. Stops at the first step that leaves too few workers to go on.
+    Returns the list of failed checks (empty = passed).
+    """
+    if not getattr(mt5, "SIMULATED", False):
+        print("check_shard_failover needs the simulated broker (mt5_simulator).")
+        return ["not simulated"]
+    symbols = list(symbols or WATCHLIST)
+    start = int(server_time_now(pytz.timezone(BROKER_TIMEZONE)))
+    while datetime.utcfromtimestamp(start).weekday() >= 5: # The simulated market is closed at weekends
+        start -= 86400
+    terminals = [{"start": start, "speed": 0, "latency_ms": 0, "order_latency_ms": 0, "latency_jitter_ms": 0,
+                  "orders": [{"symbol": symbols[i % len(symbols)], "type": mt5.ORDER_TYPE_BUY,
+                              "volume": round(0.01 * (i + 1), 2)}]} for i in range(n_workers)]
+    cols = SCAN_TABLE_COLUMNS[2:]
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+        return ok
+
+    def check_positions(names):
+        seen = supervisor.positions
+        counts = seen['terminal'].value_counts().to_dict() if not seen.empty else {}
+        check(bool(names) and counts == {name: 1 for name in names},
+              f"one position per live terminal {sorted(names)}: {counts}")
+
+    def check_workers(expected, when):
+        return check(len(supervisor.workers) == expected, f"{expected} worker(s) up {when}: {sorted(supervisor.workers)}")
+
+    def steps():
+        try:
+            supervisor.start()
+        except RuntimeError as e:
+            check(False, str(e))
+            return
+        if not check_workers(n_workers, "after start"):
+            return
+        table = supervisor.scan()
+        if not check_workers(n_workers, "after the first scan"):
+            return
+        assignment = dict(supervisor.last_assignment)
+        check(set(assignment) == set(symbols), "every symbol scanned")
+        check_positions(supervisor.workers)
+
+        victim = max(supervisor.workers, key=lambda name: sum(owner == name for owner in assignment.values()))
+        moved = sorted(symbol for symbol, owner in assignment.items() if owner == victim)
+        supervisor.workers[victim][0].kill()
+        supervisor.workers[victim][0].join(timeout=5)
+        after_kill = supervisor.scan()
+        if not check_workers(n_workers - 1, f"after killing {victim}"):
+            return
+        owners = supervisor.last_assignment
+        check(set(owners) == set(symbols) and all(owners[symbol] != victim for symbol in moved),
+              f"{len(moved)} symbol(s) of {victim} rescanned by the survivors")
+        check(all(owners[symbol] == assignment[symbol] for symbol in symbols if symbol not in moved),
+              "other symbols stayed on their worker")
+        check(after_kill[cols].sort_index().equals(table[cols].sort_index()), "results unchanged after failover")
+        check_positions(supervisor.workers)
+
+        supervisor.restart = True
+        restarted = supervisor.scan()
+        if not check_workers(n_workers, "after the restart"):
+            return
+        check(supervisor.last_assignment == assignment, f"restarted {victim} took its symbols back")
+        check(restarted[cols].sort_index().equals(table[cols].sort_index()), "results unchanged after restart")
+        check_positions(supervisor.terminals)
+
+    supervisor = ShardSupervisor(terminals, symbols, timeout=60, restart=False)
+    try:
+        steps()
+    finally:
+        supervisor.close()
+    print(f"Shard failover check: {'passed' if not failures else f'{len(failures)} failure(s)'}")
+    return failures
+
+def run_sharded_scanner():
+    """Scans WATCHLIST across SHARD_TERMINALS every SCAN_INTERVAL_SECONDS and alerts on signal transitions."""
+    supervisor = ShardSupervisor()
+    supervisor.start()
+    send_telegram_message(f"Sharded scanner started: {len(supervisor.symbols)} symbols on "
+                          f"{len(supervisor.workers)} terminal(s).")
+    if METRICS_ENABLED:
+        start_metrics_server()
+    try:
+        while True:
+            print(f"\n--- Sharded scan at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
+            table = supervisor.scan()
+            if supervisor.missing:
+                print(f"Not found on their terminal: {', '.join(sorted(supervisor.missing))}")
+            if not supervisor.positions.empty:
+                print(supervisor.positions[['terminal', 'ticket', 'symbol', 'type', 'volume', 'profit']].to_string(index=False))
+            if METRICS_ENABLED:
+                METRICS.observe("bot_cycle_seconds", supervisor.last_timings['wall_seconds'])
+                METRICS.set("bot_shard_workers", len(supervisor.workers))
+                METRICS.set("bot_watchlist_symbols", supervisor.last_timings['symbols'])
+                METRICS.set("bot_open_positions", len(supervisor.positions))
+                update_gauges()
+                log_metrics()
+            alert_signal_transitions(table)
+            time.sleep(SCAN_INTERVAL_SECONDS)
+    finally:
+        supervisor.close()
+
+# --- Backtesting ---
+def reversal_masks(df, timeframe=None):
+    """
+    Per-bar versions of the monitor_and_exit_trades reversal tests.
+    Returns (bearish_reversal, bullish_reversal): exit signals for longs and shorts.
+    """
+    bullish, bearish = compiled_rules("reversal", timeframe).masks(df)
+    return bearish != 0, bullish != 0
+
+def pattern_masks(df):
+    """Per-bar detect_chart_patterns: (bullish continuation, bearish continuation) for each row."""
+    close = df['close'].to_numpy(dtype=float)
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    bullish = np.zeros(len(df), dtype=bool)
+    bearish = np.zeros(len(df), dtype=bool)
+    bullish[2:] = (close[2:] > close[1:-1]) & (high[2:] > high[1:-1])
+    bearish[2:] = ~bullish[2:] & (close[2:] < close[1:-1]) & (low[2:] < low[1:-1])
+    return bullish, bearish
+
+def _latest_row(row_close_times, decision_times):
+    """Index of the last indicator row closed by each decision time (-1 if none yet)."""
+    return np.searchsorted(row_close_times, decision_times, side='right') - 1
+
+def _next_true(indices, start):
+    """First index in the sorted array `indices` that is >= start, or None."""
+    pos = np.searchsorted(indices, start)
+    return int(indices[pos]) if pos < len(indices) else None
+
+def run_backtest(rates, base_timeframe=mt5.TIMEFRAME_H1, point=0.00001, lot=LOT_SIZE, contract_size=100000,
+                 initial_balance=10000.0, require_pattern=False, indicators=calculate_indicators,
+                 indicator_frames=None, sl_multiplier=SL_ATR_MULTIPLIER, tp_multiplier=TP_ATR_MULTIPLIER):
+    """
+    Replays the run_bot strategy over historical base-timeframe rates (an MT5 rates array).
+    Entries: 4H alignment (built locally from the base bars), optionally confirmed by
+    detect_chart_patterns, with calculate_sl_tp stops and targets. Exits: SL/TP touched
+    intrabar or the monitor_and_exit_trades 1H/4H reversal tests. Decisions are taken at
+    base bar closes and filled at the next bar's open, one position at a time like run_bot.
+    Signals and exits are found with array searches, so the Python loop runs per trade,
+    not per bar. `indicator_frames` takes (base, 4H) indicator frames already built from
+    `rates` in place of calling `indicators`. Returns (trade ledger DataFrame, equity curve Series).
+    """
+    base_seconds = TIMEFRAME_SECONDS[base_timeframe]
+    times = rates['time'].astype(np.int64)
+    opens = rates['open'].astype(float)
+    highs = rates['high'].astype(float)
+    lows = rates['low'].astype(float)
+    closes = rates['close'].astype(float)
+    spreads = rates['spread'].astype(float) * point
+    n = len(rates)
+    decision_times = times + base_seconds # Close time of each base bar
+
+    # Indicators are computed once over the whole history; dropped warm-up/NaN rows keep the
+    # live semantics of "latest row that survived calculate_indicators".
+    if indicator_frames is None:
+        df_base = indicators(rates_to_frame(rates))
+        df_4h = indicators(rates_to_frame(resample_rates(rates, mt5.TIMEFRAME_H4)))
+    else:
+        df_base, df_4h = indicator_frames
+    base_open_times = df_base.index.to_numpy(dtype='datetime64[s]').astype(np.int64)
+    h4_open_times = df_4h.index.to_numpy(dtype='datetime64[s]').astype(np.int64)
+    base_row = _latest_row(base_open_times + base_seconds, decision_times)
+    h4_row = _latest_row(h4_open_times + TIMEFRAME_SECONDS[mt5.TIMEFRAME_H4], decision_times)
+    has_rows = (base_row >= 0) & (h4_row >= 0)
+
+    bullish_mask, bearish_mask = alignment_masks(df_4h, "4H")
+    bullish_pattern, bearish_pattern = pattern_masks(df_4h)
+    long_signal = has_rows & (bullish_mask[h4_row] == ALL_CONDITIONS_MASK)
+    short_signal = has_rows & ~long_signal & (bearish_mask[h4_row] == ALL_CONDITIONS_MASK)
+    if require_pattern:
+        long_signal &= bullish_pattern[h4_row]
+        short_signal &= bearish_pattern[h4_row]
+    entry_indices = np.flatnonzero((long_signal | short_signal)[:-1]) # Last bar has no next open to fill at
+
+    base_bearish_rev, base_bullish_rev = reversal_masks(df_base, "1H") # The base bars stand in for run_bot's 1H exit frame
+    h4_bearish_rev, h4_bullish_rev = reversal_masks(df_4h, "4H")
+    long_exit = has_rows & (base_bearish_rev[base_row] | h4_bearish_rev[h4_row])
+    short_exit = has_rows & (base_bullish_rev[base_row] | h4_bullish_rev[h4_row])
+    long_exit_h4, short_exit_h4 = has_rows & h4_bearish_rev[h4_row], has_rows & h4_bullish_rev[h4_row]
+    long_exit_indices, short_exit_indices = np.flatnonzero(long_exit), np.flatnonzero(short_exit)
+    atr_4h = df_4h['ATR'].to_numpy(dtype=float)
+
+    trades = []
+    direction_by_bar = np.zeros(n, dtype=np.int8)
+    entry_by_bar = np.zeros(n)
+    realized = np.zeros(n)
+    units = lot * contract_size
+    decision = _next_true(entry_indices, 0)
+    while decision is not None:
+        fill = decision + 1
+        is_long = bool(long_signal[decision])
+        direction = 1 if is_long else -1
+        atr_value = atr_4h[h4_row[decision]]
+        entry = opens[fill] + (spreads[fill] if is_long else 0.0) # Buy at ask, sell at bid
+        sl, tp = _sl_tp(entry, atr_value, is_long, point, sl_multiplier, tp_multiplier)
+
+        # Reversal exit decided at a bar close (from the fill bar on), filled at the next open
+        reversal = _next_true(long_exit_indices if is_long else short_exit_indices, fill)
+        if reversal is not None and reversal + 1 >= n:
+            reversal = None
+        last_bar = reversal if reversal is not None else n - 1
+
+        # Stops and targets are checked on bid (longs) or ask (shorts) ranges up to the reversal bar
+        window = slice(fill, last_bar + 1)
+        offset = 0.0 if is_long else spreads[window]
+        bar_high, bar_low = highs[window] + offset, lows[window] + offset
+        if is_long:
+            sl_hit, tp_hit = bar_low <= sl, bar_high >= tp
+        else:
+            sl_hit, tp_hit = bar_high >= sl, bar_low <= tp
+        touched = np.flatnonzero(sl_hit | tp_hit)
+
+        if len(touched):
+            exit_bar = fill + int(touched[0])
+            bar_open = opens[exit_bar] + (0.0 if is_long else spreads[exit_bar])
+            if sl_hit[touched[0]]: # Stop first when both are inside one bar
+                exit_reason = "SL"
+                exit_price = min(bar_open, sl) if is_long else max(bar_open, sl)
+            else:
+                exit_reason = "TP"
+                exit_price = max(bar_open, tp) if is_long else min(bar_open, tp)
+        elif reversal is not None:
+            exit_bar = reversal + 1
+            exit_price = opens[exit_bar] + (0.0 if is_long else spreads[exit_bar])
+            h4_reversal = (long_exit_h4 if is_long else short_exit_h4)[reversal]
+            exit_reason = ("4H " if h4_reversal else "1H ") + ("bearish" if is_long else "bullish") + " reversal"
+        else:
+            exit_bar = n - 1
+            exit_price = closes[exit_bar] + (0.0 if is_long else spreads[exit_bar])
+            exit_reason = "end of data"
+
+        # Flat at the exit bar's close, where the trade's result is realized
+        pnl = (exit_price - entry) * direction * units
+        direction_by_bar[fill:exit_bar] = direction
+        entry_by_bar[fill:exit_bar] = entry
+        realized[exit_bar] += pnl
+        trades.append({
+            'entry_time': pd.to_datetime(times[fill], unit='s'),
+            'exit_time': pd.to_datetime(times[exit_bar], unit='s'),
+            'type': "BUY" if is_long else "SELL",
+            'entry_price': entry,
+            'exit_price': exit_price,
+            'sl': sl,
+            'tp': tp,
+            'atr': atr_value,
+            'pattern': _pattern_name(bullish_pattern, bearish_pattern, h4_row[decision]),
+            'exit_reason': exit_reason,
+            'bars_held': exit_bar - fill,
+            'pnl': pnl,
+        })
+        decision = _next_true(entry_indices, exit_bar) if exit_reason != "end of data" else None
+
+    # Mark-to-market at every bar close: longs at bid, shorts at ask
+    mark = closes + np.where(direction_by_bar < 0, spreads, 0.0)
+    open_pnl = direction_by_bar * (mark - entry_by_bar) * units
+    equity = pd.Series(initial_balance + np.cumsum(realized) + open_pnl,
+                       index=pd.to_datetime(times, unit='s'), name='equity')
+    ledger = pd.DataFrame(trades, columns=['entry_time', 'exit_time', 'type', 'entry_price', 'exit_price', 'sl', 'tp',
+                                           'atr', 'pattern', 'exit_reason', 'bars_held', 'pnl'])
+    return ledger, equity
+
+def _sl_tp(price, atr_value, is_long, point, sl_multiplier=SL_ATR_MULTIPLIER, tp_multiplier=TP_ATR_MULTIPLIER):
+    """calculate_sl_tp without the terminal round-trip for the symbol's point."""
+    if is_long:
+        sl, tp = price - atr_value * sl_multiplier, price + atr_value * tp_multiplier
+    else:
+        sl, tp = price + atr_value * sl_multiplier, price - atr_value * tp_multiplier
+    return round(sl / point) * point, round(tp / point) * point
+
+def _pattern_name(bullish_pattern, bearish_pattern, row):
+    if bullish_pattern[row]:
+        return "Bullish Trend Continuation"
+    if bearish_pattern[row]:
+        return "Bearish Trend Continuation"
+    return None
+
+def summarize_backtest(ledger, equity):
+    """Headline statistics for a run_backtest result."""
+    summary = backtest_statistics(ledger, equity)
+    print(f"Backtest: {summary['trades']} trades, win rate {summary['win_rate']:.1%}, "
+          f"net {summary['net_profit']:.2f}, max drawdown {summary['max_drawdown']:.2f}")
+    return summary
+
+def backtest_statistics(ledger, equity):
+    """summarize_backtest without the console line."""
+    wins = ledger[ledger['pnl'] > 0]
+    drawdown = equity - equity.cummax()
+    summary = {
+        'trades': len(ledger),
+        'win_rate': len(wins) / len(ledger) if len(ledger) else 0.0,
+        'net_profit': float(ledger['pnl'].sum()),
+        'profit_factor': float(wins['pnl'].sum() / -ledger.loc[ledger['pnl'] < 0, 'pnl'].sum()) if (ledger['pnl'] < 0).any() else float('inf'),
+        'max_drawdown': float(drawdown.min()) if len(equity) else 0.0,
+        'final_equity': float(equity.iloc[-1]) if len(equity) else 0.0,
+    }
+    return summary
+
+# --- Parameter Sweep Optimizer ---
+SWEEP_PARAMETERS = ( # Sweepable settings; the SL/TP multipliers vary fastest so indicator frames are reused
+    'EMA_SHORT_PERIOD', 'EMA_LONG_PERIOD', 'MACD_FAST_PERIOD', 'MACD_SLOW_PERIOD', 'MACD_SIGNAL_PERIOD',
+    'RSI_PERIOD', 'STOCH_RSI_K_PERIOD', 'STOCH_RSI_SMOOTH_K', 'STOCH_RSI_SMOOTH_D',
+    'SAR_ACCELERATION', 'SAR_MAX_ACCELERATION', 'ATR_PERIOD', 'SL_ATR_MULTIPLIER', 'TP_ATR_MULTIPLIER'
+)
+INDICATOR_SWEEP_PARAMETERS = SWEEP_PARAMETERS[:-2]
+SWEEP_BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume') # Bar columns the sweep's indicator frames carry
+
+class IndicatorSeriesCache:
+    """
+    calculate_indicators for one timeframe's bars under many parameter sets. `bars` is a
+    (SWEEP_BAR_COLUMNS x bars) float64 matrix and `times` the bar open times; both may be
+    views over shared memory, which the indicator kernels then read without a copy.
+    Each indicator series is computed once per distinct parameter value and shared by every
+    combination that uses it (a 20-period EMA serves as EMA_Short in one run and EMA_Long in another).
+    """
+
+    def __init__(self, bars, times):
+        self.index = pd.DatetimeIndex(times, copy=False, name='time')
+        self.df = {column: pd.Series(values, index=self.index, copy=False)
+                   for column, values in zip(SWEEP_BAR_COLUMNS, bars)}
+        self.series = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, *params):
+        key = (kind,) + params
+        if key in self.series:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.series[key] = self._compute(kind, *params)
+        return self.series[key]
+
+    def _compute(self, kind, *params):
+        df = self.df
+        if kind == 'ema':
+            return ema_series(df['close'], params[0])
+        if kind == 'macd':
+            return macd_series(df['close'], *params)
+        if kind == 'pvo':
+            return pvo_series(df['volume'])
+        if kind == 'sar':
+            return psar_series(df['high'], df['low'], df['close'], *params)
+        if kind == 'rsi':
+            return rsi_series(df['close'], params[0])
+        if kind == 'stochrsi':
+            rsi_length, length, k, d = params
+            return stochrsi_series(self.get('rsi', rsi_length), length, k, d)
+        if kind == 'atr':
+            return atr_series(df['high'], df['low'], df['close'], params[0])
+        raise ValueError(f"Unknown indicator series: {kind}")
+
+    def frame(self, params):
+        """The calculate_indicators frame (SWEEP_BAR_COLUMNS only) for a dict of SWEEP_PARAMETERS values."""
+        if not len(self.index):
+            return pd.DataFrame()
+        macd_line, macd_histogram, macd_signal = self.get(
+            'macd', params['MACD_FAST_PERIOD'], params['MACD_SLOW_PERIOD'], params['MACD_SIGNAL_PERIOD'])
+        stoch_k, stoch_d = self.get('stochrsi', params['RSI_PERIOD'], params['STOCH_RSI_K_PERIOD'],
+                                    params['STOCH_RSI_SMOOTH_K'], params['STOCH_RSI_SMOOTH_D'])
+        return pd.DataFrame(self.df).assign(
+            EMA_Short=self.get('ema', params['EMA_SHORT_PERIOD']),
+            EMA_Long=self.get('ema', params['EMA_LONG_PERIOD']),
+            MACD_Line=macd_line,
+            MACD_Histogram=macd_histogram,
+            MACD_Signal_Line=macd_signal,
+            Volume_Oscillator=self.get('pvo'),
+            SAR=self.get('sar', params['SAR_ACCELERATION'], params['SAR_MAX_ACCELERATION']),
+            RSI=self.get('rsi', params['RSI_PERIOD']),
+            StochRSI_K=stoch_k,
+            StochRSI_D=stoch_d,
+            ATR=self.get('atr', params['ATR_PERIOD']),
+        ).dropna()
+
+def _valid_combination(params):
+    return (params['EMA_SHORT_PERIOD'] < params['EMA_LONG_PERIOD']
+            and params['MACD_FAST_PERIOD'] < params['MACD_SLOW_PERIOD']
+            and params['SAR_ACCELERATION'] <= params['SAR_MAX_ACCELERATION'])
+
+def parameter_combinations(space=OPTIMIZER_SPACE, samples=None, seed=0):
+    """
+    Parameter dicts to sweep: the full grid of `space` (name -> candidate values), or
+    `samples` distinct random picks from it. Parameters missing from `space` keep their
+    configured value. Combinations with EMA short >= long, MACD fast >= slow or a SAR step
+    above its cap are dropped, so a random sample can come back a little short.
+    """
+    unknown = set(space) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Not sweepable: {', '.join(sorted(unknown))}")
+    axes = [list(space.get(name, [globals()[name]])) for name in SWEEP_PARAMETERS]
+    total = math.prod(len(axis) for axis in axes)
+    if samples is None or samples >= total:
+        picks = itertools.product(*axes)
+    else:
+        picks = []
+        for index in sorted(random.Random(seed).sample(range(total), samples)): # Sorted keeps grid order
+            values = []
+            for axis in reversed(axes):
+                index, digit = divmod(index, len(axis))
+                values.append(axis[digit])
+            picks.append(values[::-1])
+    combinations = (dict(zip(SWEEP_PARAMETERS, values)) for values in picks)
+    return [params for params in combinations if _valid_combination(params)]
+
+def sweep_arrays(rates):
+    """
+    The sweep's inputs as plain arrays: the base rates, and for the base and H4 bars
+    (resampled here, once) a SWEEP_BAR_COLUMNS x bars float64 matrix and the open times.
+    """
+    arrays = {'rates': rates}
+    for name, bars in (('base', rates), ('h4', resample_rates(rates, mt5.TIMEFRAME_H4))):
+        arrays[name] = np.array([bars['tick_volume' if column == 'volume' else column] for column in SWEEP_BAR_COLUMNS],
+                                dtype=np.float64)
+        arrays[name + '_time'] = bars['time'].astype('datetime64[s]')
+    return arrays
+
+def _share_arrays(arrays):
+    """Copies named arrays into one new shared memory block; returns (block, layout for _map_arrays)."""
+    layout, size = [], 0
+    for name, array in arrays.items():
+        size = -(-size // 64) * 64 # Each array starts on a cache line
+        layout.append((name, array.shape, array.dtype, size))
+        size += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+    for (name, shape, dtype, offset), array in zip(layout, arrays.values()):
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = array
+    return shm, layout
+
+def _map_arrays(shm, layout):
+    """Views over a _share_arrays block, by name (no copy)."""
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for name, shape, dtype, offset in layout}
+
+_SWEEP_WORKER = {}
+
+def _setup_sweep_worker(arrays, base_timeframe, point, options):
+    _SWEEP_WORKER.update({
+        'rates': arrays['rates'],
+        'base': IndicatorSeriesCache(arrays['base'], arrays['base_time']),
+        'h4': IndicatorSeriesCache(arrays['h4'], arrays['h4_time']),
+        'base_timeframe': base_timeframe,
+        'point': point,
+        'options': options,
+        'frames_key': None,
+        'frames': None,
+    })
+
+def _sweep_worker_init(shm_name, layout, base_timeframe, point, options):
+    """Process-pool initializer: maps the shared sweep_arrays once per worker."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _SWEEP_WORKER['shm'] = shm # The mapping must outlive the arrays viewing it
+    _setup_sweep_worker(_map_arrays(shm, layout), base_timeframe, point, options)
+
+def _sweep_chunk(combinations):
+    """Backtests a run of combinations; returns (result rows, series cache hits, series computed)."""
+    state = _SWEEP_WORKER
+    caches = (state['base'], state['h4'])
+    hits, misses = sum(cache.hits for cache in caches), sum(cache.misses for cache in caches)
+    rows = []
+    for params in combinations:
+        key = tuple(params[name] for name in INDICATOR_SWEEP_PARAMETERS)
+        if key != state['frames_key']: # Consecutive combinations often differ only in SL/TP
+            state['frames_key'], state['frames'] = key, (state['base'].frame(params), state['h4'].frame(params))
+        ledger, equity = run_backtest(state['rates'], state['base_timeframe'], state['point'],
+                                      indicator_frames=state['frames'], sl_multiplier=params['SL_ATR_MULTIPLIER'],
+                                      tp_multiplier=params['TP_ATR_MULTIPLIER'], **state['options'])
+        rows.append({**params, **backtest_statistics(ledger, equity)})
+    return (rows, sum(cache.hits for cache in caches) - hits, sum(cache.misses for cache in caches) - misses)
+
+def optimize_parameters(rates, space=OPTIMIZER_SPACE, samples=OPTIMIZER_SAMPLES, workers=OPTIMIZER_WORKERS,
+                        objective=OPTIMIZER_OBJECTIVE, min_trades=OPTIMIZER_MIN_TRADES, seed=0,
+                        base_timeframe=mt5.TIMEFRAME_H1, point=0.00001, **backtest_options):
+    """
+    Runs run_backtest over `rates` for every combination from parameter_combinations and
+    returns the results ranked by `objective` (a summarize_backtest key), best first, with
+    shallower drawdown breaking ties; runs with fewer than `min_trades` trades rank last.
+    The rates, the H4 bars resampled from them and both timeframes' kernel inputs are
+    placed in shared memory once and mapped by each worker process without copying, and
+    each worker builds an indicator series once per distinct parameter value.
+    Extra keyword arguments go to run_backtest (lot, require_pattern, ...).
+    """
+    combinations = parameter_combinations(space, samples, seed)
+    if not combinations:
+        return pd.DataFrame()
+    workers = max(1, min(workers, len(combinations)))
+    started = time.perf_counter()
+    rows, hits, misses = [], 0, 0
+    arrays = sweep_arrays(rates)
+    if workers == 1:
+        _setup_sweep_worker(arrays, base_timeframe, point, backtest_options)
+        rows, hits, misses = _sweep_chunk(combinations)
+    else:
+        shm, layout = _share_arrays(arrays)
+        try:
+            # Contiguous chunks keep combinations that share indicator settings in one worker
+            chunk_size = max(1, math.ceil(len(combinations) / (workers * 4)))
+            chunks = [combinations[i:i + chunk_size] for i in range(0, len(combinations), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_sweep_worker_init,
+                                     initargs=(shm.name, layout, base_timeframe, point, backtest_options)) as pool:
+                for chunk_rows, chunk_hits, chunk_misses in pool.map(_sweep_chunk, chunks):
+                    rows.extend(chunk_rows)
+                    hits += chunk_hits
+                    misses += chunk_misses
+        finally:
+            shm.close()
+            shm.unlink()
+    elapsed = time.perf_counter() - started
+
+    table = pd.DataFrame(rows)
+    table.insert(0, 'eligible', table['trades'] >= min_trades)
+    table = table.sort_values(['eligible', objective, 'max_drawdown'], ascending=False, kind='stable')
+    table = table.drop(columns='eligible').reset_index(drop=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+    print(f"Swept {len(table)} parameter combinations in {elapsed:.1f}s on {workers} worker(s) "
+          f"({len(table) / max(elapsed, 1e-9):.0f}/s); indicator series computed {misses}, reused {hits}.")
+    return table
+
+def run_optimizer(space=OPTIMIZER_SPACE, samples=OPTIMIZER_SAMPLES, bars=OPTIMIZER_BARS,
+                  results_path=OPTIMIZER_RESULTS_PATH, top=20):
+    """OPTIMIZER_MODE entry point: sweeps SYMBOL's H1 history and writes the ranked table."""
+    rates = None
+    if USE_BAR_STORE and os.path.exists(os.path.join(bar_store_path(SYMBOL, mt5.TIMEFRAME_H1), "meta.json")):
+        rates = BarStoreReader(SYMBOL, mt5.TIMEFRAME_H1).rates()[-bars:]
+    if not initialize_mt5():
+        return None
+    if rates is None or len(rates) == 0:
+        rates = mt5.copy_rates_from_pos(SYMBOL, mt5.TIMEFRAME_H1, 0, bars)
+    if rates is None or len(rates) == 0:
+        print(f"No H1 history for {SYMBOL}, error code = {mt5.last_error()}")
+        return None
+    symbol_info = mt5.symbol_info(SYMBOL)
+    point = symbol_info.point if symbol_info is not None else 0.00001
+    print(f"Optimizing {SYMBOL} over {len(rates)} H1 bars...")
+    table = optimize_parameters(rates, space, samples, point=point)
+    if table.empty:
+        print("No valid parameter combinations to sweep.")
+        return table
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.head(top).to_string())
+    if results_path:
+        table.to_csv(results_path)
+        print(f"Optimizer results written to {results_path}")
+    return table
+
+# --- Tick Stream ---
+TICK_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('volume', '<f8')])
+
+class TickBuffer:
+    """Ring buffer of recent ticks in a compact fixed-width layout, capped at `max_bytes`."""
+
+    def __init__(self, max_bytes=TICK_BUFFER_MAX_BYTES):
+        self.capacity = max(1, max_bytes // TICK_DTYPE.itemsize)
+        self.buffer = np.zeros(self.capacity, dtype=TICK_DTYPE)
+        self.start = 0
+        self.count = 0
+
+    def append(self, ticks):
+        """Appends MT5 ticks (any array with time_msc/bid/ask/volume fields); the oldest are overwritten."""
+        ticks = ticks[-self.capacity:]
+        positions = (self.start + self.count + np.arange(len(ticks))) % self.capacity
+        for field in TICK_DTYPE.names:
+            self.buffer[field][positions] = ticks[field]
+        self.count += len(ticks)
+        if self.count > self.capacity:
+            self.start = (self.start + self.count - self.capacity) % self.capacity
+            self.count = self.capacity
+
+    def latest(self, n=None):
+        """Copy of the last n ticks in arrival order."""
+        n = self.count if n is None else min(n, self.count)
+        return self.buffer[(self.start + self.count - n + np.arange(n)) % self.capacity]
+
+class TickBarBuilder:
+    """
+    Builds the forming bar of every configured timeframe from ticks (bid prices and
+    tick counts, like MT5 bars) and feeds it to the incremental indicator engines.
+    Ticks are merged a batch at a time with vectorized bucket reductions; indicator
+    and alignment evaluation runs at most every `evaluation_interval` seconds.
+    """
+
+    def __init__(self, symbol, timeframes=TIMEFRAMES, evaluation_interval=TICK_EVALUATION_INTERVAL_SECONDS):
+        self.symbol = symbol
+        self.timeframes = dict(timeframes)
+        self.evaluation_interval = evaluation_interval
+        self.ticks = TickBuffer()
+        self.bars = {name: None for name in self.timeframes} # name -> [time, open, high, low, close, tick count]
+        self.engines = {}
+        self.last_tick_msc = 0
+        self.boundary_ticks = 0 # Ticks already merged that carry last_tick_msc (several can share a millisecond)
+        self.last_evaluation = -math.inf
+        self.ticks_processed = 0
+
+    def seed(self, bars=200):
+        """Warms the engines and forming bars up from terminal history."""
+        for name, timeframe in self.timeframes.items():
+            df = get_ohlc_data(self.symbol, timeframe, bars=bars)
+            if df.empty:
+                print(f"Could not seed {name} for tick streaming.")
+                continue
+            update_indicators(self.symbol, timeframe, df)
+            self.engines[name] = INDICATOR_ENGINES[(self.symbol, timeframe)]
+            last = df.iloc[-1]
+            volume = last['tick_volume'] if 'tick_volume' in df.columns else last['volume']
+            self.bars[name] = [int(df.index[-1].timestamp()), last['open'], last['high'], last['low'], last['close'], volume]
+            self.last_tick_msc = max(self.last_tick_msc, int(df.index[-1].timestamp()) * 1000)
+        # The forming bars already count every tick up to now; start after the current tick, not at the bar open
+        tick = mt5.symbol_info_tick(self.symbol)
+        if tick is not None and tick.time_msc >= self.last_tick_msc:
+            self.last_tick_msc = int(tick.time_msc)
+            self.boundary_ticks = 1
+
+    def on_ticks(self, ticks):
+        """Merges a batch of ticks into every forming bar; returns an evaluation when one is due."""
+        times = ticks['time_msc']
+        # Ticks sharing the last merged millisecond are new unless they were among the ones already merged
+        boundary = np.flatnonzero(times == self.last_tick_msc)
+        keep = times > self.last_tick_msc
+        keep[boundary[self.boundary_ticks:]] = True
+        ticks = ticks[keep]
+        if len(ticks) == 0:
+            return None
+        self.ticks.append(ticks)
+        last_msc = int(ticks['time_msc'][-1])
+        same = int(np.count_nonzero(ticks['time_msc'] == last_msc))
+        self.boundary_ticks = self.boundary_ticks + same if last_msc == self.last_tick_msc else same
+        self.last_tick_msc = last_msc
+        self.ticks_processed += len(ticks)
+
+        seconds = ticks['time_msc'] // 1000
+        prices = ticks['bid'].astype(float)
+        for name, timeframe in self.timeframes.items():
+            keys = bucket_start(seconds, timeframe)
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            ends = np.r_[starts[1:], len(keys)]
+            highs = np.maximum.reduceat(prices, starts)
+            lows = np.minimum.reduceat(prices, starts)
+            for k, start in enumerate(starts):
+                self._merge(name, int(keys[start]), prices[start], highs[k], lows[k], prices[ends[k] - 1], ends[k] - start)
+
+        if time.monotonic() - self.last_evaluation >= self.evaluation_interval:
+            return self.evaluate()
+        return None
+
+    def _merge(self, name, bar_time, open_, high, low, close, count):
+        bar = self.bars[name]
+        if bar is None or bar_time > bar[0]:
+            if bar is not None and name in self.engines:
+                self._push(name, bar) # Final values of the bar that just closed
+            self.bars[name] = [bar_time, open_, high, low, close, count]
+        elif bar_time == bar[0]:
+            bar[2] = max(bar[2], high)
+            bar[3] = min(bar[3], low)
+            bar[4] = close
+            bar[5] += count
+
+    def _push(self, name, bar):
+        self.engines[name].update(pd.Timestamp(bar[0], unit='s'), bar[1], bar[2], bar[3], bar[4], float(bar[5]))
+
+    def evaluate(self):
+        """Updates every engine with its forming bar and runs the alignment kernel on the latest rows."""
+        self.last_evaluation = time.monotonic()
+        latest = {}
+        for name, bar in self.bars.items():
+            if bar is None or name not in self.engines:
+                continue
+            self._push(name, bar)
+            row = self.engines[name].latest()
+            if row is not None:
+                latest[name] = row
+        if not latest:
+            return {}
+        frame = pd.DataFrame(list(latest.values()), index=list(latest.keys()))
+        bullish, bearish = batch_rule_masks("alignment", frame, frame.index)
+        return {name: {'bullish': bullish[i] == ALL_CONDITIONS_MASK, 'bearish': bearish[i] == ALL_CONDITIONS_MASK,
+                       'bullish_mask': int(bullish[i]), 'bearish_mask': int(bearish[i]), 'close': frame['close'].iloc[i]}
+                for i, name in enumerate(frame.index)}
+
+    def poll(self):
+        """Pulls the ticks that arrived since the last poll from the terminal."""
+        ticks = mt5.copy_ticks_from(self.symbol, self.last_tick_msc // 1000, 100000, mt5.COPY_TICKS_ALL)
+        if ticks is None:
+            print(f"No ticks for {self.symbol} - {mt5.last_error()}")
+            return None
+        return self.on_ticks(ticks)
+
+def benchmark_tick_builder(n_ticks=BENCHMARK_TICKS, batch_size=1000, seed=7):
+    """
+    Feeds synthetic ticks through a fresh TickBarBuilder per run (no terminal needed),
+    prints ticks/second and returns the timing as a run_benchmarks result.
+    """
+    rng = np.random.default_rng(seed)
+    ticks = np.zeros(n_ticks, dtype=TICK_DTYPE)
+    ticks['time_msc'] = 1_600_000_000_000 + np.cumsum(rng.integers(1, 500, n_ticks))
+    ticks['bid'] = 1.1 + np.cumsum(rng.normal(0, 0.00002, n_ticks))
+    ticks['ask'] = ticks['bid'] + 0.00010
+    builders = []
+
+    def feed():
+        builder = TickBarBuilder("BENCH", evaluation_interval=TICK_EVALUATION_INTERVAL_SECONDS)
+        for name in builder.timeframes:
+            builder.engines[name] = IncrementalIndicators()
+        for offset in range(0, n_ticks, batch_size):
+            builder.on_ticks(ticks[offset:offset + batch_size])
+        builders[:] = [builder]
+
+    result = _measure(feed, 1)
+    builder = builders[0]
+    print(f"Tick builder: {n_ticks} ticks in {result['median_s']:.2f}s ({n_ticks / result['median_s']:,.0f} ticks/s, "
+          f"batches of {batch_size}, buffer {builder.ticks.count} ticks / "
+          f"{builder.ticks.capacity * TICK_DTYPE.itemsize // 1024} KiB cap)")
+    return {f"tick_builder[{n_ticks}]": result}
+
+def run_tick_stream(symbol=SYMBOL):
+    """Evaluates alignment on SYMBOL's forming bars from live ticks and alerts on changes."""
+    if not initialize_mt5():
+        return
+    builder = TickBarBuilder(symbol)
+    builder.seed()
+    while True:
+        results = builder.poll()
+        for name, result in (results or {}).items():
+            for direction, mask in (("BUY", result['bullish_mask']), ("SELL", result['bearish_mask'])):
+                met = bin(mask).count("1")
+                new_state = SIGNALS.update(symbol, name, direction, met)
+                if new_state is None:
+                    continue
+                print(describe_transition(symbol, name, direction, new_state, met))
+                if new_state == SIGNAL_FIRED: # The cooldown keeps an intrabar flip-flop from alerting repeatedly
+                    state = "bullish" if direction == "BUY" else "bearish"
+                    print(f"Intrabar {state} alignment on {symbol} {name} at {result['close']}")
+                    send_telegram_message(f"Intrabar {state} alignment on {symbol} {name} timeframe (price {result['close']})")
+        time.sleep(TICK_POLL_SECONDS)
+
+# --- Bar-Close Scheduler ---
+def server_time_now(tz):
+    """Current broker server wall-clock time as MT5-style epoch seconds."""
+    now = datetime.now(pytz.utc).astimezone(tz)
+    return calendar.timegm(now.replace(tzinfo=None).timetuple()) + now.microsecond / 1e6
+
+def server_time_to_utc(server_seconds, tz):
+    """Real UTC datetime of an MT5-style server epoch time."""
+    naive = datetime.fromtimestamp(server_seconds, pytz.utc).replace(tzinfo=None)
+    return tz.localize(naive).astimezone(pytz.utc)
+
+def next_bar_close(server_seconds, timeframe):
+    """Server time at which the bar containing `server_seconds` closes."""
+    return int(bucket_start(int(server_seconds), timeframe)) + TIMEFRAME_SECONDS[timeframe]
+
+class BarCloseScheduler:
+    """
+    Sleeps until the next bar close (plus a settle delay) of any scheduled timeframe,
+    in broker server time, and reports which timeframes just closed a bar.
+    Wake-up jitter (actual minus intended wake time) is kept for inspection.
+    """
+
+    def __init__(self, timeframes, settle_seconds=BAR_CLOSE_SETTLE_SECONDS, timezone=BROKER_TIMEZONE):
+        self.timeframes = dict(timeframes) # name -> MT5 timeframe
+        self.settle_seconds = settle_seconds
+        self.tz = pytz.timezone(timezone)
+        now = server_time_now(self.tz)
+        self.next_close = {name: next_bar_close(now, tf) for name, tf in self.timeframes.items()}
+        self.jitter = deque(maxlen=1000) # Seconds late (negative = early) per wake-up
+
+    def wait(self):
+        """Blocks until the next close and returns the set of timeframe names that closed."""
+        target = server_time_to_utc(min(self.next_close.values()) + self.settle_seconds, self.tz)
+        delay = (target - datetime.now(pytz.utc)).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+        self.jitter.append((datetime.now(pytz.utc) - target).total_seconds())
+
+        closed_by = server_time_now(self.tz) - self.settle_seconds
+        due = {name for name, close in self.next_close.items() if close <= closed_by}
+        for name in due:
+            self.next_close[name] = next_bar_close(closed_by, self.timeframes[name])
+        return due
+
+    def jitter_stats(self):
+        """Scheduling jitter summary in milliseconds."""
+        if not self.jitter:
+            return {'wakeups': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        values = np.array(self.jitter) * 1000
+        return {'wakeups': len(values), 'mean_ms': float(values.mean()),
+                'p95_ms': float(np.percentile(values, 95)), 'max_ms': float(values.max())}
+
+def closed_bars(df):
+    """Drops the forming bar: right after a close it holds only seconds of ticks and almost no tick volume."""
+    return df.iloc[:-1]
+
+# --- Warm-Start Checkpoint ---
+RUN_STATE = {} # run_bot's data_frames, registered so shutdown can checkpoint them
+
+def checkpoint_fingerprint():
+    """Settings a checkpoint depends on; a mismatch on boot means the cached state is not reusable."""
+    return (SYMBOL, tuple(sorted(TIMEFRAMES.items())), BAR_CACHE_CAPACITY, INDICATOR_HISTORY_BARS,
+            EMA_SHORT_PERIOD, EMA_LONG_PERIOD, MACD_FAST_PERIOD, MACD_SLOW_PERIOD, MACD_SIGNAL_PERIOD,
+            RSI_PERIOD, STOCH_RSI_K_PERIOD, STOCH_RSI_D_PERIOD, STOCH_RSI_SMOOTH_K, STOCH_RSI_SMOOTH_D,
+            SAR_ACCELERATION, SAR_MAX_ACCELERATION, ATR_PERIOD, PVO_FAST_PERIOD, PVO_SLOW_PERIOD)
+
+def save_checkpoint(path=CHECKPOINT_PATH):
+    """Writes bar caches, resamplers, indicator engines, run_bot's frames and signal states atomically."""
+    if not RUN_STATE:
+        return False
+    checkpoint = {
+        'version': 3,
+        'saved_at': time.time(),
+        'fingerprint': checkpoint_fingerprint(),
+        'bar_caches': BAR_CACHES,
+        'resamplers': RESAMPLERS,
+        'indicator_engines': INDICATOR_ENGINES,
+        'data_frames': RUN_STATE['data_frames'],
+        'signal_states': SIGNALS.states,
+        'signal_journal': list(SIGNALS.journal),
+    }
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except (OSError, pickle.PicklingError) as e:
+        print(f"Failed to write checkpoint {path}: {e}")
+        return False
+    return True
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """
+    Restores a checkpoint written by save_checkpoint into the module caches and
+    returns it, or None (cold start) if it is missing, stale or from other settings.
+    The restored bar caches then only fetch the bars since the checkpoint, and the
+    indicator engines fold those in; a gap longer than a cache triggers their
+    usual full reload.
+    """
+    try:
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    age = time.time() - checkpoint.get('saved_at', 0)
+    if checkpoint.get('version') != 3 or checkpoint.get('fingerprint') != checkpoint_fingerprint():
+        print("Ignoring checkpoint written with different settings.")
+        return None
+    if age > CHECKPOINT_MAX_AGE_SECONDS:
+        print(f"Ignoring checkpoint from {age / 3600:.1f} hours ago.")
+        return None
+    BAR_CACHES.update(checkpoint['bar_caches'])
+    RESAMPLERS.update(checkpoint['resamplers'])
+    INDICATOR_ENGINES.update(checkpoint['indicator_engines'])
+    SIGNALS.states.update(checkpoint['signal_states'])
+    SIGNALS.journal.extend(checkpoint['signal_journal'])
+    print(f"Warm start from checkpoint saved {age:.0f}s ago "
+          f"({len(checkpoint['bar_caches'])} bar caches, {len(checkpoint['indicator_engines'])} indicator engines).")
+    return checkpoint
+
+# --- Benchmarks ---
+def synthetic_frame(n_bars, seed=0, timeframe=mt5.TIMEFRAME_H1):
+    """Deterministic OHLCV DataFrame shaped like get_ohlc_data output."""
+    import mt5_simulator
+    step = TIMEFRAME_SECONDS[timeframe]
+    start = 946857600 # 2000-01-03, a Monday
+    rates = np.zeros(0, dtype=mt5_simulator.RATES_DTYPE)
+    span = n_bars * step
+    while len(rates) < n_bars: # Weekends are skipped, so widen until there are enough bars
+        span = int(span * 1.5)
+        rates = mt5_simulator.synthetic_rates(start, start + span, step, seed)
+    return rates_to_frame(rates[:n_bars])
+
+def _measure(func, min_repeats=3, min_seconds=BENCHMARK_MIN_SECONDS, max_repeats=200):
+    """Median/best wall time over repeated calls, then one extra call under tracemalloc for peak memory."""
+    times = []
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while len(times) < min_repeats or (time.perf_counter() - started < min_seconds and len(times) < max_repeats):
+            call_started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - call_started)
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'median_s': float(np.median(times)), 'best_s': min(times), 'repeats': len(times), 'peak_mb': peak / 2 ** 20}
+
+def benchmark_functions(sizes=BENCHMARK_SIZES):
+    """calculate_indicators, the alignment checks and detect_chart_patterns at each series size."""
+    results = {}
+    for n_bars in sizes:
+        df = synthetic_frame(n_bars)
+        repeats = 1 if n_bars >= 1_000_000 else 3
+        results[f"calculate_indicators[{n_bars}]"] = _measure(lambda: calculate_indicators(df.copy()), repeats)
+        indicators = calculate_indicators(df.copy())
+        df_dict = {tf: indicators for tf in TIMEFRAMES}
+        results[f"check_bullish_alignment[{n_bars}]"] = _measure(lambda: check_bullish_alignment(df_dict))
+        results[f"check_bearish_alignment[{n_bars}]"] = _measure(lambda: check_bearish_alignment(df_dict))
+        results[f"detect_chart_patterns[{n_bars}]"] = _measure(lambda: detect_chart_patterns(indicators))
+    return results
+
+def benchmark_indicators(sizes=BENCHMARK_SIZES, pandas_ta_max_bars=BENCHMARK_PANDAS_TA_MAX_BARS):
+    """
+    Each indicator_kernels kernel (preallocated outputs) at each size and, where pandas_ta is
+    installed, its pandas_ta counterpart on the same bars; kernel results are checked against
+    pandas_ta once before timing.
+    """
+    results = {}
+    if ta is not None:
+        for name, error in indicator_kernels.validate(ta=ta).items():
+            print(f"Kernel {name}: max scaled error vs pandas_ta {error:.1e}")
+    for n_bars in sizes:
+        repeats = 1 if n_bars >= 1_000_000 else 3
+        for name, call in indicator_kernels.kernel_calls(n_bars).items():
+            results[f"kernel_{name}[{n_bars}]"] = _measure(call, repeats)
+        if ta is not None and n_bars <= pandas_ta_max_bars:
+            for name, call in indicator_kernels.reference_calls(n_bars, ta).items():
+                results[f"pandas_ta_{name}[{n_bars}]"] = _measure(call, repeats)
+    return results
+
+def benchmark_batched_indicators(symbol_counts=BENCHMARK_BATCH_SYMBOL_COUNTS, bars=200):
+    """
+    Indicators for N symbols on one timeframe: compute_indicators once per symbol versus one
+    IndicatorBatch, with every batched row checked against its single-symbol frame first.
+    """
+    results = {}
+    for count in symbol_counts:
+        frames = {f"S{i}": synthetic_frame(bars, seed=i) for i in range(count)}
+        batch = IndicatorBatch(frames, SCAN_COLUMNS)
+        for symbol in list(frames)[:20]:
+            pd.testing.assert_frame_equal(batch.frame(symbol), compute_indicators(frames[symbol], SCAN_COLUMNS))
+        results[f"indicators_per_symbol[{count}]"] = _measure(
+            lambda: [compute_indicators(df, SCAN_COLUMNS) for df in frames.values()], 1)
+        results[f"indicators_batched[{count}]"] = _measure(lambda: IndicatorBatch(frames, SCAN_COLUMNS).latest_positions())
+    return results
+
+def benchmark_scan_cycles(symbol_counts=BENCHMARK_SYMBOL_COUNTS, bars=200):
+    """
+    Full fetch -> indicators -> alignment scan cycles over N symbols against a frozen,
+    zero-latency mt5_simulator: 'cold' starts with empty caches, 'warm' is a repeat
+    cycle served by the bar caches and the indicator memo. run_bot's cycle is not
+    separable from its loop (scheduler waits, orders, Telegram), so the 1-symbol
+    WatchlistScanner cycle, which runs the same fetch/indicator/alignment code over
+    every timeframe, stands in for it. Needs the simulated broker (USE_SIMULATED_BROKER
+    where the MetaTrader5 package is installed); skipped otherwise.
+    """
+    if not getattr(mt5, "SIMULATED", False):
+        print("Scan-cycle benchmarks skipped: they run against mt5_simulator (set USE_SIMULATED_BROKER).")
+        return {}
+    mt5.configure(start=1791799200, speed=0) # A fixed Wednesday, so every run sees the same bars
+    mt5.initialize()
+    results = {}
+    try:
+        symbols = WATCHLIST[:max(symbol_counts)]
+        for symbol in symbols:
+            mt5.symbol_info(symbol) # Generate the synthetic history outside the timings
+        for count in symbol_counts:
+            scanner = WatchlistScanner(symbols[:count], workers=1)
+            try:
+                def cold_cycle():
+                    BAR_CACHES.clear()
+                    RESAMPLERS.clear()
+                    INDICATOR_MEMO.clear()
+                    scanner.scan(bars)
+                results[f"scan_cycle_cold[{count}]"] = _measure(cold_cycle, 1)
+                results[f"scan_cycle_warm[{count}]"] = _measure(lambda: scanner.scan(bars))
+            finally:
+                scanner.close()
+    finally:
+        mt5.shutdown()
+        BAR_CACHES.clear()
+        RESAMPLERS.clear()
+        INDICATOR_MEMO.clear()
+    return results
+
+def compare_benchmarks(results, baseline, threshold=BENCHMARK_REGRESSION_THRESHOLD, noise_floor_s=0.0005):
+    """Benchmarks whose median is more than `threshold` slower than the baseline (and above the noise floor)."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = result['median_s'] / previous['median_s'] if previous['median_s'] else math.inf
+        if ratio > 1 + threshold and result['median_s'] - previous['median_s'] > noise_floor_s:
+            regressions.append((name, previous['median_s'], result['median_s'], ratio))
+    return regressions
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, symbol_counts=BENCHMARK_SYMBOL_COUNTS, results_path=BENCHMARK_RESULTS_PATH,
+                   baseline_path=BENCHMARK_BASELINE_PATH, threshold=BENCHMARK_REGRESSION_THRESHOLD,
+                   batch_symbol_counts=BENCHMARK_BATCH_SYMBOL_COUNTS, n_ticks=BENCHMARK_TICKS):
+    """Runs the suite, writes results JSON, compares with the baseline and returns the regressions."""
+    results = benchmark_functions(sizes)
+    results.update(benchmark_indicators(sizes))
+    results.update(benchmark_batched_indicators(batch_symbol_counts))
+    results.update(benchmark_scan_cycles(symbol_counts))
+    results.update(benchmark_tick_builder(n_ticks))
+
+    print(f"{'benchmark':<40} {'median ms':>12} {'best ms':>12} {'runs':>6} {'peak MB':>9}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['median_s'] * 1000:>12.3f} {result['best_s'] * 1000:>12.3f} "
+              f"{result['repeats']:>6} {result['peak_mb']:>9.1f}")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'numpy': np.__version__, 'pandas': pd.__version__, 'cpus': os.cpu_count()},
+        'results': results
+    }
+    with open(results_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {results_path}")
+
+    regressions = []
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            regressions = compare_benchmarks(results, json.load(f)['results'], threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)")
+        print(f"{len(regressions)} regression(s) against {baseline_path} (threshold {threshold:.0%}).")
+    return regressions
 
 # --- Main Bot Logic ---
 # def run_bot():
@@ -771,11 +4442,13 @@ def monitor_and_exit_trades(open_positions, df_1h_indicators, df_4h_indicators):
 
 def run_bot():
     """Main function to run the trading bot."""
+    boot_started = time.perf_counter()
     if not initialize_mt5():
         return
+    mt5_ready = time.perf_counter()
 
     # Check if the symbol is available
-    symbol_info = mt5.symbol_info(SYMBOL)
+    symbol_info = get_symbol_info(SYMBOL)
     if symbol_info is None:
         print(f"{SYMBOL} not found, please check the symbol name.")
         send_telegram_message(f"Bot Alert: {SYMBOL} not found. Exiting.")
@@ -801,89 +4474,186 @@ def run_bot():
     print(f"Account: {account_info.login}, Balance: {account_info.balance:.2f} {account_info.currency}")
     send_telegram_message(f"Bot started! Account: {account_info.login}, Balance: {account_info.balance:.2f} {account_info.currency}")
 
+    if METRICS_ENABLED:
+        start_metrics_server()
+
+    scheduler = None
+    if USE_BAR_CLOSE_SCHEDULER:
+        # H1 closes wake the loop too so open positions keep an exit check per hour (not every 5 minutes as when polling)
+        scheduler = BarCloseScheduler({**TIMEFRAMES, "1H": mt5.TIMEFRAME_H1})
+    due = set(TIMEFRAMES) # Everything is evaluated on the first pass
+    checkpoint = load_checkpoint() if WARM_START else None
+    data_frames = checkpoint['data_frames'] if checkpoint else {}
+    RUN_STATE.update(data_frames=data_frames)
+    last_checkpoint = time.time()
+    first_evaluation = True
+
     # Main loop
     while True:
         print(f"\n--- Scanning at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
+        cycle_started = time.perf_counter()
 
         # Fetch data for all timeframes
-        data_frames = {}
+        if USE_LOCAL_RESAMPLING:
+            refresh_resampler(SYMBOL)
         for tf_name, tf_value in TIMEFRAMES.items():
+            if tf_name not in due:
+                continue # No bar closed since the last evaluation
             df = get_ohlc_data(SYMBOL, tf_value, bars=200)
             if not df.empty:
-                data_frames[tf_name] = calculate_indicators(df)
-                print(f"Fetched and calculated indicators for {tf_name}. Latest close: {data_frames[tf_name]['close'].iloc[-1]}")
+                frame = memoized_indicators(SYMBOL, tf_value, df, columns=SCAN_COLUMNS)
+                data_frames[tf_name] = closed_bars(frame) if scheduler is not None else frame
+                print(f"Fetched and calculated indicators for {tf_name}. Latest close: {frame['close'].iloc[-1]}")
             else:
                 print(f"Could not get data for {tf_name}. Skipping signal check.")
                 data_frames[tf_name] = pd.DataFrame()
 
+        if USE_BAR_CACHE:
+            stats = bar_cache_stats()
+            print(f"Bar cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+                  f"{stats['gaps']} gaps, {stats['rewrites']} rewrites, {stats['bars_fetched']} bars fetched")
+        if USE_INDICATOR_MEMO:
+            stats = INDICATOR_MEMO.stats()
+            print(f"Indicator memo: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+                  f"{stats['entries']} frames, {stats['bytes'] / 1024:.0f} KB, {stats['evictions']} evictions")
+
         df_dict = data_frames
-        df_4h = df_dict.get('4h', pd.DataFrame())
+        df_4h = df_dict.get('4H', pd.DataFrame())
 
-        # Check for trading signals
-        bullish_results, bullish_reasons = check_bullish_alignment(df_dict)
-        bearish_results, bearish_reasons = check_bearish_alignment(df_dict)
+        # Check for trading signals (both directions from one evaluation of the latest bars)
+        latest = latest_alignment(df_dict.items())
+        bullish_results, bullish_reasons = check_bullish_alignment(df_dict, latest)
+        bearish_results, bearish_reasons = check_bearish_alignment(df_dict, latest)
+        if first_evaluation:
+            first_evaluation = False
+            now = time.perf_counter()
+            print(f"First signal evaluation {now - boot_started:.2f}s after start ({'warm' if checkpoint else 'cold'} start; "
+                  f"MT5 init {mt5_ready - boot_started:.2f}s, data and indicators {now - mt5_ready:.2f}s)")
 
-        # Get current open positions
-        open_positions = mt5.positions_get(symbol=SYMBOL) or []
+        # One tick and positions snapshot shared by the signal and order code this cycle
+        snapshot = take_market_snapshot([SYMBOL])
+        open_positions = snapshot.symbol_positions(SYMBOL)
 
-        # ✅ Independent signal sending per timeframe
+        # ✅ Independent signal sending per timeframe, only when its signal state changes to fired
+        changed = []
         for tf in TIMEFRAMES.keys():
+            if tf not in due:
+                continue
+            bar_time = data_frames[tf].index[-1] if not data_frames[tf].empty else None
+            bullish_met, bearish_met = conditions_met(data_frames[tf], tf)
+            bullish_state = SIGNALS.update(SYMBOL, tf, "BUY", bullish_met, bar_time)
+            bearish_state = SIGNALS.update(SYMBOL, tf, "SELL", bearish_met, bar_time)
+            for direction, new_state, met in (("BUY", bullish_state, bullish_met), ("SELL", bearish_state, bearish_met)):
+                if new_state is not None:
+                    changed.append(tf)
+                    print(describe_transition(SYMBOL, tf, direction, new_state, met))
             # Bullish signal
-            if bullish_results.get(tf) and not open_positions:
+            if bullish_state == SIGNAL_FIRED: # Always reported; only the trade waits for a flat book
                 print(f"📈 Bullish signal detected on {tf} timeframe! Reason: {bullish_reasons.get(tf, 'N/A')}")
                 send_telegram_message(f"📈 Bullish signal detected for {SYMBOL} on {tf} timeframe! {bullish_reasons.get(tf, '')}")
 
-                if tf == '4h':
+                if tf == '4H':
                     pattern = detect_chart_patterns(df_4h)
                     if pattern and "Bullish" in pattern:
                         send_telegram_message(f"Chart pattern reinforcement: {pattern}")
-                    current_price = mt5.symbol_info_tick(SYMBOL).ask
-                    if not df_4h.empty:
-                        atr_value = df_4h['ATR'].iloc[-1]
-                        sl, tp = calculate_sl_tp(current_price, atr_value, "BUY")
-                        if sl and tp:
-                            open_trade(SYMBOL, "BUY", LOT_SIZE, sl, tp)
+                    if open_positions:
+                        print(f"Not opening a BUY: {len(open_positions)} position(s) already open.")
+                    elif not df_4h.empty:
+                        tick = market_tick(SYMBOL)
+                        if tick is None:
+                            print(f"No tick for {SYMBOL} - {mt5.last_error()}")
+                        else:
+                            atr_value = df_4h['ATR'].iloc[-1]
+                            sl, tp = calculate_sl_tp(tick.ask, atr_value, "BUY")
+                            if sl and tp:
+                                open_trade(SYMBOL, "BUY", LOT_SIZE, sl, tp)
 
             # Bearish signal
-            elif bearish_results.get(tf) and not open_positions:
+            elif bearish_state == SIGNAL_FIRED: # Always reported; only the trade waits for a flat book
                 print(f"📉 Bearish signal detected on {tf} timeframe! Reason: {bearish_reasons.get(tf, 'N/A')}")
                 send_telegram_message(f"📉 Bearish signal detected for {SYMBOL} on {tf} timeframe! {bearish_reasons.get(tf, '')}")
 
-                if tf == '4h':
+                if tf == '4H':
                     pattern = detect_chart_patterns(df_4h)
                     if pattern and "Bearish" in pattern:
                         send_telegram_message(f"Chart pattern reinforcement: {pattern}")
-                    current_price = mt5.symbol_info_tick(SYMBOL).bid
-                    if not df_4h.empty:
-                        atr_value = df_4h['ATR'].iloc[-1]
-                        sl, tp = calculate_sl_tp(current_price, atr_value, "SELL")
-                        if sl and tp:
-                            open_trade(SYMBOL, "SELL", LOT_SIZE, sl, tp)
+                    if open_positions:
+                        print(f"Not opening a SELL: {len(open_positions)} position(s) already open.")
+                    elif not df_4h.empty:
+                        tick = market_tick(SYMBOL)
+                        if tick is None:
+                            print(f"No tick for {SYMBOL} - {mt5.last_error()}")
+                        else:
+                            atr_value = df_4h['ATR'].iloc[-1]
+                            sl, tp = calculate_sl_tp(tick.bid, atr_value, "SELL")
+                            if sl and tp:
+                                open_trade(SYMBOL, "SELL", LOT_SIZE, sl, tp)
 
         # Monitor open positions
         if open_positions:
             print(f"Currently have {len(open_positions)} open position(s). Monitoring for exits.")
             df_1h_exit = get_ohlc_data(SYMBOL, mt5.TIMEFRAME_H1, bars=50)
-            monitor_and_exit_trades(open_positions, calculate_indicators(df_1h_exit.copy()), df_4h)
+            df_1h_exit_indicators = memoized_indicators(SYMBOL, mt5.TIMEFRAME_H1, df_1h_exit, columns=EXIT_COLUMNS)
+            if scheduler is not None:
+                df_1h_exit_indicators = closed_bars(df_1h_exit_indicators)
+            monitor_and_exit_trades(open_positions, df_1h_exit_indicators, df_4h)
+        elif not changed:
+            print(f"No signal state changes in this scan.")
         else:
-            print(f"No trading signals detected in this scan.")
-            # Print results in color instead of dumping the dict
+            # Print the condition results of the timeframes whose signal state changed
             print(f"{Fore.CYAN}Bullish Condition Check Results:{Style.RESET_ALL}")
-            for tf in bullish_reasons.keys():
+            for tf in dict.fromkeys(changed):
                 print(bullish_reasons[tf])
             print(f"{Fore.CYAN}Bearish Condition Check Results:{Style.RESET_ALL}")
-            for tf in bearish_reasons.keys():
+            for tf in dict.fromkeys(changed):
                 print(bearish_reasons[tf])
 
+        if METRICS_ENABLED:
+            METRICS.observe("bot_cycle_seconds", time.perf_counter() - cycle_started)
+            update_gauges(open_positions)
+            log_metrics()
+            print(f"Cycle {(time.perf_counter() - cycle_started) * 1000:.0f} ms; p95 by stage: {METRICS.stage_summary()}")
+
+        if WARM_START and time.time() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+            save_checkpoint()
+            last_checkpoint = time.time()
+
         # Wait before the next scan
-        time.sleep(300)
+        if scheduler is not None:
+            due = scheduler.wait()
+            jitter = scheduler.jitter_stats()
+            print(f"Bar close: {', '.join(sorted(due)) or 'none'} "
+                  f"(jitter {scheduler.jitter[-1] * 1000:.0f} ms, p95 {jitter['p95_ms']:.0f} ms)")
+        else:
+            time.sleep(300)
 
 
 # --- Run the Bot ---
 if __name__ == "__main__":
     try:
-        run_bot()
+        if WATCHLIST_MODE:
+            run_watchlist_scanner()
+        elif SHARDED_MODE and SHARD_FAILOVER_CHECK:
+            if check_shard_failover():
+                sys.exit(1)
+        elif SHARDED_MODE:
+            run_sharded_scanner()
+        elif TICK_STREAM_MODE:
+            run_tick_stream()
+        elif BENCHMARK_MODE:
+            if run_benchmarks():
+                sys.exit(1)
+        elif OPTIMIZER_MODE:
+            run_optimizer()
+        else:
+            run_bot()
     except KeyboardInterrupt:
         print("\nBot stopped by user.")
     finally:
+        if WARM_START:
+            save_checkpoint()
+        if _exit_pool is not None:
+            _exit_pool.shutdown(wait=True)
+        stop_telegram_dispatcher()
+        close_bar_stores()
         shutdown_mt5()
@@ -0,0 +1,537 @@
+"""
+NumPy kernels for the indicators the bot uses (EMA, SMA, RMA, MACD, PVO, PSAR, RSI,
+StochRSI, true range, ATR), plus *_rows variants that run them over a (series x bars)
+matrix for many symbols at once.
+
+Every kernel takes contiguous float64 arrays and writes into `out` when one is
+given (otherwise it allocates the result once), so no intermediate Series or
+DataFrames are built. Results follow pandas_ta 0.3.14b without TA-Lib, quirks
+included: EMAs are seeded with the SMA of the first `length` values, RMA is
+pandas' adjusted EWM, and PSAR reproduces its first-bar lookback. validate()
+diffs every kernel against pandas_ta when it is installed.
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+EPSILON = sys.float_info.epsilon
+
+def as_array(values):
+    """Contiguous float64 view (or copy, when the dtype or layout differs) of any array-like."""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+def _output(out, n):
+    if out is None:
+        return np.empty(n, dtype=np.float64)
+    if out.shape != (n,) or out.dtype != np.float64:
+        raise ValueError(f"Output buffer must be float64 of shape ({n},), got {out.dtype} {out.shape}")
+    return out
+
+def _first_valid(x):
+    valid = np.flatnonzero(~np.isnan(x))
+    return int(valid[0]) if len(valid) else len(x)
+
+def linear_recurrence(u, decay, initial=0.0, out=None):
+    """
+    out[i] = decay * out[i - 1] + u[i], with out[-1] taken as `initial`.
+    Solved in blocks short enough that decay**-block stays finite: within a block the
+    recurrence is a scaled cumulative sum, so the Python loop runs per block, not per bar.
+    """
+    n = len(u)
+    out = _output(out, n)
+    if n == 0:
+        return out
+    if decay == 0.0:
+        out[:] = u
+        return out
+    block = max(1, min(n, int(600.0 / -math.log(decay))))
+    powers = decay ** np.arange(block + 1, dtype=np.float64) # decay**0 .. decay**block
+    inverse = 1.0 / powers[:block]
+    carry = initial
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        size = stop - start
+        segment = out[start:stop]
+        np.multiply(u[start:stop], inverse[:size], out=segment)
+        np.cumsum(segment, out=segment)
+        segment *= powers[:size]
+        segment += carry * powers[1:size + 1]
+        carry = segment[-1]
+    return out
+
+def ema(close, length, out=None):
+    """pandas_ta ema: NaN for the first length-1 bars, the SMA at bar length-1, then alpha = 2/(length+1)."""
+    n = len(close)
+    out = _output(out, n)
+    out[:] = np.nan
+    start = _first_valid(close)
+    if n - start < length:
+        return out
+    seed_at = start + length - 1
+    alpha = 2.0 / (length + 1)
+    out[seed_at] = close[start:seed_at + 1].mean()
+    tail = out[seed_at + 1:]
+    np.multiply(close[seed_at + 1:], alpha, out=tail)
+    linear_recurrence(tail, 1.0 - alpha, out[seed_at], out=tail)
+    return out
+
+def rma(values, length, out=None):
+    """pandas_ta rma: ewm(alpha=1/length, adjust=True, min_periods=length).mean() from the first valid value."""
+    n = len(values)
+    out = _output(out, n)
+    out[:] = np.nan
+    start = _first_valid(values)
+    if n - start < length:
+        return out
+    decay = 1.0 - 1.0 / length
+    tail = out[start:]
+    linear_recurrence(values[start:], decay, out=tail) # Weighted sum of everything seen so far
+    weights = 1.0 - decay ** np.arange(1, n - start + 1, dtype=np.float64)
+    weights /= 1.0 - decay # Sum of those weights
+    tail /= weights
+    tail[:length - 1] = np.nan
+    return out
+
+def _windows(values, length):
+    return np.lib.stride_tricks.sliding_window_view(values, length)
+
+def sma(values, length, out=None):
+    """Rolling mean, NaN until a window holds `length` valid values."""
+    n = len(values)
+    out = _output(out, n)
+    out[:length - 1] = np.nan
+    if n >= length:
+        np.mean(_windows(values, length), axis=-1, out=out[length - 1:])
+    return out
+
+def rolling_min(values, length, out=None):
+    n = len(values)
+    out = _output(out, n)
+    out[:length - 1] = np.nan
+    if n >= length:
+        np.min(_windows(values, length), axis=-1, out=out[length - 1:])
+    return out
+
+def rolling_max(values, length, out=None):
+    n = len(values)
+    out = _output(out, n)
+    out[:length - 1] = np.nan
+    if n >= length:
+        np.max(_windows(values, length), axis=-1, out=out[length - 1:])
+    return out
+
+def non_zero_range(high, low, out=None):
+    """high - low, nudged by machine epsilon everywhere when any bar has a zero range (as pandas_ta does)."""
+    out = np.subtract(high, low, out=_output(out, len(high)))
+    if (out == 0).any():
+        out += EPSILON
+    return out
+
+def macd(close, fast=12, slow=26, signal=9, out=None):
+    """(MACD line, histogram, signal line), the column order of pandas_ta macd. `out` is a tuple of three buffers."""
+    n = len(close)
+    line, histogram, signal_line = out if out is not None else (None, None, None)
+    line = ema(close, fast, out=line)
+    line -= ema(close, slow)
+    signal_line = _output(signal_line, n)
+    signal_line[:] = np.nan
+    start = _first_valid(line)
+    ema(line[start:], signal, out=signal_line[start:])
+    histogram = np.subtract(line, signal_line, out=_output(histogram, n))
+    return line, histogram, signal_line
+
+def pvo(volume, fast=12, slow=26, out=None):
+    """Percentage volume oscillator line: 100 * (EMA fast - EMA slow) / EMA slow."""
+    slow_ema = ema(volume, slow)
+    out = ema(volume, fast, out=out)
+    out -= slow_ema
+    out *= 100.0
+    out /= slow_ema
+    return out
+
+def psar(high, low, close=None, af0=0.02, af=0.02, max_af=0.2, out=None):
+    """
+    Parabolic SAR as (long, short): the SAR under price while rising, over it while falling,
+    NaN otherwise. Path dependent, so this is one pass over plain floats. As in pandas_ta, the
+    first trend starts at `af`, each new extreme adds `af0` and a reversal restarts at `af0`.
+    """
+    n = len(high)
+    long_, short = out if out is not None else (None, None)
+    long_, short = _output(long_, n), _output(short, n)
+    long_[:] = np.nan
+    short[:] = np.nan
+    if n < 2:
+        return long_, short
+    highs, lows = high.tolist(), low.tolist()
+    up, down = highs[1] - highs[0], lows[0] - lows[1]
+    falling = down > up and down > 0
+    sar, ep = (highs[0], lows[0]) if falling else (lows[0], highs[0])
+    if close is not None:
+        sar = float(close[0])
+    long_values, short_values = long_.tolist(), short.tolist()
+    for row in range(1, n):
+        bar_high, bar_low = highs[row], lows[row]
+        # row - 2 is -1 on the second bar: pandas_ta reads the last bar there, and so does this
+        if falling:
+            candidate = sar + af * (ep - sar)
+            reverse = bar_high > candidate
+            if bar_low < ep:
+                ep = bar_low
+                af = min(af + af0, max_af)
+            candidate = max(highs[row - 1], highs[row - 2], candidate)
+        else:
+            candidate = sar + af * (ep - sar)
+            reverse = bar_low < candidate
+            if bar_high > ep:
+                ep = bar_high
+                af = min(af + af0, max_af)
+            candidate = min(lows[row - 1], lows[row - 2], candidate)
+        if reverse:
+            candidate = ep
+            af = af0
+            falling = not falling
+            ep = bar_low if falling else bar_high
+        sar = candidate
+        if falling:
+            short_values[row] = sar
+        else:
+            long_values[row] = sar
+    long_[:] = long_values
+    short[:] = short_values
+    return long_, short
+
+def rsi(close, length=14, out=None):
+    """RSI from RMA-smoothed gains and losses."""
+    n = len(close)
+    out = _output(out, n)
+    change = np.empty(n, dtype=np.float64)
+    change[0] = np.nan
+    np.subtract(close[1:], close[:-1], out=change[1:])
+    gains = rma(np.maximum(change, 0.0), length) # NaN on the first bar survives maximum/minimum
+    losses = rma(np.minimum(change, 0.0), length)
+    np.abs(losses, out=losses)
+    losses += gains
+    np.multiply(gains, 100.0, out=out)
+    out /= losses
+    return out
+
+def stochrsi_from_rsi(rsi_values, length=14, k=3, d=3, out=None):
+    """(%K, %D) of the stochastic of an RSI series, i.e. pandas_ta stochrsi without its own RSI pass."""
+    n = len(rsi_values)
+    stoch_k, stoch_d = out if out is not None else (None, None)
+    lowest = rolling_min(rsi_values, length)
+    spread = non_zero_range(rolling_max(rsi_values, length), lowest)
+    stoch = np.subtract(rsi_values, lowest, out=lowest)
+    stoch *= 100.0
+    stoch /= spread
+    stoch_k = sma(stoch, k, out=_output(stoch_k, n))
+    stoch_d = sma(stoch_k, d, out=_output(stoch_d, n))
+    return stoch_k, stoch_d
+
+def stochrsi(close, length=14, rsi_length=14, k=3, d=3, out=None):
+    return stochrsi_from_rsi(rsi(close, rsi_length), length, k, d, out=out)
+
+def true_range(high, low, close, out=None):
+    """max(|high - low|, |high - previous close|, |previous close - low|); NaN on the first bar."""
+    n = len(high)
+    out = non_zero_range(high, low, out=out)
+    np.abs(out, out=out)
+    if n:
+        out[0] = np.nan
+        previous = close[:-1]
+        np.maximum(out[1:], np.abs(high[1:] - previous), out=out[1:])
+        np.maximum(out[1:], np.abs(previous - low[1:]), out=out[1:])
+    return out
+
+def atr(high, low, close, length=14, out=None):
+    """RMA of the true range."""
+    return rma(true_range(high, low, close), length, out=out)
+
+# --- Batched kernels ---
+# The kernels above over a (series x bars) matrix, one series per row. Shorter series
+# are NaN-padded at the front, so every row ends on its latest bar. Rows whose values
+# start on the same bar share every NumPy call, and each row goes through exactly the
+# arithmetic of the 1D kernel, so a row's result is bit-for-bit the single-series one.
+def as_matrix(values):
+    """Contiguous float64 (series x bars) view (or copy) of any 2D array-like."""
+    matrix = np.ascontiguousarray(values, dtype=np.float64)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a (series x bars) matrix, got {matrix.ndim} dimension(s)")
+    return matrix
+
+def _output_rows(out, shape):
+    if out is None:
+        return np.empty(shape, dtype=np.float64)
+    if out.shape != shape or out.dtype != np.float64:
+        raise ValueError(f"Output buffer must be float64 of shape {shape}, got {out.dtype} {out.shape}")
+    return out
+
+def _row_groups(x):
+    """(first valid bar, row selector) for each set of rows whose values start on the same bar."""
+    if x.shape[1] == 0:
+        return [(0, slice(None))]
+    valid = ~np.isnan(x)
+    starts = np.where(valid.any(axis=1), valid.argmax(axis=1), x.shape[1])
+    firsts = np.unique(starts)
+    if len(firsts) <= 1:
+        return [(int(firsts[0]) if len(firsts) else 0, slice(None))]
+    return [(int(first), np.flatnonzero(starts == first)) for first in firsts]
+
+def _by_start(kernel, x, out, *args):
+    """NaN-fills `out` and runs kernel(rows of x, rows of out, start, *args) once per start group."""
+    out[:] = np.nan
+    for start, rows in _row_groups(x):
+        if isinstance(rows, slice):
+            kernel(x, out, start, *args)
+        else:
+            target = out[rows]
+            kernel(x[rows], target, start, *args)
+            out[rows] = target
+    return out
+
+def linear_recurrence_rows(u, decay, initial=0.0, out=None):
+    """linear_recurrence along every row; `initial` is a scalar or one value per row."""
+    rows, n = u.shape
+    out = _output_rows(out, u.shape)
+    if n == 0:
+        return out
+    if decay == 0.0:
+        out[:] = u
+        return out
+    block = max(1, min(n, int(600.0 / -math.log(decay))))
+    powers = decay ** np.arange(block + 1, dtype=np.float64)
+    inverse = 1.0 / powers[:block]
+    carry = np.broadcast_to(np.asarray(initial, dtype=np.float64), (rows,))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        size = stop - start
+        segment = out[:, start:stop]
+        np.multiply(u[:, start:stop], inverse[:size], out=segment)
+        np.cumsum(segment, axis=1, out=segment)
+        segment *= powers[:size]
+        segment += carry[:, None] * powers[1:size + 1]
+        carry = segment[:, -1]
+    return out
+
+def _ema_from(close, out, start, length):
+    n = close.shape[1]
+    if n - start < length:
+        return
+    seed_at = start + length - 1
+    alpha = 2.0 / (length + 1)
+    out[:, seed_at] = close[:, start:seed_at + 1].mean(axis=1)
+    tail = out[:, seed_at + 1:]
+    np.multiply(close[:, seed_at + 1:], alpha, out=tail)
+    linear_recurrence_rows(tail, 1.0 - alpha, out[:, seed_at], out=tail)
+
+def ema_rows(close, length, out=None):
+    return _by_start(_ema_from, close, _output_rows(out, close.shape), length)
+
+def _rma_from(values, out, start, length):
+    n = values.shape[1]
+    if n - start < length:
+        return
+    decay = 1.0 - 1.0 / length
+    tail = out[:, start:]
+    linear_recurrence_rows(values[:, start:], decay, out=tail)
+    weights = 1.0 - decay ** np.arange(1, n - start + 1, dtype=np.float64)
+    weights /= 1.0 - decay
+    tail /= weights
+    tail[:, :length - 1] = np.nan
+
+def rma_rows(values, length, out=None):
+    return _by_start(_rma_from, values, _output_rows(out, values.shape), length)
+
+def _rolling_rows(reduce, values, length, out):
+    out = _output_rows(out, values.shape)
+    out[:, :length - 1] = np.nan
+    if values.shape[1] >= length:
+        reduce(np.lib.stride_tricks.sliding_window_view(values, length, axis=1), axis=-1, out=out[:, length - 1:])
+    return out
+
+def sma_rows(values, length, out=None):
+    return _rolling_rows(np.mean, values, length, out)
+
+def rolling_min_rows(values, length, out=None):
+    return _rolling_rows(np.min, values, length, out)
+
+def rolling_max_rows(values, length, out=None):
+    return _rolling_rows(np.max, values, length, out)
+
+def non_zero_range_rows(high, low, out=None):
+    """non_zero_range per row: only rows with a zero-range bar are nudged."""
+    out = np.subtract(high, low, out=_output_rows(out, high.shape))
+    zero = (out == 0).any(axis=1)
+    if zero.any():
+        out[zero] += EPSILON
+    return out
+
+def macd_rows(close, fast=12, slow=26, signal=9, out=None):
+    shape = close.shape
+    line, histogram, signal_line = out if out is not None else (None, None, None)
+    line = ema_rows(close, fast, out=line)
+    line -= ema_rows(close, slow)
+    signal_line = _output_rows(signal_line, shape)
+    signal_line[:] = np.nan
+    for start, rows in _row_groups(line):
+        if isinstance(rows, slice):
+            ema_rows(line[:, start:], signal, out=signal_line[:, start:])
+        else:
+            signal_line[rows, start:] = ema_rows(line[rows, start:], signal)
+    histogram = np.subtract(line, signal_line, out=_output_rows(histogram, shape))
+    return line, histogram, signal_line
+
+def pvo_rows(volume, fast=12, slow=26, out=None):
+    slow_ema = ema_rows(volume, slow)
+    out = ema_rows(volume, fast, out=out)
+    out -= slow_ema
+    out *= 100.0
+    out /= slow_ema
+    return out
+
+def psar_rows(high, low, close=None, af0=0.02, af=0.02, max_af=0.2, out=None):
+    """psar per row from each row's first valid bar; the SAR is path dependent, so this loops over rows."""
+    shape = high.shape
+    long_, short = out if out is not None else (None, None)
+    long_, short = _output_rows(long_, shape), _output_rows(short, shape)
+    long_[:] = np.nan
+    short[:] = np.nan
+    for row in range(shape[0]):
+        start = _first_valid(high[row])
+        psar(high[row, start:], low[row, start:], None if close is None else close[row, start:], af0, af, max_af,
+             out=(long_[row, start:], short[row, start:]))
+    return long_, short
+
+def rsi_rows(close, length=14, out=None):
+    out = _output_rows(out, close.shape)
+    change = np.empty(close.shape, dtype=np.float64)
+    change[:, 0] = np.nan
+    np.subtract(close[:, 1:], close[:, :-1], out=change[:, 1:])
+    gains = rma_rows(np.maximum(change, 0.0), length)
+    losses = rma_rows(np.minimum(change, 0.0), length)
+    np.abs(losses, out=losses)
+    losses += gains
+    np.multiply(gains, 100.0, out=out)
+    out /= losses
+    return out
+
+def stochrsi_from_rsi_rows(rsi_values, length=14, k=3, d=3, out=None):
+    shape = rsi_values.shape
+    stoch_k, stoch_d = out if out is not None else (None, None)
+    lowest = rolling_min_rows(rsi_values, length)
+    spread = non_zero_range_rows(rolling_max_rows(rsi_values, length), lowest)
+    stoch = np.subtract(rsi_values, lowest, out=lowest)
+    stoch *= 100.0
+    stoch /= spread
+    stoch_k = sma_rows(stoch, k, out=_output_rows(stoch_k, shape))
+    stoch_d = sma_rows(stoch_k, d, out=_output_rows(stoch_d, shape))
+    return stoch_k, stoch_d
+
+def true_range_rows(high, low, close, out=None):
+    out = non_zero_range_rows(high, low, out=out)
+    np.abs(out, out=out)
+    if high.shape[1]:
+        out[:, 0] = np.nan
+        previous = close[:, :-1]
+        np.maximum(out[:, 1:], np.abs(high[:, 1:] - previous), out=out[:, 1:])
+        np.maximum(out[:, 1:], np.abs(previous - low[:, 1:]), out=out[:, 1:])
+    return out
+
+def atr_rows(high, low, close, length=14, out=None):
+    return rma_rows(true_range_rows(high, low, close), length, out=out)
+
+# --- Validation against pandas_ta ---
+def _sample_bars(n_bars, seed):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0005, n_bars))
+    high = close + np.abs(rng.normal(0, 0.0003, n_bars))
+    low = close - np.abs(rng.normal(0, 0.0003, n_bars))
+    volume = rng.integers(50, 5000, n_bars).astype(np.float64)
+    return high, low, close, volume
+
+def _max_error(expected, actual):
+    """Largest difference relative to the series scale; inf when the NaN patterns differ."""
+    expected, actual = as_array(expected), as_array(actual)
+    if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+        return float('inf')
+    valid = ~np.isnan(expected)
+    if not valid.any():
+        return 0.0
+    scale = max(1.0, float(np.abs(expected[valid]).max()))
+    return float(np.abs(expected[valid] - actual[valid]).max() / scale)
+
+def validate(n_bars=5000, seed=0, tolerance=1e-9, ta=None):
+    """
+    Diffs every kernel against pandas_ta on a random walk and returns
+    {indicator: max scaled error}; raises AssertionError past `tolerance`.
+    """
+    import pandas as pd
+    if ta is None:
+        import pandas_ta as ta
+    high, low, close, volume = _sample_bars(n_bars, seed)
+    h, l, c, v = (pd.Series(values) for values in (high, low, close, volume))
+    reference_macd = ta.macd(c, fast=12, slow=26, signal=9)
+    reference_psar = ta.psar(h, l, c, af0=0.02, max_af=0.2)
+    # A start af other than af0 only shows while the first trend lasts, so that case runs on drifting bars
+    drift = np.arange(n_bars) * 0.002
+    reference_psar_af = ta.psar(h + drift, l + drift, c + drift, af0=0.01, af=0.03, max_af=0.2)
+    reference_stochrsi = ta.stochrsi(c, length=14, rsi_length=14, k=3, d=3)
+    kernel_macd = macd(close, 12, 26, 9)
+    kernel_psar = psar(high, low, close, 0.02, 0.02, 0.2)
+    kernel_psar_af = psar(high + drift, low + drift, close + drift, af0=0.01, af=0.03, max_af=0.2)
+    kernel_stochrsi = stochrsi(close, 14, 14, 3, 3)
+    errors = {
+        'ema': _max_error(ta.ema(c, length=20), ema(close, 20)),
+        'sma': _max_error(ta.sma(c, length=20), sma(close, 20)),
+        'rma': _max_error(ta.rma(c, length=14), rma(close, 14)),
+        'macd': max(_max_error(reference_macd.iloc[:, i], kernel_macd[i]) for i in range(3)),
+        'pvo': _max_error(ta.pvo(v).iloc[:, 0], pvo(volume)),
+        'psar': max(_max_error(reference.iloc[:, i], kernel[i]) for reference, kernel in
+                    ((reference_psar, kernel_psar), (reference_psar_af, kernel_psar_af)) for i in range(2)),
+        'rsi': _max_error(ta.rsi(c, length=14), rsi(close, 14)),
+        'stochrsi': max(_max_error(reference_stochrsi.iloc[:, i], kernel_stochrsi[i]) for i in range(2)),
+        'true_range': _max_error(ta.true_range(h, l, c), true_range(high, low, close)),
+        'atr': _max_error(ta.atr(h, l, c, length=14), atr(high, low, close, 14)),
+    }
+    failed = {name: error for name, error in errors.items() if error > tolerance}
+    assert not failed, f"Kernels disagree with pandas_ta beyond {tolerance}: {failed}"
+    return errors
+
+def kernel_calls(n_bars, seed=0):
+    """{indicator: zero-argument call} over random bars with preallocated outputs, for benchmarks."""
+    high, low, close, volume = _sample_bars(n_bars, seed)
+    buffers = [np.empty(n_bars) for _ in range(3)]
+    return {
+        'ema': lambda: ema(close, 20, out=buffers[0]),
+        'macd': lambda: macd(close, 12, 26, 9, out=tuple(buffers)),
+        'pvo': lambda: pvo(volume, out=buffers[0]),
+        'psar': lambda: psar(high, low, close, 0.02, 0.02, 0.2, out=tuple(buffers[:2])),
+        'rsi': lambda: rsi(close, 14, out=buffers[0]),
+        'stochrsi': lambda: stochrsi(close, 14, 14, 3, 3, out=tuple(buffers[:2])),
+        'atr': lambda: atr(high, low, close, 14, out=buffers[0]),
+    }
+
+def reference_calls(n_bars, ta, seed=0):
+    """The pandas_ta counterparts of kernel_calls on the same bars."""
+    import pandas as pd
+    high, low, close, volume = (pd.Series(values) for values in _sample_bars(n_bars, seed))
+    return {
+        'ema': lambda: ta.ema(close, length=20),
+        'macd': lambda: ta.macd(close, fast=12, slow=26, signal=9),
+        'pvo': lambda: ta.pvo(volume),
+        'psar': lambda: ta.psar(high, low, close, af0=0.02, max_af=0.2),
+        'rsi': lambda: ta.rsi(close, length=14),
+        'stochrsi': lambda: ta.stochrsi(close, length=14, rsi_length=14, k=3, d=3),
+        'atr': lambda: ta.atr(high, low, close, length=14),
+    }
+
+if __name__ == "__main__":
+    for name, error in validate().items():
+        print(f"{name:<12} max scaled error {error:.2e}")
+    for n_bars in (200, 10_000, 1_000_000):
+        for name, call in kernel_calls(n_bars).items():
+            started = time.perf_counter()
+            call()
+            print(f"{name:<12} {n_bars:>9} bars {(time.perf_counter() - started) * 1000:10.3f} ms")
@@ -0,0 +1,693 @@
+"""
+Simulated stand-in for the MetaTrader5 package.
+
+Implements the subset of the MT5 API the bot uses (initialize, account_info,
+symbol_info, symbol_info_tick, copy_rates_from_pos, copy_rates_from,
+copy_ticks_from, positions_get, order_send, last_error, ...) on top of recorded
+MT5 rates or a synthetic random walk, with injectable latency, requotes,
+partial fills and retcodes. `import mt5_simulator as mt5` is enough to run the
+bot without a terminal; f0rtun3TraderBot.py does that by itself when the
+MetaTrader5 package is missing or USE_SIMULATED_BROKER is set.
+"""
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+
+import numpy as np
+
+SIMULATED = True # Lets callers tell this module apart from the real MetaTrader5 package
+
+# --- Constants (same values as the MetaTrader5 package) ---
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_H6 = 16390
+TIMEFRAME_H12 = 16396
+TIMEFRAME_D1 = 16408
+TIMEFRAME_W1 = 32769
+TIMEFRAME_MN1 = 49153
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+TRADE_ACTION_DEAL = 1
+ORDER_TIME_GTC = 0
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+SYMBOL_FILLING_FOK = 1 # symbol_info().filling_mode flags
+SYMBOL_FILLING_IOC = 2
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_ERROR = 10011
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_CONNECTION = 10031
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+RES_S_OK = (1, 'Success')
+RES_E_INVALID_PARAMS = (-2, 'Invalid params')
+RES_E_NOT_FOUND = (-4, 'Not found')
+RES_E_NO_IPC = (-10004, 'No IPC connection')
+
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60, TIMEFRAME_M5: 300, TIMEFRAME_M15: 900, TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600, TIMEFRAME_H4: 14400, TIMEFRAME_H6: 21600, TIMEFRAME_H12: 43200,
+    TIMEFRAME_D1: 86400, TIMEFRAME_W1: 604800, TIMEFRAME_MN1: 2678400 # MN1: upper bound (31 days)
+}
+WEEK_ANCHOR = 3 * 86400 # 1970-01-04, a Sunday: MT5 weekly bars open on Sunday
+
+RATES_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                        ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+TICKS_DTYPE = np.dtype([('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                        ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+
+# --- Result Types ---
+AccountInfo = namedtuple('AccountInfo', 'login balance equity profit margin margin_free leverage currency server trade_mode')
+SymbolInfo = namedtuple('SymbolInfo', 'name visible select point digits spread trade_contract_size volume_min '
+                                      'volume_max volume_step filling_mode trade_tick_size trade_tick_value '
+                                      'trade_stops_level bid ask currency_profit')
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+TradePosition = namedtuple('TradePosition', 'ticket time time_msc time_update time_update_msc type magic identifier '
+                                            'reason volume price_open sl tp price_current swap profit symbol comment external_id')
+OrderCheckResult = namedtuple('OrderCheckResult', 'retcode balance equity profit margin margin_free margin_level '
+                                                  'comment request')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment request_id '
+                                                'retcode_external request')
+
+# --- Synthetic Data ---
+def bucket_start(times, timeframe):
+    """Open time of the bar of `timeframe` containing each time (MT5 server epoch seconds)."""
+    times = np.asarray(times, dtype=np.int64)
+    if timeframe == TIMEFRAME_MN1:
+        return times.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+    if timeframe == TIMEFRAME_W1:
+        return times - (times - WEEK_ANCHOR) % TIMEFRAME_SECONDS[TIMEFRAME_W1]
+    return times - times % TIMEFRAME_SECONDS[timeframe]
+
+def synthetic_rates(start, end, step=300, seed=0, price=1.1, volatility=0.0004, spread=10, skip_weekends=True):
+    """Random-walk bars of `step` seconds covering [start, end), weekends left out like a forex feed."""
+    times = np.arange(start - start % step, end, step, dtype=np.int64)
+    if skip_weekends:
+        times = times[(times // 86400 + 3) % 7 < 5] # 0 = Monday
+    rng = np.random.default_rng(seed)
+    n = len(times)
+    scale = volatility * np.sqrt(step / 3600) * price # Per-bar stdev from the hourly volatility
+    close = price + np.cumsum(rng.normal(0, scale, n))
+    close = np.maximum(close, price * 0.05)
+    open_ = np.concatenate([[price], close[:-1]])
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates['time'] = times
+    rates['open'] = open_
+    rates['close'] = close
+    rates['high'] = np.maximum(open_, close) + rng.exponential(scale / 2, n)
+    rates['low'] = np.minimum(open_, close) - rng.exponential(scale / 2, n)
+    rates['tick_volume'] = rng.integers(20, 20 * max(step // 60, 1), n)
+    rates['spread'] = spread
+    return rates
+
+def aggregate_rates(rates, timeframe):
+    """Rolls base bars up into `timeframe` bars (the last one possibly still forming)."""
+    if len(rates) == 0:
+        return rates[:0]
+    buckets = bucket_start(rates['time'], timeframe)
+    starts = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+    ends = np.concatenate([starts[1:], [len(rates)]]) - 1
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out['time'] = buckets[starts]
+    out['open'] = rates['open'][starts]
+    out['close'] = rates['close'][ends]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['tick_volume'] = np.add.reduceat(rates['tick_volume'], starts)
+    out['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    out['real_volume'] = np.add.reduceat(rates['real_volume'], starts)
+    return out
+
+class _Market:
+    """Price history and contract specification of one simulated symbol."""
+
+    def __init__(self, name, rates, step, point, digits, contract_size, filling_mode, volume_min, volume_max,
+                 volume_step, synthetic_seed=None):
+        self.name = name
+        self.rates = np.ascontiguousarray(rates, dtype=RATES_DTYPE)
+        self.step = step
+        self.point = point
+        self.digits = digits
+        self.contract_size = contract_size
+        self.filling_mode = filling_mode
+        self.volume_min = volume_min
+        self.volume_max = volume_max
+        self.volume_step = volume_step
+        self.synthetic_seed = synthetic_seed # Synthetic feeds grow on demand, recorded ones end
+        self.visible = True
+
+    def extend(self, until):
+        """Appends synthetic bars up to `until` so a real-time clock never runs off the end."""
+        if self.synthetic_seed is None or len(self.rates) == 0 or self.rates['time'][-1] + self.step > until:
+            return
+        last = self.rates[-1]
+        start = int(last['time']) + self.step
+        seed = self.synthetic_seed + start # Deterministic per extension point
+        more = synthetic_rates(start, int(until) + 7 * 86400, self.step, seed, float(last['close']),
+                               spread=int(last['spread']))
+        if len(more):
+            more['open'][0] = last['close']
+            more['high'][0] = max(more['high'][0], last['close'])
+            more['low'][0] = min(more['low'][0], last['close'])
+            self.rates = np.concatenate([self.rates, more])
+
+    def quotes(self, times):
+        """
+        Bid at each time, walking every base bar open -> low -> high -> close (bullish)
+        or open -> high -> low -> close (bearish) in equal thirds of the bar. Also returns
+        the bar indices and the running high/low reached by then, for forming bars.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        bars = np.searchsorted(self.rates['time'], times, side='right') - 1
+        valid = bars >= 0
+        bars = np.maximum(bars, 0)
+        r = self.rates[bars]
+        bullish = r['close'] >= r['open']
+        path = np.stack([r['open'], np.where(bullish, r['low'], r['high']),
+                         np.where(bullish, r['high'], r['low']), r['close']], axis=1)
+        fraction = np.clip((times - r['time']) / self.step, 0.0, 1.0)
+        position = fraction * 3
+        leg = np.minimum(position.astype(np.int64), 2)
+        rows = np.arange(len(times))
+        bid = path[rows, leg] + (path[rows, leg + 1] - path[rows, leg]) * (position - leg)
+        reached = np.where(np.arange(4) <= leg[:, None], path, np.nan)
+        high = np.maximum(np.nanmax(reached, axis=1), bid)
+        low = np.minimum(np.nanmin(reached, axis=1), bid)
+        return np.where(valid, bid, np.nan), bars, fraction, high, low
+
+# --- Broker ---
+class SimulatedBroker:
+    """
+    One simulated terminal + trade server. The clock runs in MT5 server time:
+    `start` + elapsed wall time * `speed` + whatever advance() added (speed=0
+    freezes it so tests can step it explicitly).
+
+    Fault injection, per order_send unless noted:
+    - latency_ms / order_latency_ms (+ latency_jitter_ms): sleep inside each API call
+    - requote_rate: probability of TRADE_RETCODE_REQUOTE with fresh prices
+      (a request price further than `deviation` points from the market always requotes)
+    - partial_fill_rate: probability only part of the volume is available
+      (IOC/RETURN fill it with DONE_PARTIAL, FOK is rejected)
+    - error_rates: {retcode: probability} of failing with that retcode
+    - scripted_retcodes: queue of retcodes returned by the next sends (DONE = proceed normally)
+    """
+
+    def __init__(self, start=None, speed=1.0, seed=0, latency_ms=0.0, order_latency_ms=None, latency_jitter_ms=0.0,
+                 requote_rate=0.0, partial_fill_rate=0.0, error_rates=None, tick_interval_ms=500,
+                 auto_symbols=True, synthetic_step=300, synthetic_history_days=1500, balance=10000.0,
+                 currency="USD", leverage=100):
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.start = int(time.time()) if start is None else start
+        self.speed = speed
+        self.offset = 0.0
+        self.started = time.perf_counter()
+        self.latency_ms = latency_ms
+        self.order_latency_ms = latency_ms if order_latency_ms is None else order_latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.requote_rate = requote_rate
+        self.partial_fill_rate = partial_fill_rate
+        self.error_rates = dict(error_rates or {})
+        self.scripted_retcodes = deque()
+        self.tick_interval_ms = tick_interval_ms
+        self.auto_symbols = auto_symbols
+        self.synthetic_step = synthetic_step
+        self.synthetic_history_days = synthetic_history_days
+        self.balance = balance
+        self.currency = currency
+        self.leverage = leverage
+        self.markets = {}
+        self.positions = {} # ticket -> dict of TradePosition fields
+        self.next_ticket = 100000
+        self.connected = False
+        self.error = RES_S_OK
+        self.lock = threading.RLock()
+        self.calls = {} # API name -> [count, injected latency seconds]
+        self.deals = [] # (time, ticket, symbol, type, volume, price, requested price, retcode)
+
+    # Clock and bookkeeping
+    def now(self):
+        return self.start + (time.perf_counter() - self.started) * self.speed + self.offset
+
+    def advance(self, seconds):
+        """Moves the simulated clock forward (on top of its real-time drift)."""
+        self.offset += seconds
+        self._settle()
+
+    def _call(self, name, latency_ms=None):
+        latency_ms = self.latency_ms if latency_ms is None else latency_ms
+        delay = 0.0
+        if latency_ms or self.latency_jitter_ms:
+            with self.lock:
+                delay = max(0.0, self.rng.normal(latency_ms, self.latency_jitter_ms)) / 1000
+            time.sleep(delay)
+        with self.lock:
+            stats = self.calls.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += delay
+            if not self.connected:
+                self.error = RES_E_NO_IPC
+                return False
+            self.error = RES_S_OK
+        return True
+
+    def stats(self):
+        """Calls and injected latency per API function."""
+        with self.lock:
+            return {name: {'calls': count, 'latency_ms': delay * 1000, 'mean_ms': delay * 1000 / count}
+                    for name, (count, delay) in self.calls.items()}
+
+    # Symbols
+    def add_symbol(self, symbol, rates, point=0.00001, digits=5, contract_size=100000,
+                   filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC, volume_min=0.01, volume_max=100.0,
+                   volume_step=0.01, step=None):
+        """Registers recorded MT5 rates (e.g. copy_rates_* output or a BarStoreReader.rates()) for `symbol`."""
+        rates = np.asarray(rates)
+        if step is None:
+            step = int(np.median(np.diff(rates['time']))) if len(rates) > 1 else 60
+        with self.lock:
+            self.markets[symbol] = _Market(symbol, rates, step, point, digits, contract_size, filling_mode,
+                                           volume_min, volume_max, volume_step)
+        return self.markets[symbol]
+
+    def _market(self, symbol):
+        market = self.markets.get(symbol)
+        if market is None and self.auto_symbols:
+            seed = zlib.crc32(symbol.encode()) + self.seed
+            jpy = symbol.endswith("JPY")
+            price = 150.0 if jpy else 1.0 + (seed % 1000) / 1000
+            now = int(self.now())
+            rates = synthetic_rates(now - self.synthetic_history_days * 86400, now + 7 * 86400, self.synthetic_step,
+                                    seed, price, spread=12)
+            market = self.markets[symbol] = _Market(symbol, rates, self.synthetic_step, 0.001 if jpy else 0.00001,
+                                                    3 if jpy else 5, 100000,
+                                                    SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC, 0.01, 100.0, 0.01,
+                                                    synthetic_seed=seed)
+        if market is None:
+            self.error = RES_E_NOT_FOUND
+            return None
+        market.extend(self.now())
+        return market
+
+    def _tick(self, market, clock):
+        bid, bars, _, _, _ = market.quotes([clock])
+        if np.isnan(bid[0]):
+            return None
+        bid = round(float(bid[0]), market.digits)
+        ask = round(bid + int(market.rates['spread'][bars[0]]) * market.point, market.digits)
+        time_msc = int(min(clock, market.rates['time'][bars[0]] + market.step - 0.001) * 1000) # Last tick before a gap
+        return Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, 6, 0.0)
+
+    def _market_open(self, market, clock):
+        """False once the clock is past the last bar of a recorded feed or inside a gap (weekend)."""
+        index = np.searchsorted(market.rates['time'], clock, side='right') - 1
+        return index >= 0 and clock < market.rates['time'][index] + market.step
+
+    # Account and positions
+    def _position_tuple(self, fields, tick):
+        price_current = tick.bid if fields['type'] == POSITION_TYPE_BUY else tick.ask
+        return TradePosition(price_current=price_current, profit=self._profit(fields, price_current), **fields)
+
+    def _profit(self, fields, price):
+        market = self.markets[fields['symbol']]
+        sign = 1 if fields['type'] == POSITION_TYPE_BUY else -1
+        return round(float(sign * (price - fields['price_open']) * fields['volume'] * market.contract_size), 2)
+
+    def _settle(self):
+        """Closes positions whose stop loss or take profit the current price has reached."""
+        with self.lock:
+            clock = self.now()
+            for ticket, fields in list(self.positions.items()):
+                market = self._market(fields['symbol'])
+                tick = self._tick(market, clock)
+                if tick is None:
+                    continue
+                price = tick.bid if fields['type'] == POSITION_TYPE_BUY else tick.ask
+                long = fields['type'] == POSITION_TYPE_BUY
+                hit_sl = fields['sl'] and (price <= fields['sl'] if long else price >= fields['sl'])
+                hit_tp = fields['tp'] and (price >= fields['tp'] if long else price <= fields['tp'])
+                if hit_sl or hit_tp:
+                    self.balance += self._profit(fields, fields['sl'] if hit_sl else fields['tp'])
+                    del self.positions[ticket]
+
+    def account_info(self):
+        if not self._call('account_info'):
+            return None
+        with self.lock:
+            self._settle()
+            clock = self.now()
+            profit = float(sum(self._position_tuple(f, self._tick(self._market(f['symbol']), clock)).profit
+                         for f in self.positions.values()))
+            margin = float(sum(f['volume'] * self.markets[f['symbol']].contract_size * f['price_open'] / self.leverage
+                         for f in self.positions.values()))
+            equity = self.balance + profit
+            return AccountInfo(1, round(self.balance, 2), round(equity, 2), round(profit, 2), round(margin, 2),
+                               round(equity - margin, 2), self.leverage, self.currency, "Simulated-Server", 0)
+
+    def symbol_info(self, symbol):
+        if not self._call('symbol_info'):
+            return None
+        with self.lock:
+            market = self._market(symbol)
+            if market is None:
+                return None
+            tick = self._tick(market, self.now())
+            bid, ask = (tick.bid, tick.ask) if tick else (0.0, 0.0)
+            return SymbolInfo(symbol, market.visible, market.visible, market.point, market.digits,
+                              int(round((ask - bid) / market.point)), market.contract_size, market.volume_min,
+                              market.volume_max, market.volume_step, market.filling_mode, market.point,
+                              market.contract_size * market.point, 0, bid, ask, self.currency)
+
+    def symbol_select(self, symbol, enable=True):
+        if not self._call('symbol_select'):
+            return False
+        with self.lock:
+            market = self._market(symbol)
+            if market is None:
+                return False
+            market.visible = enable
+            return True
+
+    def symbol_info_tick(self, symbol):
+        if not self._call('symbol_info_tick'):
+            return None
+        with self.lock:
+            market = self._market(symbol)
+            return None if market is None else self._tick(market, self.now())
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        if not self._call('positions_get'):
+            return None
+        with self.lock:
+            self._settle()
+            clock = self.now()
+            positions = []
+            for fields in self.positions.values():
+                if ticket is not None and fields['ticket'] != ticket:
+                    continue
+                if symbol is not None and fields['symbol'] != symbol:
+                    continue
+                if group is not None and group.strip('*') not in fields['symbol']:
+                    continue
+                positions.append(self._position_tuple(fields, self._tick(self.markets[fields['symbol']], clock)))
+            return tuple(positions)
+
+    def positions_total(self):
+        if not self._call('positions_total'):
+            return None
+        with self.lock:
+            return len(self.positions)
+
+    # Market data
+    def _rates_until(self, market, timeframe, clock, start_pos, count):
+        step = TIMEFRAME_SECONDS.get(timeframe)
+        if step is None or step < market.step:
+            self.error = RES_E_INVALID_PARAMS # Cannot build bars finer than the recorded feed
+            return None
+        times = market.rates['time']
+        last = np.searchsorted(times, clock, side='right') - 1
+        if last < 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        bid, _, fraction, high, low = market.quotes([clock])
+        forming = clock < times[last] + market.step
+        lookback = (start_pos + count + 2) * step
+        while True:
+            first = np.searchsorted(times, bucket_start([clock - lookback], timeframe)[0], side='left')
+            segment = market.rates[first:last + 1].copy()
+            if forming: # Base bar still open: reveal it only up to the clock
+                segment['high'][-1], segment['low'][-1], segment['close'][-1] = high[0], low[0], bid[0]
+                segment['tick_volume'][-1] = max(1, int(segment['tick_volume'][-1] * fraction[0]))
+            bars = aggregate_rates(segment, timeframe)
+            if len(bars) >= start_pos + count or first == 0:
+                break
+            lookback *= 2 # Weekends and gaps: look further back
+        end = len(bars) - start_pos
+        return bars[max(0, end - count):max(0, end)]
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if not self._call('copy_rates_from_pos'):
+            return None
+        with self.lock:
+            market = self._market(symbol)
+            return None if market is None else self._rates_until(market, timeframe, self.now(), start_pos, count)
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        """`count` bars up to the one containing date_from, as the market stood at date_from."""
+        if not self._call('copy_rates_from'):
+            return None
+        with self.lock:
+            market = self._market(symbol)
+            if market is None:
+                return None
+            date_from = date_from if isinstance(date_from, (int, float)) else date_from.timestamp()
+            return self._rates_until(market, timeframe, min(date_from, self.now()), 0, count)
+
+    def copy_ticks_from(self, symbol, date_from, count, flags=COPY_TICKS_ALL):
+        """Ticks sampled every tick_interval_ms along the simulated price path, from date_from to now."""
+        if not self._call('copy_ticks_from'):
+            return None
+        with self.lock:
+            market = self._market(symbol)
+            if market is None:
+                return None
+            date_from = date_from if isinstance(date_from, (int, float)) else date_from.timestamp()
+            interval = self.tick_interval_ms
+            first = -(-int(date_from * 1000) // interval) * interval
+            last = min(int(self.now() * 1000), first + (count - 1) * interval)
+            time_msc = np.arange(first, last + 1, interval, dtype=np.int64)
+            bid, bars, _, _, _ = market.quotes(time_msc / 1000)
+            keep = ~np.isnan(bid) & (time_msc < (market.rates['time'][bars] + market.step) * 1000) # None in gaps
+            time_msc, bid, bars = time_msc[keep], bid[keep], bars[keep]
+            ticks = np.zeros(len(time_msc), dtype=TICKS_DTYPE)
+            ticks['time'] = time_msc // 1000
+            ticks['time_msc'] = time_msc
+            ticks['bid'] = np.round(bid, market.digits)
+            ticks['ask'] = np.round(bid + market.rates['spread'][bars] * market.point, market.digits)
+            ticks['flags'] = 6 # TICK_FLAG_BID | TICK_FLAG_ASK
+            return ticks
+
+    # Trading
+    def _result(self, retcode, request, volume=0.0, price=0.0, tick=None, comment="", deal=0, order=0):
+        bid, ask = (tick.bid, tick.ask) if tick else (0.0, 0.0)
+        return OrderSendResult(retcode, deal, order, volume, price, bid, ask, comment, 0, 0, request)
+
+    def order_check(self, request):
+        """Validates a request like the trade server would, without executing it (retcode 0 = OK)."""
+        if not self._call('order_check'):
+            return None
+        account = self.account_info()
+        with self.lock:
+            def result(retcode, comment, margin=0.0):
+                free = account.margin_free - margin
+                level = account.equity / (account.margin + margin) * 100 if account.margin + margin else 0.0
+                return OrderCheckResult(retcode, account.balance, account.equity, account.profit,
+                                        round(account.margin + margin, 2), round(free, 2), round(level, 2), comment, request)
+            market = self._market(request.get('symbol', ''))
+            if market is None or request.get('action') != TRADE_ACTION_DEAL:
+                return result(TRADE_RETCODE_INVALID, "Invalid request")
+            filling = request.get('type_filling', ORDER_FILLING_FOK)
+            if (filling == ORDER_FILLING_FOK and not market.filling_mode & SYMBOL_FILLING_FOK) or \
+               (filling == ORDER_FILLING_IOC and not market.filling_mode & SYMBOL_FILLING_IOC):
+                return result(TRADE_RETCODE_INVALID_FILL, "Unsupported filling mode")
+            volume = request.get('volume', 0.0)
+            steps = volume / market.volume_step
+            if volume < market.volume_min or volume > market.volume_max or abs(steps - round(steps)) > 1e-6:
+                return result(TRADE_RETCODE_INVALID_VOLUME, "Invalid volume")
+            tick = self._tick(market, self.now())
+            if tick is None:
+                return result(TRADE_RETCODE_MARKET_CLOSED, "Market closed")
+            buy = request.get('type') == ORDER_TYPE_BUY
+            price = tick.ask if buy else tick.bid
+            sl, tp = request.get('sl') or 0.0, request.get('tp') or 0.0
+            if (sl and (sl >= price if buy else sl <= price)) or (tp and (tp <= price if buy else tp >= price)):
+                return result(TRADE_RETCODE_INVALID_STOPS, "Invalid stops")
+            if request.get('position'):
+                return result(0, "Done")
+            margin = volume * market.contract_size * price / self.leverage
+            if margin > account.margin_free:
+                return result(TRADE_RETCODE_NO_MONEY, "No money", margin)
+            return result(0, "Done", margin)
+
+    def order_send(self, request):
+        """Market (TRADE_ACTION_DEAL) orders: opens a position, or closes/reduces request['position']."""
+        if not self._call('order_send', self.order_latency_ms):
+            return None
+        with self.lock:
+            self._settle()
+            market = self._market(request.get('symbol', ''))
+            if market is None:
+                return self._result(TRADE_RETCODE_INVALID, request, comment="Unknown symbol")
+            clock = self.now()
+            tick = self._tick(market, clock)
+            if request.get('action') != TRADE_ACTION_DEAL or request.get('type') not in (ORDER_TYPE_BUY, ORDER_TYPE_SELL):
+                return self._result(TRADE_RETCODE_INVALID, request, tick=tick, comment="Unsupported request")
+            if tick is None or not self._market_open(market, clock):
+                return self._result(TRADE_RETCODE_MARKET_CLOSED, request, tick=tick, comment="Market closed")
+
+            if self.scripted_retcodes:
+                retcode = self.scripted_retcodes.popleft()
+                if retcode != TRADE_RETCODE_DONE:
+                    return self._fail(retcode, request, tick)
+            for retcode, rate in self.error_rates.items():
+                if self.rng.random() < rate:
+                    return self._fail(retcode, request, tick)
+
+            filling = request.get('type_filling', ORDER_FILLING_FOK)
+            if (filling == ORDER_FILLING_FOK and not market.filling_mode & SYMBOL_FILLING_FOK) or \
+               (filling == ORDER_FILLING_IOC and not market.filling_mode & SYMBOL_FILLING_IOC):
+                return self._result(TRADE_RETCODE_INVALID_FILL, request, tick=tick, comment="Unsupported filling mode")
+
+            volume = request.get('volume', 0.0)
+            steps = volume / market.volume_step
+            if volume < market.volume_min or volume > market.volume_max or abs(steps - round(steps)) > 1e-6:
+                return self._result(TRADE_RETCODE_INVALID_VOLUME, request, tick=tick, comment="Invalid volume")
+
+            buy = request['type'] == ORDER_TYPE_BUY
+            price = tick.ask if buy else tick.bid
+            requested = request.get('price')
+            if requested and abs(price - requested) > request.get('deviation', 0) * market.point or \
+                    self.rng.random() < self.requote_rate:
+                return self._fail(TRADE_RETCODE_REQUOTE, request, tick)
+
+            closing = request.get('position')
+            if closing:
+                fields = self.positions.get(closing)
+                if fields is None:
+                    return self._result(TRADE_RETCODE_POSITION_CLOSED, request, tick=tick, comment="Position closed")
+                if (fields['type'] == POSITION_TYPE_BUY) == buy or volume > fields['volume'] + 1e-9:
+                    return self._result(TRADE_RETCODE_INVALID, request, tick=tick, comment="Invalid close request")
+
+            filled = volume
+            retcode = TRADE_RETCODE_DONE
+            if self.rng.random() < self.partial_fill_rate:
+                if filling == ORDER_FILLING_FOK:
+                    return self._fail(TRADE_RETCODE_REJECT, request, tick, "Insufficient liquidity for fill or kill")
+                available = np.floor(volume * self.rng.uniform(0.1, 0.9) / market.volume_step) * market.volume_step
+                filled = round(float(max(market.volume_min, available)), 8)
+                retcode = TRADE_RETCODE_DONE_PARTIAL if filled < volume else TRADE_RETCODE_DONE
+
+            self.next_ticket += 1
+            ticket = self.next_ticket
+            time_msc = int(clock * 1000)
+            if closing:
+                fields = self.positions[closing]
+                self.balance += self._profit(dict(fields, volume=filled), price)
+                fields['volume'] = round(fields['volume'] - filled, 8)
+                fields['time_update'], fields['time_update_msc'] = time_msc // 1000, time_msc
+                if fields['volume'] <= 1e-9:
+                    del self.positions[closing]
+            else:
+                self.positions[ticket] = {
+                    'ticket': ticket, 'time': time_msc // 1000, 'time_msc': time_msc,
+                    'time_update': time_msc // 1000, 'time_update_msc': time_msc,
+                    'type': POSITION_TYPE_BUY if buy else POSITION_TYPE_SELL, 'magic': request.get('magic', 0),
+                    'identifier': ticket, 'reason': 3, 'volume': filled, 'price_open': price,
+                    'sl': request.get('sl', 0.0), 'tp': request.get('tp', 0.0), 'swap': 0.0,
+                    'symbol': market.name, 'comment': request.get('comment', ""), 'external_id': ""
+                }
+            self.deals.append((time_msc, ticket, market.name, request['type'], filled, price, requested, retcode))
+            return self._result(retcode, request, filled, price, tick, "Request executed", deal=ticket, order=ticket)
+
+    def _fail(self, retcode, request, tick, comment=""):
+        self.deals.append((int(self.now() * 1000), 0, request.get('symbol'), request.get('type'), 0.0, 0.0,
+                           request.get('price'), retcode))
+        return self._result(retcode, request, tick=tick, comment=comment)
+
+# --- Module-Level API (mirrors MetaTrader5) ---
+_broker = None
+_broker_lock = threading.Lock()
+
+def configure(**settings):
+    """Replaces the simulated terminal with a new SimulatedBroker(**settings) and returns it."""
+    global _broker
+    with _broker_lock:
+        _broker = SimulatedBroker(**settings)
+    return _broker
+
+def configured():
+    return _broker is not None
+
+def broker():
+    """The current simulated terminal, created with default settings on first use."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = SimulatedBroker()
+        return _broker
+
+def initialize(path=None, login=None, password=None, server=None, timeout=None, portable=False):
+    sim = broker()
+    sim.connected = True
+    sim.error = RES_S_OK
+    return True
+
+def login(login=None, password=None, server=None, timeout=None):
+    return broker().connected
+
+def shutdown():
+    broker().connected = False
+    return True
+
+def version():
+    return (500, 4000, "Simulated")
+
+def last_error():
+    return broker().error
+
+def account_info():
+    return broker().account_info()
+
+def symbol_info(symbol):
+    return broker().symbol_info(symbol)
+
+def symbol_select(symbol, enable=True):
+    return broker().symbol_select(symbol, enable)
+
+def symbol_info_tick(symbol):
+    return broker().symbol_info_tick(symbol)
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    return broker().copy_rates_from_pos(symbol, timeframe, start_pos, count)
+
+def copy_rates_from(symbol, timeframe, date_from, count):
+    return broker().copy_rates_from(symbol, timeframe, date_from, count)
+
+def copy_ticks_from(symbol, date_from, count, flags):
+    return broker().copy_ticks_from(symbol, date_from, count, flags)
+
+def positions_get(symbol=None, group=None, ticket=None):
+    return broker().positions_get(symbol=symbol, group=group, ticket=ticket)
+
+def positions_total():
+    return broker().positions_total()
+
+def order_check(request):
+    return broker().order_check(request)
+
+def order_send(request):
+    return broker().order_send(request)
@@ -0,0 +1,50 @@
+"""Loads f0rtun3TraderBot against mt5_simulator, so the tests need no terminal or Telegram account."""
+import os
+import re
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_PATH = os.path.join(ROOT, "f0rtun3TraderBot.py")
+SIM_START = 1791799200 # A fixed Wednesday (server time), so every run sees the same synthetic bars
+# Settings left blank for the user to fill in; the shipped file does not compile until they are
+PLACEHOLDERS = {
+    'MT5_LOGIN': '0', 'MT5_PASSWORD': '""', 'MT5_SERVER': '""', 'MT5_PATH': '""',
+    'TELEGRAM_BOT_TOKEN': '"0:test"', 'TELEGRAM_CHAT_ID': '0',
+}
+
+
+@pytest.fixture(scope="session")
+def bot(tmp_path_factory):
+    pytest.importorskip("telebot")
+    source = open(BOT_PATH).read()
+    for name, value in PLACEHOLDERS.items():
+        source = re.sub(rf"^{name} =\s*#", f"{name} = {value} #", source, count=1, flags=re.M)
+    source = source.replace("USE_SIMULATED_BROKER = False", "USE_SIMULATED_BROKER = True", 1)
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot")) # Logs, checkpoints and benchmark results land here
+    module = types.ModuleType("f0rtun3TraderBot")
+    module.__file__ = BOT_PATH
+    sys.modules[module.__name__] = module
+    exec(compile(source, BOT_PATH, "exec"), module.__dict__)
+    module.send_telegram_message = lambda message: None
+    try:
+        yield module
+    finally:
+        module.close_bar_stores()
+        module.mt5.shutdown()
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def simulator(bot):
+    """A frozen, zero-latency simulated terminal with fresh bar caches."""
+    bot.configure_simulated_broker(start=SIM_START, speed=0, latency_ms=0, order_latency_ms=0, latency_jitter_ms=0)
+    bot.mt5.initialize()
+    bot.BAR_CACHES.clear()
+    bot.RESAMPLERS.clear()
+    bot.INDICATOR_MEMO.clear()
+    return bot.mt5
@@ -0,0 +1,58 @@
+"""Smoke tests: the bot's scan paths run end to end against mt5_simulator."""
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_watchlist_scan(bot, simulator, monkeypatch, batched):
+    monkeypatch.setattr(bot, "SCAN_BATCHED_INDICATORS", batched)
+    symbols = bot.WATCHLIST[:3]
+    scanner = bot.WatchlistScanner(symbols, workers=1)
+    try:
+        table = scanner.scan(200)
+    finally:
+        scanner.close()
+    assert len(table) == len(symbols) * len(bot.TIMEFRAMES)
+    # SAR is NaN-free after its first bar, so every timeframe is evaluated on its latest bar
+    for row in table.reset_index().itertuples():
+        latest = bot.get_ohlc_data(row.symbol, bot.TIMEFRAMES[row.timeframe], bars=1).index[-1]
+        assert row.bar_time == latest, (row.symbol, row.timeframe)
+    assert table['bullish_reason'].str.len().gt(0).all()
+
+
+def test_benchmark_suite(bot, simulator, tmp_path):
+    results_path = tmp_path / "results.json"
+    regressions = bot.run_benchmarks(sizes=(200,), symbol_counts=(1,), results_path=str(results_path),
+                                     baseline_path=None, batch_symbol_counts=(2,), n_ticks=5000)
+    assert regressions == []
+    results = json.loads(results_path.read_text())['results']
+    for name in ("calculate_indicators[200]", "check_bullish_alignment[200]", "kernel_psar[200]",
+                 "indicators_batched[2]", "scan_cycle_cold[1]", "scan_cycle_warm[1]", "tick_builder[5000]"):
+        assert results[name]['median_s'] > 0, name
+    # A baseline three times faster than this run flags every benchmark above the noise floor
+    baseline = {name: dict(result, median_s=result['median_s'] / 3) for name, result in results.items()}
+    flagged = {name for name, *_ in bot.compare_benchmarks(results, baseline)}
+    assert "scan_cycle_cold[1]" in flagged
+
+
+def test_shard_failover(bot, simulator):
+    assert bot.check_shard_failover(bot.WATCHLIST[:6]) == []
+
+
+class _StopLoop(Exception):
+    pass
+
+
+def test_run_bot_trades_on_4h_signal(bot, simulator, monkeypatch):
+    def stop(scheduler):
+        raise _StopLoop
+    monkeypatch.setattr(bot.BarCloseScheduler, "wait", stop) # One pass of the main loop
+    monkeypatch.setattr(bot, "WARM_START", False)
+    monkeypatch.setattr(bot, "conditions_met", lambda df, tf: (True, False))
+    monkeypatch.setattr(bot.SIGNALS, "update",
+                        lambda symbol, tf, direction, met, bar_time=None: bot.SIGNAL_FIRED if met else None)
+    with pytest.raises(_StopLoop):
+        bot.run_bot()
+    positions = simulator.positions_get(symbol=bot.SYMBOL)
+    assert [position.type for position in positions] == [bot.mt5.ORDER_TYPE_BUY]